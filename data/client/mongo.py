@@ -1,7 +1,9 @@
 # Implement a mongo client to connect to the database 
 
 
-from pymongo import MongoClient
+from typing import Optional
+
+from pymongo import AsyncMongoClient, MongoClient
 
 
 class DBClient:
@@ -21,16 +23,62 @@ class DBClient:
     
     def get_collection(self, collection):
         return self.db[collection]
-    
-
-    
-
 
 
-    
-
+class AsyncDBClient:
+    """
+    Asyncio counterpart of `DBClient`, for the FastAPI apps.
 
+    No connection is opened until the first operation, so the client can be
+    created at import time. Operations are awaited on the event loop and draw
+    connections from a pool sized by the arguments below.
+    """
 
+    def __init__(
+        self,
+        host,
+        port,
+        db,
+        username,
+        password,
+        max_pool_size: int = 100,
+        min_pool_size: int = 0,
+        max_idle_time_ms: Optional[int] = None,
+        connect_timeout_ms: int = 5000,
+        server_selection_timeout_ms: int = 5000,
+        socket_timeout_ms: Optional[int] = None,
+        wait_queue_timeout_ms: Optional[int] = None,
+    ):
+        """
+        Args:
+            host, port, db, username, password: Same as `DBClient`.
+            max_pool_size (int): Most connections open to the server at once.
+            min_pool_size (int): Connections kept open even when idle.
+            max_idle_time_ms (Optional[int]): Idle time after which a pooled connection is closed.
+            connect_timeout_ms (int): Timeout of a new connection.
+            server_selection_timeout_ms (int): How long an operation waits for a reachable server.
+            socket_timeout_ms (Optional[int]): Timeout of a single read or write, None for no limit.
+            wait_queue_timeout_ms (Optional[int]): How long an operation waits for a free pooled
+                                                   connection, None for no limit.
+        """
+        uri = f"mongodb://{username}:{password}@{host}:{port}/{db}"
+        self.client = AsyncMongoClient(
+            uri,
+            maxPoolSize=max_pool_size,
+            minPoolSize=min_pool_size,
+            maxIdleTimeMS=max_idle_time_ms,
+            connectTimeoutMS=connect_timeout_ms,
+            serverSelectionTimeoutMS=server_selection_timeout_ms,
+            socketTimeoutMS=socket_timeout_ms,
+            waitQueueTimeoutMS=wait_queue_timeout_ms,
+        )
+        self.db = self.client[db]
 
+    async def ping(self):
+        return await self.db.command("ping")
 
+    def get_collection(self, collection):
+        return self.db[collection]
 
+    async def close(self):
+        await self.client.close()
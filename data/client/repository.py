@@ -0,0 +1,197 @@
+# Async queries shared by the FastAPI apps. Every function takes the database
+# handle of an `AsyncDBClient`, so apps decide which client and pool they use.
+
+
+import base64
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING
+
+
+def to_json(document: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Makes a document JSON serializable by turning its ObjectId into a string.
+    """
+    if "_id" in document:
+        document["_id"] = str(document["_id"])
+    return document
+
+
+async def ping(db) -> Dict[str, Any]:
+    """
+    Checks that the server answers, without blocking the event loop.
+    """
+    return await db.command("ping")
+
+
+async def list_collections(db) -> List[str]:
+    return await db.list_collection_names()
+
+
+# Fields returned when listing movies; details come from find_movie_by_title
+MOVIE_LIST_FIELDS = {"title": 1, "year": 1, "genre": 1, "rating": 1}
+
+# Listing order, backed by the `title_id` index: _id breaks ties between remakes
+MOVIE_LIST_SORT = [("title", ASCENDING), ("_id", ASCENDING)]
+
+
+def encode_cursor(movie: Dict[str, Any]) -> str:
+    """
+    Makes an opaque cursor pointing right after `movie` in the listing order.
+    """
+    key = json.dumps([movie["title"], str(movie["_id"])]).encode("utf-8")
+    return base64.urlsafe_b64encode(key).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, ObjectId]:
+    """
+    Reads back the position encoded by `encode_cursor`.
+
+    Raises:
+        ValueError: If the cursor was not made by `encode_cursor`.
+    """
+    try:
+        title, movie_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(title), ObjectId(movie_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+async def find_movies_page(
+    db, limit: int, after: Optional[Tuple[str, ObjectId]] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Returns a page of movies in title order, with keyset pagination.
+
+    Each page starts right after the last movie of the previous one, through the
+    index, so fetching any page costs the same however deep it is.
+
+    Args:
+        db: Database handle of an `AsyncDBClient`.
+        limit (int): Movies per page.
+        after (Optional[Tuple[str, ObjectId]]): Title and id of the last movie of the
+                                                previous page, None for the first page.
+
+    Returns:
+        Tuple[List[Dict[str, Any]], Optional[str]]: The movies, with `MOVIE_LIST_FIELDS` only,
+                                                    and the cursor of the next page, None on
+                                                    the last one.
+    """
+    query: Dict[str, Any] = {"title": {"$type": "string"}}
+    if after is not None:
+        title, movie_id = after
+        query["$or"] = [
+            {"title": {"$gt": title}},
+            {"title": title, "_id": {"$gt": movie_id}},
+        ]
+    # One extra movie tells whether there is a next page
+    cursor = db["movies"].find(query, MOVIE_LIST_FIELDS).sort(MOVIE_LIST_SORT).limit(limit + 1)
+    movies = [movie async for movie in cursor]
+    next_cursor = encode_cursor(movies[limit - 1]) if len(movies) > limit else None
+    return [to_json(movie) for movie in movies[:limit]], next_cursor
+
+
+async def find_movie_by_title(db, title: str) -> Optional[Dict[str, Any]]:
+    movie = await db["movies"].find_one({"title": title})
+    return to_json(movie) if movie is not None else None
+
+
+async def find_movie_by_id(db, movie_id: str) -> Optional[Dict[str, Any]]:
+    movie = await db["movies"].find_one({"_id": ObjectId(movie_id)})
+    return to_json(movie) if movie is not None else None
+
+
+# Fields the title index needs
+MOVIE_TITLE_FIELDS = {"title": 1, "year": 1}
+
+
+async def iter_titles(db, after_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streams the title of every movie, in insertion order.
+
+    Args:
+        db: Database handle of an `AsyncDBClient`.
+        after_id (Optional[str]): Only movies inserted after this one, to pick up new
+                                  movies since the last call. None for every movie.
+
+    Yields:
+        Dict[str, Any]: Movies with `_id`, `title` and `year` only.
+    """
+    query: Dict[str, Any] = {"title": {"$type": "string"}}
+    if after_id is not None:
+        query["_id"] = {"$gt": ObjectId(after_id)}
+    async for movie in db["movies"].find(query, MOVIE_TITLE_FIELDS).sort("_id", ASCENDING):
+        yield to_json(movie)
+
+
+async def iter_documents(
+    db,
+    collection: str,
+    query: Optional[Dict[str, Any]] = None,
+    projection: Optional[Dict[str, Any]] = None,
+    batch_size: int = 1000,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streams every document of a collection matching `query`, in `_id` order.
+
+    Documents are fetched from the server `batch_size` at a time, so memory use
+    does not grow with the size of the collection.
+
+    Args:
+        db: Database handle of an `AsyncDBClient`.
+        collection (str): Name of the collection.
+        query (Optional[Dict[str, Any]]): Filter, None for every document.
+        projection (Optional[Dict[str, Any]]): Fields to return, None for all of them.
+        batch_size (int): Documents per round trip to the server.
+
+    Yields:
+        Dict[str, Any]: The documents, JSON serializable.
+    """
+    cursor = (
+        db[collection]
+        .find(query or {}, projection)
+        .sort("_id", ASCENDING)
+        .batch_size(batch_size)
+    )
+    async for document in cursor:
+        yield to_json(document)
+
+
+# Per collection, a counter bumped by every write that changes it
+VERSIONS_COLLECTION = "collection_versions"
+
+
+async def get_collection_version(db, name: str) -> int:
+    """
+    Returns the version counter of a collection, 0 if it was never written to.
+    """
+    document = await db[VERSIONS_COLLECTION].find_one({"_id": name})
+    return document["version"] if document is not None else 0
+
+
+async def describe_indexes(db, expected: Dict[str, list]) -> Dict[str, Dict[str, Any]]:
+    """
+    Compares the indexes of each collection with the ones it is expected to have.
+
+    Args:
+        db: Database handle of an `AsyncDBClient`.
+        expected (Dict[str, list]): `IndexModel`s per collection, as in `validators.indexes`.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Per collection, the expected, present and missing index
+                                   names, and the size in bytes of every present index.
+    """
+    report = {}
+    for name, models in expected.items():
+        wanted = [model.document["name"] for model in models]
+        present = list(await db[name].index_information())
+        stats = await db.command("collStats", name) if present else {}
+        report[name] = {
+            "expected": wanted,
+            "present": present,
+            "missing": [index for index in wanted if index not in present],
+            "sizes": stats.get("indexSizes", {}),
+        }
+    return report
@@ -1,10 +1,16 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any, TypeAlias
-from client.mongo import DBClient
+from typing import Dict, Any, List, Optional, TypeAlias
+from client.mongo import AsyncDBClient, DBClient
+from client import repository
+from responses import NDJSON_MEDIA_TYPE, FastJSONResponse, add_compression, ndjson_chunks
+import asyncio
 import os
 from dotenv import load_dotenv
-from validators import validators
+from pymongo import IndexModel
+from pymongo.errors import PyMongoError
+from validators import indexes, validators
 
 # Load environment variables
 load_dotenv()
@@ -21,17 +27,54 @@ DB_CONFIG = {
     'password': os.getenv('ROOT_PASSWORD')
 }
 
-# Initialize database client
-client = DBClient(**DB_CONFIG)
+# Connection pool of the async client, tunable per deployment
+POOL_CONFIG = {
+    'max_pool_size': int(os.getenv('MONGO_MAX_POOL_SIZE', 100)),
+    'min_pool_size': int(os.getenv('MONGO_MIN_POOL_SIZE', 0)),
+    'max_idle_time_ms': int(os.getenv('MONGO_MAX_IDLE_TIME_MS', 60000)),
+    'connect_timeout_ms': int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 5000)),
+    'server_selection_timeout_ms': int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+    'wait_queue_timeout_ms': int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 2000)),
+}
+
+# Initialize database client: endpoints await it, so they never block the event loop
+client = AsyncDBClient(**DB_CONFIG, **POOL_CONFIG)
 db = client.db
 
 # FastAPI app instance
 app = FastAPI(
     title="Movie Database API",
     description="A simple API to interact with the movie database.",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse,
 )
 
+add_compression(app)
+
+
+# Per collection, the declared indexes that could not be created and why
+index_errors: Dict[str, Dict[str, str]] = {}
+# Collections that could not be created with their validator, and why
+collection_errors: Dict[str, str] = {}
+schema_setup: Optional[asyncio.Task] = None
+
+
+@app.on_event("startup")
+async def apply_schema():
+    # Validators and indexes are applied however the app is served. Building
+    # indexes can take a while and the database may be down, so serving does
+    # not wait for it: missing indexes show on /diagnostics/indexes/
+    global schema_setup
+    schema_setup = asyncio.create_task(
+        asyncio.to_thread(initialize_collections, validators, indexes)
+    )
+    schema_setup.add_done_callback(report_schema_setup)
+
+
+def report_schema_setup(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Could not initialize collections: {task.exception()}")
+
 
 @app.get("/", summary="Root Endpoint", tags=["Utility"])
 async def root():
@@ -41,52 +84,151 @@ async def root():
     return {"Message": "Use me to talk to the database"}
 
 
+@app.get("/diagnostics/indexes/", summary="Index Diagnostics", tags=["Utility"])
+async def index_diagnostics():
+    """
+    Reports, per collection, the declared indexes that are present or missing, their
+    sizes, and why the ones that could not be created failed, as well as why a
+    collection could not be created with its validator.
+    """
+    try:
+        report = await repository.describe_indexes(db, indexes)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Database unreachable: {e}")
+    for name, collection in report.items():
+        collection["errors"] = index_errors.get(name, {})
+    for name, error in collection_errors.items():
+        report.setdefault(name, {})["collection_error"] = error
+    return report
+
+
+@app.on_event("shutdown")
+async def close_client():
+    if schema_setup is not None:
+        # The thread cannot be interrupted, but the app no longer waits for it
+        schema_setup.cancel()
+    await client.close()
+
+
 @app.get("/ping/", summary="Ping Database", tags=["Utility"])
 async def ping():
     """
     Checks the connection status with the database.
     """
-    return client.ping()
+    try:
+        return await repository.ping(db)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Database unreachable: {e}")
 
 
-def initialize_collections(validators: Dict[str, ValidatorDType]):
+@app.get("/export/{collection}", summary="Export Collection", tags=["Export"])
+async def export_collection(collection: str, batch_size: int = Query(1000, ge=1, le=10000)):
     """
-    Initializes database collections with specified validators.
-    """
-    for name, validator in validators.items():
-        create_collection_with_validator(name, validator)
-    print("Collections initialized successfully.")
+    Streams every document of a collection as NDJSON, one document per line.
 
+    The cursor is read `batch_size` documents at a time, so memory use stays the
+    same however large the collection is.
+    """
+    if collection not in validators:
+        raise HTTPException(status_code=404, detail=f"Unknown collection '{collection}'")
+    documents = repository.iter_documents(db, collection, batch_size=batch_size)
+    return StreamingResponse(
+        ndjson_chunks(documents),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{collection}.ndjson"'},
+    )
+
+
+def initialize_collections(
+    validators: Dict[str, ValidatorDType],
+    indexes: Optional[Dict[str, List[IndexModel]]] = None,
+):
+    """
+    Initializes database collections with specified validators and indexes.
 
-def create_collection_with_validator(name: str, validator: ValidatorDType):
+    Runs in a thread from the startup hook, so it uses a blocking client.
+    """
+    sync_db = DBClient(**DB_CONFIG).db
+    for name, validator in validators.items():
+        error = create_collection_with_validator(sync_db, name, validator)
+        if error is None:
+            collection_errors.pop(name, None)
+        else:
+            collection_errors[name] = error
+    for name, models in (indexes or {}).items():
+        index_errors[name] = create_indexes(sync_db, name, models)
+    if collection_errors or any(index_errors.values()):
+        print("Collections initialized with errors, see /diagnostics/indexes/.")
+    else:
+        print("Collections initialized successfully.")
+
+
+def create_collection_with_validator(db, name: str, validator: ValidatorDType) -> Optional[str]:
     """
     Creates a database collection with a given validator if it does not already exist.
     
     Parameters:
+    - db: Database
+        Blocking database handle the collection is created in.
     - name: str
         Name of the collection to create.
     - validator: ValidatorDType
         Validation schema for the collection.
+
+    Returns:
+    - Optional[str]: Why the collection could not be created, None if it exists.
     """
     try:
         # Check if collection already exists
         if name in db.list_collection_names():
             print(f"Collection '{name}' already exists. Skipping creation.")
-            return
+            return None
 
         # Create collection with validator if it doesn't exist
         db.create_collection(name, validator=validator)
         print(f"Collection '{name}' created with validator.")
-    except Exception as e:
+        return None
+    except PyMongoError as e:
+        # Reported rather than raised, so the other collections are still set up
         print(f"Error creating collection '{name}': {e}")
-        raise HTTPException(status_code=500, detail=f"Could not create collection '{name}': {str(e)}")
+        return str(e)
+
+
+def create_indexes(db, name: str, models: List[IndexModel]) -> Dict[str, str]:
+    """
+    Creates the indexes of a collection, leaving the ones that already exist untouched.
 
+    Each index is created on its own, so one that cannot be built does not
+    keep the others from being created.
 
+    Parameters:
+    - db: Database
+        Blocking database handle the collection lives in.
+    - name: str
+        Name of the collection.
+    - models: List[IndexModel]
+        Indexes the collection should have.
 
-# Initialize collections on startup
+    Returns:
+    - Dict[str, str]: Error of each index that could not be created, by index name.
+    """
+    errors = {}
+    for model in models:
+        index = model.document["name"]
+        try:
+            db[name].create_indexes([model])
+            print(f"Index '{index}' of '{name}' ensured.")
+        except PyMongoError as e:
+            # E.g. duplicates under a unique index, or an index with the same name
+            # but other keys: report it rather than dropping an index the app may use
+            print(f"Error creating index '{index}' of '{name}': {e}")
+            errors[index] = str(e)
+    return errors
+
+
+# Collections are initialized by the startup hook
 if __name__ == "__main__":
     print("Starting Movie Database API...")
-    initialize_collections(validators)
 
     import uvicorn
     uvicorn.run("data_app:app", reload=True)
@@ -0,0 +1,89 @@
+# Response helpers of the FastAPI apps. Endpoints returning documents that are
+# already plain (see `repository.to_json`) hand them over as a FastJSONResponse,
+# which serializes them in a single pass, skipping `jsonable_encoder`. Exports
+# stream documents as NDJSON instead.
+
+import json
+import os
+from typing import Any, AsyncIterable, AsyncIterator
+
+from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # Optional faster encoder
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Serializes a response body, with orjson when it is installed.
+
+    Values JSON has no type for, like an ObjectId left in a document, are
+    written as strings.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=str, ensure_ascii=False, separators=(",", ":")).encode(
+        "utf-8"
+    )
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered by `dumps`.
+
+    Returning it from an endpoint bypasses FastAPI's validation and encoding of the
+    return value: only return content that is already made of JSON types.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def add_compression(app: FastAPI) -> None:
+    """
+    Gzips the responses of `app` large enough for compression to pay off.
+
+    Listings and exports shrink several times over, while compressing tiny
+    bodies costs more CPU than it saves bandwidth. The threshold and level are
+    read from the `GZIP_MINIMUM_SIZE` and `GZIP_COMPRESSLEVEL` environment variables.
+    """
+    app.add_middleware(
+        GZipMiddleware,
+        minimum_size=int(os.getenv("GZIP_MINIMUM_SIZE", 1000)),
+        compresslevel=int(os.getenv("GZIP_COMPRESSLEVEL", 5)),
+    )
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+async def ndjson_chunks(
+    documents: AsyncIterable[Any], chunk_size: int = 64 * 1024
+) -> AsyncIterator[bytes]:
+    """
+    Serializes documents as NDJSON, one per line, for a `StreamingResponse`.
+
+    Lines are grouped into chunks of about `chunk_size` bytes, so the server
+    sends a few large writes rather than one per document.
+
+    Args:
+        documents (AsyncIterable[Any]): Documents made of JSON types.
+        chunk_size (int): Bytes gathered before a chunk is sent.
+
+    Yields:
+        bytes: Whole lines, the last chunk possibly shorter.
+    """
+    lines, size = [], 0
+    async for document in documents:
+        line = dumps(document) + b"\n"
+        lines.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield b"".join(lines)
+            lines, size = [], 0
+    if lines:
+        yield b"".join(lines)
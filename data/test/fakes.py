@@ -0,0 +1,89 @@
+# In-memory stand-ins for the database handle of an `AsyncDBClient`, covering
+# the parts of the query language the repository uses.
+
+from typing import Any, Dict, Iterable, List, Optional
+
+
+def matches(document: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    for field, condition in query.items():
+        if field == "$or":
+            if not any(matches(document, branch) for branch in condition):
+                return False
+            continue
+        value = document.get(field)
+        if not isinstance(condition, dict):
+            if value != condition:
+                return False
+            continue
+        for operator, operand in condition.items():
+            if operator == "$gt":
+                if value is None or not value > operand:
+                    return False
+            elif operator == "$type" and operand == "string":
+                if not isinstance(value, str):
+                    return False
+            else:
+                raise NotImplementedError(operator)
+    return True
+
+
+def project(document: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if not projection:
+        return dict(document)
+    return {
+        field: value
+        for field, value in document.items()
+        if field == "_id" or projection.get(field)
+    }
+
+
+class FakeCursor:
+    def __init__(self, documents: List[Dict[str, Any]]):
+        self.documents = documents
+        self.batch = None
+
+    def sort(self, key, direction=None):
+        keys = key if isinstance(key, list) else [(key, direction)]
+        for field, order in reversed(keys):
+            self.documents.sort(key=lambda document: document[field], reverse=order == -1)
+        return self
+
+    def limit(self, count: int):
+        self.documents = self.documents[:count]
+        return self
+
+    def batch_size(self, count: int):
+        self.batch = count
+        return self
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield dict(document)
+
+    def __aiter__(self):
+        return self._iterate()
+
+
+class FakeCollection:
+    def __init__(self, documents: Iterable[Dict[str, Any]] = ()):
+        self.documents = list(documents)
+        self.cursors: List[FakeCursor] = []
+
+    def find(self, query=None, projection=None) -> FakeCursor:
+        found = [project(d, projection) for d in self.documents if matches(d, query or {})]
+        self.cursors.append(FakeCursor(found))
+        return self.cursors[-1]
+
+    async def find_one(self, query):
+        for document in self.documents:
+            if matches(document, query):
+                return dict(document)
+        return None
+
+
+class FakeDatabase(dict):
+    """Collections by name, created empty on first use."""
+
+    def __missing__(self, name: str) -> FakeCollection:
+        self[name] = FakeCollection()
+        return self[name]
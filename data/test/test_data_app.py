@@ -0,0 +1,149 @@
+import json
+from types import SimpleNamespace
+
+from bson import ObjectId
+from fastapi.testclient import TestClient
+from pymongo import IndexModel
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+import data_app
+from responses import NDJSON_MEDIA_TYPE
+from test import fakes
+
+
+class FakeCollection:
+    """Creates indexes by name, failing the ones listed in `failing`."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.indexes = []
+
+    def create_indexes(self, models):
+        for model in models:
+            name = model.document["name"]
+            if name in self.failing:
+                raise DuplicateKeyError(f"E11000 duplicate key error for {name}")
+            self.indexes.append(name)
+
+
+class FakeDatabase(dict):
+    """Holds collections, refusing to create the ones listed in `refused`."""
+
+    def __init__(self, existing=(), refused=()):
+        super().__init__({name: FakeCollection() for name in existing})
+        self.refused = set(refused)
+
+    def __missing__(self, name):
+        self[name] = FakeCollection()
+        return self[name]
+
+    def list_collection_names(self):
+        return list(self)
+
+    def create_collection(self, name, validator=None):
+        if name in self.refused:
+            raise OperationFailure(f"Invalid validator for {name}")
+        self[name] = FakeCollection()
+
+
+MOVIE_INDEXES = [
+    IndexModel([("title", 1), ("year", 1)], name="title_year", unique=True),
+    IndexModel([("title", 1), ("_id", 1)], name="title_id"),
+]
+
+
+def test_one_failing_index_does_not_keep_the_others_from_being_created():
+    db = FakeDatabase()
+    db["movies"] = FakeCollection(failing=["title_year"])
+    errors = data_app.create_indexes(db, "movies", MOVIE_INDEXES)
+    assert list(errors) == ["title_year"]
+    assert "duplicate key" in errors["title_year"]
+    assert db["movies"].indexes == ["title_id"]
+
+
+def test_initialization_carries_on_past_a_failing_collection(monkeypatch):
+    db = FakeDatabase(existing=["authors"], refused=["cinemas"])
+    monkeypatch.setattr(data_app, "DBClient", lambda **config: SimpleNamespace(db=db))
+    monkeypatch.setattr(data_app, "collection_errors", {})
+    monkeypatch.setattr(data_app, "index_errors", {})
+
+    data_app.initialize_collections(
+        {"authors": {}, "cinemas": {}, "movies": {}}, {"movies": MOVIE_INDEXES}
+    )
+    assert sorted(db) == ["authors", "movies"]
+    assert list(data_app.collection_errors) == ["cinemas"]
+    assert db["movies"].indexes == ["title_year", "title_id"]
+    assert data_app.index_errors == {"movies": {}}
+
+
+class AsyncFakeCollection:
+    def __init__(self, indexes):
+        self.indexes = indexes
+
+    async def index_information(self):
+        return {name: {} for name in self.indexes}
+
+
+class AsyncFakeDatabase(dict):
+    async def command(self, command, name):
+        return {"indexSizes": {index: 4096 for index in self[name].indexes}}
+
+
+def test_index_diagnostics_report_failures(monkeypatch):
+    db = AsyncFakeDatabase(movies=AsyncFakeCollection(["_id_", "title_id"]))
+    monkeypatch.setattr(data_app, "db", db)
+    monkeypatch.setattr(data_app, "indexes", {"movies": MOVIE_INDEXES})
+    monkeypatch.setattr(data_app, "index_errors", {"movies": {"title_year": "E11000"}})
+    monkeypatch.setattr(data_app, "collection_errors", {"cinemas": "Invalid validator"})
+
+    # Not entered as a context manager: the startup hook does not run
+    response = TestClient(data_app.app).get("/diagnostics/indexes/")
+    assert response.status_code == 200
+    assert response.json() == {
+        "movies": {
+            "expected": ["title_year", "title_id"],
+            "present": ["_id_", "title_id"],
+            "missing": ["title_year"],
+            "sizes": {"_id_": 4096, "title_id": 4096},
+            "errors": {"title_year": "E11000"},
+        },
+        "cinemas": {"collection_error": "Invalid validator"},
+    }
+
+
+def test_index_diagnostics_when_the_database_is_down(monkeypatch):
+    class DownDatabase(dict):
+        def __missing__(self, name):
+            raise ConnectionError("Mongo is down")
+
+    monkeypatch.setattr(data_app, "db", DownDatabase())
+    response = TestClient(data_app.app).get("/diagnostics/indexes/")
+    assert response.status_code == 503
+
+
+EXPORTED = [
+    {"_id": ObjectId(), "movie": "Heat", "comment": "Tense"},
+    {"_id": ObjectId(), "movie": "Alien", "comment": "Scary"},
+]
+
+
+def test_export_streams_a_collection_as_ndjson(monkeypatch):
+    db = fakes.FakeDatabase(reviews=fakes.FakeCollection(EXPORTED))
+    monkeypatch.setattr(data_app, "db", db)
+
+    response = TestClient(data_app.app).get("/export/reviews", params={"batch_size": 1})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == NDJSON_MEDIA_TYPE
+    assert response.headers["content-disposition"] == 'attachment; filename="reviews.ndjson"'
+    assert response.text.endswith("\n")
+    lines = response.text.splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {**review, "_id": str(review["_id"])} for review in EXPORTED
+    ]
+    assert db["reviews"].cursors[0].batch == 1
+
+
+def test_export_of_an_unknown_collection_is_not_found(monkeypatch):
+    monkeypatch.setattr(data_app, "db", fakes.FakeDatabase())
+    response = TestClient(data_app.app).get("/export/system.users")
+    assert response.status_code == 404
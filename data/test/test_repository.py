@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+
+from client import repository
+from test.fakes import FakeCollection, FakeDatabase
+
+
+def movie(title, year=None, **fields):
+    return {"_id": ObjectId(), "title": title, "year": year, **fields}
+
+
+def test_cursor_round_trip():
+    heat = movie("Heat", 1995)
+    title, movie_id = repository.decode_cursor(repository.encode_cursor(heat))
+    assert (title, movie_id) == ("Heat", heat["_id"])
+    # Cursors go in query strings as they are
+    assert all(c.isalnum() or c in "-_=" for c in repository.encode_cursor(heat))
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor", "W10=", "WyJIZWF0IiwgIm5vdC1hbi1pZCJd"])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        repository.decode_cursor(cursor)
+
+
+def test_pages_follow_title_then_id_order_through_ties():
+    movies = [
+        movie("Heat", 1995),
+        movie("Alien", 1979),
+        movie("Heat", 1986),
+        movie("Heat", 2013),
+        movie("Casablanca", 1942),
+        movie("Zodiac", 2007),
+    ]
+    db = FakeDatabase(movies=FakeCollection(movies + [{"_id": ObjectId(), "title": None}]))
+
+    async def read_all(limit):
+        pages, after = [], None
+        while True:
+            page, next_cursor = await repository.find_movies_page(db, limit, after)
+            pages.append(page)
+            if next_cursor is None:
+                return pages
+            after = repository.decode_cursor(next_cursor)
+
+    pages = asyncio.run(read_all(limit=2))
+    expected = sorted(movies, key=lambda m: (m["title"], m["_id"]))
+    # Six movies, two per page: the last page is full and still has no cursor
+    assert [len(page) for page in pages] == [2, 2, 2]
+    assert [m["_id"] for page in pages for m in page] == [str(m["_id"]) for m in expected]
+    # Listing fields only, with the ObjectId as a string
+    assert set(pages[0][0]) == {"_id", "title", "year"}
+
+    pages = asyncio.run(read_all(limit=4))
+    assert [len(page) for page in pages] == [4, 2]
+    # The tie on "Heat" is split across pages without losing or repeating a remake
+    assert [m["year"] for page in pages for m in page if m["title"] == "Heat"] == [
+        m["year"] for m in expected if m["title"] == "Heat"
+    ]
+
+
+def test_empty_listing_has_no_cursor():
+    assert asyncio.run(repository.find_movies_page(FakeDatabase(), 10)) == ([], None)
@@ -0,0 +1,58 @@
+import asyncio
+import json
+from datetime import datetime
+
+from bson import ObjectId
+
+from client.repository import to_json
+from responses import dumps, ndjson_chunks
+
+
+async def aiter(documents):
+    for document in documents:
+        yield document
+
+
+def collect(documents, chunk_size):
+    async def run():
+        return [chunk async for chunk in ndjson_chunks(aiter(documents), chunk_size)]
+
+    return asyncio.run(run())
+
+
+def test_chunks_hold_whole_lines_of_about_chunk_size():
+    documents = [{"n": i} for i in range(10)]
+    line_size = len(dumps(documents[0])) + 1
+    chunks = collect(documents, chunk_size=3 * line_size)
+
+    # A chunk is sent as soon as it reaches chunk_size, the last one holds the rest
+    assert [len(chunk) for chunk in chunks] == [3 * line_size] * 3 + [line_size]
+    for chunk in chunks:
+        assert chunk.endswith(b"\n")
+        assert all(json.loads(line) for line in chunk.splitlines())
+    assert [json.loads(line) for line in b"".join(chunks).splitlines()] == documents
+
+
+def test_a_line_longer_than_chunk_size_is_never_split():
+    documents = [{"synopsis": "x" * 100}, {"n": 1}]
+    chunks = collect(documents, chunk_size=10)
+    assert [json.loads(chunk) for chunk in chunks] == documents
+
+
+def test_no_documents_no_chunks():
+    assert collect([], chunk_size=10) == []
+
+
+def test_ids_and_dates_are_written_as_strings():
+    movie_id = ObjectId()
+    released = datetime(1995, 12, 15, 20, 30)
+    document = to_json({"_id": movie_id, "title": "Heat", "released": released})
+    assert document["_id"] == str(movie_id)
+
+    (chunk,) = collect([document], chunk_size=1024)
+    assert chunk.count(b"\n") == 1
+    line = json.loads(chunk)
+    assert line["_id"] == str(movie_id)
+    # Dates go through as strings with the date and time both kept
+    assert line["released"].startswith("1995-12-15")
+    assert "20:30" in line["released"]
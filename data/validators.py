@@ -1,3 +1,6 @@
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, TEXT, IndexModel
+
+
 # Define collection schemas as JSON schema validators
 validators = {
     "authors": {
@@ -90,4 +93,38 @@ validators = {
             }
         }
     }
-}
\ No newline at end of file
+}
+
+
+# Define the indexes of each collection, applied at startup by initialize_collections.
+# Creating an index that already exists with the same spec is a no-op.
+indexes = {
+    "authors": [
+        IndexModel([("name", ASCENDING)], name="name"),
+    ],
+    "cinemas": [
+        IndexModel([("geo_data", GEOSPHERE)], name="geo_data_2dsphere"),
+        IndexModel([("city", ASCENDING)], name="city"),
+    ],
+    "movies": [
+        # A movie is identified by its title and year, remakes share the title
+        IndexModel([("title", ASCENDING), ("year", ASCENDING)], name="title_year", unique=True),
+        # Keyset pagination of the library, in title order
+        IndexModel([("title", ASCENDING), ("_id", ASCENDING)], name="title_id"),
+        IndexModel([("author", ASCENDING)], name="author"),
+        IndexModel([("synopsis", TEXT)], name="synopsis_text"),
+    ],
+    "movie_cache": [
+        # Entries of the scraper's result cache are keyed by _id; drop them once
+        # even the longest TTL is over
+        IndexModel([("cached_at", ASCENDING)], name="cached_at_ttl", expireAfterSeconds=24 * 60 * 60),
+    ],
+    "releases": [
+        # Release days are the ids; this finds the days a movie is released on
+        IndexModel([("movies", ASCENDING)], name="movies"),
+    ],
+    "reviews": [
+        IndexModel([("movie", ASCENDING), ("date", DESCENDING)], name="movie_date"),
+        IndexModel([("comment", TEXT)], name="comment_text"),
+    ],
+}
@@ -2,28 +2,40 @@
 
 import { useEffect, useState } from 'react';
 
+const PAGE_SIZE = 50;
+
 const MovieList = () => {
   const [movies, setMovies] = useState([]);
+  // Cursor of the next page: undefined before the first fetch, null after the last page
+  const [nextCursor, setNextCursor] = useState(undefined);
+  const [loading, setLoading] = useState(false);
 
-  useEffect(() => {
-    const fetchMovies = async () => {
-      try {
-        const res = await fetch('http://localhost:8000/movie/');
-        
-        // Check if the response is okay (status code 200-299)
-        if (!res.ok) {
-          throw new Error(`Error: ${res.status} - ${res.statusText}`);
-        }
-
-        const data = await res.json();
-        console.log(data); // For debugging purposes
-        setMovies(data);
-      } catch (error) {
-        console.error("Failed to fetch movies:", error.message);
-        // You can also use this error to display a message to users if needed
+  const fetchMovies = async (cursor) => {
+    setLoading(true);
+    try {
+      const params = new URLSearchParams({ limit: PAGE_SIZE });
+      if (cursor) {
+        params.set('cursor', cursor);
+      }
+      const res = await fetch(`http://localhost:8000/movie/?${params}`);
+
+      // Check if the response is okay (status code 200-299)
+      if (!res.ok) {
+        throw new Error(`Error: ${res.status} - ${res.statusText}`);
       }
-    };
 
+      const data = await res.json();
+      setMovies((previous) => (cursor ? [...previous, ...data.movies] : data.movies));
+      setNextCursor(data.next_cursor);
+    } catch (error) {
+      console.error("Failed to fetch movies:", error.message);
+      // You can also use this error to display a message to users if needed
+    } finally {
+      setLoading(false);
+    }
+  };
+
+  useEffect(() => {
     fetchMovies();
   }, []);
 
@@ -31,10 +43,15 @@ const MovieList = () => {
     <div>
       <h1>Movie List</h1>
       <ul>
-        {movies.map((movie, index) => (
-          <li key={index}>{movie.title}</li>
+        {movies.map((movie) => (
+          <li key={movie._id}>{movie.title}</li>
         ))}
       </ul>
+      {nextCursor && (
+        <button onClick={() => fetchMovies(nextCursor)} disabled={loading}>
+          {loading ? 'Loading...' : 'Load more'}
+        </button>
+      )}
     </div>
   );
 };
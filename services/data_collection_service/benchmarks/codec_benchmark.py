@@ -0,0 +1,76 @@
+"""
+Micro-benchmark of the registered DataProcessor codecs.
+
+Encodes and decodes `MovieItem` and `ReviewItem` payloads, shaped like the ones
+the spiders send to the relay, with every available codec and reports the
+time per message and the encoded size.
+
+Run from the `data_collection_service` directory:
+
+    python -m benchmarks.codec_benchmark --iterations 20000
+"""
+
+import argparse
+import timeit
+
+from itemadapter import ItemAdapter
+
+from rotten_tomatoes.connections import DataProcessor
+from rotten_tomatoes.rottentomatoes_scraper.rottentomatoes_scraper.items import (
+    MovieItem,
+    ReviewItem,
+)
+
+
+def sample_payloads():
+    movie = MovieItem(
+        title="Reservoir Dogs",
+        year=1992,
+        rating="R",
+        genre="Crime",
+        director="Quentin Tarantino",
+        producers=["Lawrence Bender"],
+        distributor="Miramax",
+        language="English",
+        release_date="1992-10-23",
+        runtime="1h 39m",
+        cast=["Harvey Keitel", "Tim Roth", "Michael Madsen", "Chris Penn", "Steve Buscemi"],
+        synopsis=(
+            "After a simple jewelry heist goes terribly wrong, the surviving criminals "
+            "begin to suspect that one of them is a police informant."
+        ),
+    )
+    review = ReviewItem(
+        author_name="Roger Ebert",
+        comment="The movie is all style and energy, a display of bravura filmmaking.",
+        rating=3.5,
+        date="1992-10-26",
+    )
+    return {
+        "MovieItem": ItemAdapter(movie).asdict(),
+        "ReviewItem": ItemAdapter(review).asdict(),
+        # A review flood arrives as many small items in a row
+        "100 x ReviewItem": [ItemAdapter(review).asdict()] * 100,
+    }
+
+
+def run(iterations: int) -> None:
+    print(f"{'payload':<18}{'codec':<10}{'bytes':>8}{'encode us':>12}{'decode us':>12}")
+    for label, payload in sample_payloads().items():
+        for name in DataProcessor.available():
+            processor = DataProcessor.get(name)
+            encoded = processor.to_web(payload)
+            assert processor.from_web(encoded) == payload
+            encode = timeit.timeit(lambda: processor.to_web(payload), number=iterations)
+            decode = timeit.timeit(lambda: processor.from_web(encoded), number=iterations)
+            print(
+                f"{label:<18}{name:<10}{len(encoded):>8}"
+                f"{encode / iterations * 1e6:>12.2f}{decode / iterations * 1e6:>12.2f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20_000)
+    args = parser.parse_args()
+    run(args.iterations)
@@ -0,0 +1,112 @@
+"""
+Throughput benchmark for the framed TCP relay.
+
+A producer pushes `--items` scraped-movie payloads through a `TCPRelayServer`
+to a single consumer, and the wall-clock time from the first frame sent to
+the last frame received is reported.
+
+Run from the `data_collection_service` directory:
+
+    python -m benchmarks.relay_throughput --items 100000
+    python -m benchmarks.relay_throughput --items 100000 --passthrough
+"""
+
+import argparse
+import contextlib
+import os
+import socket
+import threading
+import time
+
+from rotten_tomatoes.connections import (
+    ClientConnectionParameters,
+    JsonDataProcessor,
+    ServerConnectionParameters,
+    TCPClient,
+    TCPRelayServer,
+)
+
+
+SAMPLE_MOVIE = {
+    "title": "Reservoir Dogs",
+    "year": 1992,
+    "rating": "R",
+    "genre": "Crime",
+    "director": "Quentin Tarantino",
+    "cast": ["Harvey Keitel", "Tim Roth", "Michael Madsen", "Chris Penn", "Steve Buscemi"],
+    "synopsis": (
+        "After a simple jewelry heist goes terribly wrong, the surviving criminals "
+        "begin to suspect that one of them is a police informant."
+    ),
+}
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _connect(address: str, port: int) -> TCPClient:
+    client = TCPClient(ClientConnectionParameters(address=address, port=port))
+    client.connect(timeout=5)
+    return client
+
+
+def run(items: int, passthrough: bool) -> None:
+    address, port = "127.0.0.1", _free_port()
+    relay = TCPRelayServer(
+        ServerConnectionParameters(
+            address=address, port=port, is_relay=True, passthrough=passthrough
+        )
+    )
+    payload = JsonDataProcessor().to_web(SAMPLE_MOVIE)
+
+    # The relay logs every message; keep that out of the measurement output.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        relay.start_server(as_daemon=True)
+        producer = _connect(address, port)
+        consumer = _connect(address, port)
+        while len(relay.clients) < 2:
+            time.sleep(0.01)
+
+        def drain_acks():
+            for _ in range(items):
+                producer.receive_frame(timeout=30)
+
+        def consume(received):
+            for _ in range(items):
+                received.append(consumer.receive_frame(timeout=30))
+
+        received = []
+        threads = [
+            threading.Thread(target=drain_acks),
+            threading.Thread(target=consume, args=(received,)),
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for _ in range(items):
+            producer.send_frame(payload)
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        producer.close()
+        consumer.close()
+
+    assert len(received) == items and all(frame == payload for frame in received)
+    megabytes = items * len(payload) / (1024 * 1024)
+    mode = "pass-through" if passthrough else "decoding"
+    print(f"Relayed {items} items of {len(payload)} bytes in {elapsed:.2f}s ({mode} relay)")
+    print(f"  {items / elapsed:,.0f} items/s, {megabytes / elapsed:,.1f} MiB/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument(
+        "--passthrough", action="store_true", help="Forward raw frames without decoding them"
+    )
+    args = parser.parse_args()
+    run(args.items, args.passthrough)
@@ -0,0 +1,80 @@
+"""
+Compares JSON response paths of the FastAPI apps on large listings.
+
+For each listing size, one endpoint returns a dict of scraped movies the default
+way, through `jsonable_encoder` and `JSONResponse`, and another returns the same
+dict as a `FastJSONResponse`. Each is requested `--requests` times in process,
+with and without gzip, and p50/p99 latencies and body sizes are reported.
+
+Run from the `data_collection_service` directory:
+
+    python -m benchmarks.response_benchmark --sizes 1000 10000 --requests 200
+"""
+
+import argparse
+import statistics
+import time
+from typing import Callable, List
+
+from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.testclient import TestClient
+
+from benchmarks.relay_throughput import SAMPLE_MOVIE
+from rotten_tomatoes.responses import FastJSONResponse, orjson
+
+
+def make_app(movies: List[dict], compress: bool) -> FastAPI:
+    app = FastAPI()
+    if compress:
+        app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=5)
+
+    @app.get("/default")
+    def default():
+        return {"movies": movies}
+
+    @app.get("/fast")
+    def fast():
+        return FastJSONResponse({"movies": movies})
+
+    return app
+
+
+def measure(get: Callable[[], object], requests: int) -> List[float]:
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        get()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return latencies
+
+
+def run(size: int, requests: int) -> None:
+    movies = [{**SAMPLE_MOVIE, "title": f"{SAMPLE_MOVIE['title']} {i}"} for i in range(size)]
+    print(f"{size:,} movies:")
+    for compress in (False, True):
+        client = TestClient(make_app(movies, compress))
+        headers = {"Accept-Encoding": "gzip" if compress else "identity"}
+        for path in ("/default", "/fast"):
+            response = client.get(path, headers=headers)
+            body = len(response.content)  # Decoded size; the wire size is below
+            wire = int(response.headers["content-length"])
+            latencies = measure(lambda: client.get(path, headers=headers), requests)
+            print(
+                f"  {path[1:]:<8} gzip={'on ' if compress else 'off'} "
+                f"p50 {latencies[len(latencies) // 2] * 1e3:7.2f}ms, "
+                f"p99 {latencies[int(len(latencies) * 0.99)] * 1e3:7.2f}ms, "
+                f"mean {statistics.fmean(latencies) * 1e3:7.2f}ms, "
+                f"{body:,} bytes ({wire:,} on the wire)"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    print(f"Encoder: {'orjson' if orjson is not None else 'json'}")
+    for size in args.sizes:
+        run(size, args.requests)
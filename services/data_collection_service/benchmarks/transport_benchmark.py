@@ -0,0 +1,128 @@
+"""
+Compares TCP loopback and Unix domain sockets between spiders and the relay.
+
+An `AsyncTCPRelayServer` is started once per transport. A producer connected
+like the spiders (`subscribe=False`) first sends `--round-trips` items one at
+a time, waiting for each acknowledgement, to measure per-message latency.
+It then pushes `--items` items back to back to a consumer to measure
+throughput. Both phases report the CPU time the process spent, relay included.
+
+Run from the `data_collection_service` directory:
+
+    python -m benchmarks.transport_benchmark --round-trips 5000 --items 50000
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from benchmarks.relay_throughput import SAMPLE_MOVIE, _free_port
+from rotten_tomatoes.connections import (
+    ClientConnectionParameters,
+    JsonDataProcessor,
+    ServerConnectionParameters,
+    TCPClient,
+    setup_server,
+)
+
+
+def _connect(params: ClientConnectionParameters) -> TCPClient:
+    client = TCPClient(params)
+    client.connect(timeout=5)
+    return client
+
+
+def run(transport: str, round_trips: int, items: int) -> None:
+    address, port = "127.0.0.1", _free_port()
+    unix_path = (
+        os.path.join(tempfile.mkdtemp(), "relay.sock") if transport == "unix" else None
+    )
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    payload = JsonDataProcessor().to_web(SAMPLE_MOVIE)
+
+    def client_params(subscribe: bool) -> ClientConnectionParameters:
+        return ClientConnectionParameters(
+            address=address, port=port, subscribe=subscribe, unix_path=unix_path
+        )
+
+    # Keep the relay's connection messages out of the measurement output.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        relay = asyncio.run_coroutine_threadsafe(
+            setup_server(
+                ServerConnectionParameters(
+                    address=address,
+                    port=port,
+                    is_relay=True,
+                    outbound_queue_size=items,
+                    unix_path=unix_path,
+                )
+            ),
+            loop,
+        ).result(5)
+        producer = _connect(client_params(subscribe=False))
+
+        latencies = []
+        cpu = time.process_time()
+        for _ in range(round_trips):
+            start = time.perf_counter()
+            producer.send_frame(payload)
+            producer.receive_frame(timeout=30)
+            latencies.append(time.perf_counter() - start)
+        round_trip_cpu = time.process_time() - cpu
+
+        consumer = _connect(client_params(subscribe=True))
+        while len(relay.clients) < 2:
+            time.sleep(0.01)
+
+        def drain_acks():
+            for _ in range(items):
+                producer.receive_frame(timeout=30)
+
+        def consume():
+            for _ in range(items):
+                consumer.receive_frame(timeout=30)
+
+        threads = [threading.Thread(target=drain_acks), threading.Thread(target=consume)]
+        cpu = time.process_time()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for _ in range(items):
+            producer.send_frame(payload)
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        throughput_cpu = time.process_time() - cpu
+
+        producer.close()
+        consumer.close()
+        asyncio.run_coroutine_threadsafe(relay.close(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+
+    latencies.sort()
+    print(f"{transport}:")
+    print(
+        f"  round trip  mean {statistics.fmean(latencies) * 1e6:,.0f}us, "
+        f"p50 {latencies[len(latencies) // 2] * 1e6:,.0f}us, "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:,.0f}us, "
+        f"CPU {round_trip_cpu / round_trips * 1e6:,.0f}us per message"
+    )
+    print(
+        f"  throughput  {items / elapsed:,.0f} items/s, "
+        f"CPU {throughput_cpu / items * 1e6:,.0f}us per item"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--round-trips", type=int, default=5_000)
+    parser.add_argument("--items", type=int, default=50_000)
+    args = parser.parse_args()
+    for transport in ("tcp", "unix"):
+        run(transport, args.round_trips, args.items)
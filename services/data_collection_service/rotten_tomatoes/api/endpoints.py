@@ -1,40 +1,153 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Body, HTTPException, BackgroundTasks
 from rotten_tomatoes_service import RottenTomatoesService
 from models import Review, Movie, Author
-from typing import List, Optional
+from typing import Dict, List, Optional
 from connections import (
-    TCPClient,
+    AsyncTCPRelayServer,
     ClientConnectionParameters,
+    JobDemultiplexer,
     ServerConnectionParameters,
     setup_server,
-    setup_client,
 )
+from coalescing import SingleFlight, normalize_title
+from crawler_pool import CrawlResult
+from cache import MongoCacheTier, TTLCache
+from responses import FastJSONResponse
 import asyncio
-import json
+import concurrent.futures
+import os
+import socket
+import tempfile
+import uuid
 
 
 address: str = "127.0.0.1"
 port: str = 8740
+# Spiders run on the same host as the relay: a Unix domain socket spares them
+# the loopback TCP stack where the platform has one
+unix_path: Optional[str] = (
+    os.path.join(tempfile.gettempdir(), f"rotten_tomatoes_relay_{port}.sock")
+    if hasattr(socket, "AF_UNIX")
+    else None
+)
+crawl_timeout: float = 60
+# Titles a single POST /movies/ may ask for, and seconds its crawls may take
+batch_max_titles: int = 500
+batch_crawl_timeout: float = 600
 
 router = APIRouter()
 
 
+# Spiders only produce: the relay must not forward other crawls' items to them
+client_conn_params = ClientConnectionParameters(
+    address=address, port=port, subscribe=False, unix_path=unix_path
+)
+server: Optional[AsyncTCPRelayServer] = None
+
+# Workers are spawned, and re-import the main module, so the pool must not start
+# at import time: the startup hook starts it
+service = RottenTomatoesService(pool_size=2, warm_up=False)
+
+# Items relayed from the spiders, routed to the request of the job they carry
+results = JobDemultiplexer()
+
+# Concurrent lookups of the same title share a single crawl
+crawls = SingleFlight()
+
+
+def _cache_second_tier() -> Optional[MongoCacheTier]:
+    # Scraped movies outlive restarts when a Mongo instance is configured
+    uri = os.getenv("MOVIE_CACHE_MONGO_URI")
+    if not uri:
+        return None
+    from pymongo import MongoClient
+
+    db = MongoClient(uri)["movie_db"]
+    return MongoCacheTier(db["movie_cache"], movies=db["movies"])
+
+
+# Recently scraped movies, looked up before crawling
+movie_cache = TTLCache(max_entries=5000, second_tier=_cache_second_tier())
+
+
+@router.on_event("startup")
 async def setup():
+    # The relay runs on the application's own event loop, so it must be
+    # started from within it rather than at import time
+    global server
+    if server is not None:
+        return
     server = await setup_server(
         ServerConnectionParameters(
-            address=address, port=port, maximum_clients=2, is_relay=True
+            address=address,
+            port=port,
+            maximum_clients=2,
+            is_relay=True,
+            unix_path=unix_path,
         )
     )
+    server.add_listener(results.dispatch)
+    # Waiting for the workers to be ready blocks, so keep it off the loop
+    await asyncio.to_thread(service.start)
+
+
+@router.on_event("shutdown")
+async def teardown():
+    global server
+    if server is None:
+        return
+    await server.close()
+    server = None
+    service.close()
+
+
+async def await_for_crawling_results(title: str) -> Optional[dict]:
+    """
+    Crawls a title and waits for the item the spider relays, without blocking the loop.
+
+    Returns:
+        Optional[dict]: The scraped movie, or None if the crawl finished without one.
+
+    Raises:
+        HTTPException: 502 if the crawl failed.
+    """
+    job_id = uuid.uuid4().hex
+    items = results.open(job_id)
+    try:
+        crawl = asyncio.wrap_future(
+            service.submit_movie(title, client_conn_params, job_id=job_id)
+        )
+        # Spiders wait for the relay to acknowledge each item, so by the time the
+        # crawl is done its items are queued ahead of this end marker
+        crawl.add_done_callback(lambda _: items.put_nowait(None))
+        movie = await asyncio.wait_for(items.get(), crawl_timeout)
+        if movie is not None:
+            return movie
+        # Nothing was relayed: the crawl is over, and its result tells why
+        try:
+            result = await crawl
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Crawl failed: {e}")
+        if result.error is not None:
+            raise HTTPException(status_code=502, detail=f"Crawl failed: {result.error}")
+        # The spider may have given up relaying its batch, the worker still has it
+        return result.items[0] if result.items else None
+    finally:
+        results.close(job_id)
 
-async def await_for_crawling_results():
-    pass
 
-server = asyncio.run(setup())
+async def crawl_and_cache(key: str, title: str) -> Optional[dict]:
+    movie = await await_for_crawling_results(title)
+    if movie is not None:
+        await movie_cache.store_movie(key, movie)
+    return movie
 
-client_conn_params = ClientConnectionParameters(address=address, port=port)
-proxy_client = setup_client(client_conn_params)
 
-service = RottenTomatoesService()
+async def refresh_movie(key: str, title: str) -> None:
+    try:
+        await crawls.do(key, lambda: crawl_and_cache(key, title))
+    except Exception as e:
+        print(f"SERVER SAYS: Could not refresh the scores of '{title}': {e}")
 
 
 @router.get("/")
@@ -43,16 +156,108 @@ def read_root():
 
 
 @router.get("/movie/{title}")  # Get movie by title
-async def get_movie(title: str):
-
-    service.get_movie(title, client_conn_params)
-    movie = proxy_client.client_socket.recv(1024)
+async def get_movie(title: str, background_tasks: BackgroundTasks):
+    key = normalize_title(title)
+    movie, scores_fresh = await movie_cache.lookup_movie(key)
+    if movie is not None:
+        if not scores_fresh:
+            # Details outlive scores: serve them now, without the expired scores,
+            # and crawl the title again in the background to refresh the scores
+            background_tasks.add_task(refresh_movie, key, title)
+        return FastJSONResponse({"movie": movie})
+    try:
+        movie = await crawls.do(key, lambda: crawl_and_cache(key, title))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Crawl timed out")
     if movie is None:
         raise HTTPException(status_code=404, detail="Movie not found")
-    return {"movie": json.loads(movie)}
+    return FastJSONResponse({"movie": movie})
+
+
+def crawl_batch(titles: List[str]) -> Dict[str, CrawlResult]:
+    """
+    Crawls titles in chunks spread over the pool, blocking until they are done.
+
+    Returns:
+        Dict[str, CrawlResult]: Result by title, without the titles whose chunk
+                                was still crawling after `batch_crawl_timeout`.
+    """
+    crawled = {}
+    try:
+        for result in service.get_movies(titles, client_conn_params, timeout=batch_crawl_timeout):
+            crawled[result.query] = result
+    except concurrent.futures.TimeoutError:
+        pass
+    return crawled
+
+
+@router.post("/movies/")  # Get many movies by title, crawled together
+async def get_movies(titles: List[str] = Body(..., embed=True)):
+    """
+    Crawls and caches every title of a list not already cached, through the batch
+    crawl of the service: a spider crawls a whole chunk of titles at once.
+
+    Returns, by title as given, "cached", "crawled", "not_found", "failed" or
+    "timed_out". Titles that normalize the same are crawled once.
+    """
+    if len(titles) > batch_max_titles:
+        raise HTTPException(
+            status_code=413, detail=f"At most {batch_max_titles} titles per batch"
+        )
+    statuses: Dict[str, str] = {}
+    to_crawl: Dict[str, str] = {}
+    for title in titles:
+        key = normalize_title(title)
+        if key in statuses or key in to_crawl:
+            continue
+        movie, scores_fresh = await movie_cache.lookup_movie(key)
+        if movie is not None and scores_fresh:
+            statuses[key] = "cached"
+        else:
+            to_crawl[key] = title
+
+    crawled = await asyncio.to_thread(crawl_batch, list(to_crawl.values())) if to_crawl else {}
+    for key, title in to_crawl.items():
+        result = crawled.get(title)
+        if result is None:
+            statuses[key] = "timed_out"
+        elif result.error is not None:
+            statuses[key] = "failed"
+        elif result.items:
+            await movie_cache.store_movie(key, result.items[0])
+            statuses[key] = "crawled"
+        else:
+            statuses[key] = "not_found"
+    return {"movies": {title: statuses[normalize_title(title)] for title in titles}}
+
+
+@router.get("/crawler/config/")  # Limits clients size their requests and timeouts on
+def crawler_config():
+    return {
+        "crawl_timeout": crawl_timeout,
+        "batch_max_titles": batch_max_titles,
+        "batch_crawl_timeout": batch_crawl_timeout,
+    }
+
+
+@router.get("/crawler/stats/")  # Crawler pool, routing and relay queue counters
+def crawler_stats():
+    return {
+        **service.pool_stats(),
+        "crawls_in_flight": crawls.in_flight(),
+        "crawls_started": crawls.started,
+        "requests_coalesced": crawls.coalesced,
+        "items_routed": results.routed,
+        "items_unrouted": results.unrouted,
+        "relay": server.flow_stats() if server is not None else None,
+    }
+
+
+@router.get("/cache/stats/")  # Hit ratio, size and evictions of the movie cache
+def cache_stats():
+    return movie_cache.stats()
 
 
-@router.get("/test/")  # Get movie by title asynchronously
+@router.get("/test/")  # Check that the relay is up
 def test():
-    # return {"client connected": [client]}
-    return proxy_client.ping(timeout=10)
+    return server is not None and server.is_serving()
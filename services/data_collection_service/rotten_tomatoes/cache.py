@@ -0,0 +1,297 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from collection_versions import bump_collection_version
+
+
+# Fields that change as ratings come in: they are cached apart from the rest
+# of a movie, and expire sooner than its details.
+SCORE_FIELDS = ("tomatometer", "popcornmeter", "is_certified_fresh", "is_verified_hot")
+
+DEFAULT_TTLS = {
+    "movie": 24 * 60 * 60,
+    "scores": 15 * 60,
+}
+
+
+def kind_of(movie: Dict[str, Any]) -> str:
+    """
+    Tells which TTL applies to a value cached as a whole. Movies are split into
+    details and scores by `TTLCache.store_movie` instead.
+    """
+    return "scores" if any(field in movie for field in SCORE_FIELDS) else "movie"
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Approximates the memory held by a cached value by its JSON length.
+    """
+    return len(json.dumps(value, default=str))
+
+
+def scores_key(key: str) -> str:
+    """
+    Key of the entry holding the scores of the movie cached under `key`.
+    """
+    return f"{key}#scores"
+
+
+# Set on the cached details of movies whose scores are cached apart. Scraped
+# movies may have no score fields at all: their details alone are the movie.
+HAS_SCORES = "_has_scores"
+
+
+def split_scores(movie: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Separates the details of a movie from its scores, so each can expire on its own.
+    """
+    details = {name: value for name, value in movie.items() if name not in SCORE_FIELDS}
+    scores = {name: movie[name] for name in SCORE_FIELDS if name in movie}
+    return details, scores
+
+
+class MongoCacheTier:
+    """
+    Second cache tier persisting entries in a Mongo collection of their own.
+
+    Each entry is a document keyed by its cache key, holding the value, its kind
+    and the time it was stored, so that expiry follows the same TTLs as the
+    first tier. Scraped movies can also be published to the library's `movies`
+    collection, without any of the cache bookkeeping.
+    """
+
+    def __init__(self, collection, movies=None):
+        """
+        Args:
+            collection: A pymongo collection dedicated to the cache, e.g. `movie_cache`.
+            movies: The pymongo `movies` collection scraped movies are published to, if any.
+        """
+        self.collection = collection
+        self.movies = movies
+
+    def get(self, key: str) -> Optional[Tuple[Any, str, datetime]]:
+        """
+        Returns the stored value, its kind and the time it was stored, if any.
+        """
+        document = self.collection.find_one({"_id": key})
+        if document is None:
+            return None
+        cached_at = document["cached_at"]
+        if cached_at.tzinfo is None:
+            cached_at = cached_at.replace(tzinfo=timezone.utc)
+        return document["value"], document["kind"], cached_at
+
+    def set(self, key: str, value: Any, kind: str) -> None:
+        self.collection.replace_one(
+            {"_id": key},
+            {"value": value, "kind": kind, "cached_at": datetime.now(timezone.utc)},
+            upsert=True,
+        )
+
+    def publish(self, movie: Dict[str, Any]) -> None:
+        """
+        Upserts a scraped movie into the library, unique by title and year like the
+        documents the pipelines write, and bumps the version of `movies` if it changed.
+        """
+        if self.movies is None or "title" not in movie:
+            return
+        result = self.movies.update_one(
+            {"title": movie["title"], "year": movie.get("year")},
+            {"$set": movie},
+            upsert=True,
+        )
+        if result.upserted_id is not None or result.modified_count:
+            bump_collection_version(self.movies.database, self.movies.name)
+
+
+class TTLCache:
+    """
+    In-process cache with LRU eviction, a TTL per kind of data and memory bounds.
+
+    The least recently used entries are evicted once either `max_entries` or
+    `max_bytes` is exceeded. An optional second tier, consulted by `lookup` on
+    a miss and written by `store`, keeps entries across restarts. When the
+    second tier fails, the cache carries on with memory alone and counts the
+    failure in `second_tier_errors`.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttls: Optional[Dict[str, float]] = None,
+        second_tier: Optional[MongoCacheTier] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            max_entries (int): Maximum number of entries kept in memory.
+            max_bytes (int): Maximum estimated size of the values kept in memory.
+            ttls (Optional[Dict[str, float]]): Seconds an entry of each kind stays fresh.
+            second_tier (Optional[MongoCacheTier]): Persistent tier behind the memory one.
+            clock (Callable[[], float]): Time source, in seconds.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.second_tier = second_tier
+        self._clock = clock
+        # key -> (value, size, expires_at)
+        self._entries: "OrderedDict[str, Tuple[Any, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.second_tier_hits = 0
+        self.second_tier_errors = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Returns a fresh in-memory value, or None on a miss.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, _, expires_at = entry
+        if expires_at <= self._clock():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, kind: str = "movie", ttl: Optional[float] = None) -> None:
+        """
+        Stores a value in memory, evicting least recently used entries if needed.
+
+        Args:
+            key (str): The cache key.
+            value (Any): The value, which must be JSON serializable.
+            kind (str): Kind of data, selecting the TTL from `ttls`.
+            ttl (Optional[float]): Overrides the TTL of `kind`.
+        """
+        if ttl is None:
+            ttl = self.ttls[kind]
+        if ttl <= 0:
+            return
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, size, self._clock() + ttl)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    async def lookup(self, key: str) -> Optional[Any]:
+        """
+        Returns a fresh value from memory, falling back on the second tier.
+
+        Values found in the second tier are promoted to memory for what is left
+        of their TTL. Second tier queries run in a thread.
+        """
+        value = self.get(key)
+        if value is not None or self.second_tier is None:
+            return value
+        try:
+            found = await asyncio.to_thread(self.second_tier.get, key)
+        except Exception as e:
+            self._second_tier_failed("lookup", e)
+            return None
+        if found is None:
+            return None
+        value, kind, cached_at = found
+        age = (datetime.now(timezone.utc) - cached_at).total_seconds()
+        remaining = self.ttls[kind] - age
+        if remaining <= 0:
+            return None
+        self.second_tier_hits += 1
+        self.set(key, value, kind, ttl=remaining)
+        return value
+
+    async def store(self, key: str, value: Dict[str, Any], kind: str = "movie") -> None:
+        """
+        Stores a value in memory and, if configured, in the second tier.
+        """
+        self.set(key, value, kind)
+        if self.second_tier is not None:
+            try:
+                await asyncio.to_thread(self.second_tier.set, key, value, kind)
+            except Exception as e:
+                self._second_tier_failed("store", e)
+
+    async def lookup_movie(self, key: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """
+        Returns the cached details of a movie, with its scores if they are still fresh.
+
+        Returns:
+            Tuple[Optional[Dict[str, Any]], bool]: The movie, None if its details are not
+                                                   cached, and whether its scores are fresh.
+                                                   A movie scraped without scores has
+                                                   none to expire, so it is fresh.
+        """
+        details = await self.lookup(key)
+        if details is None:
+            return None, False
+        if not details.get(HAS_SCORES):
+            return details, True
+        details = {name: value for name, value in details.items() if name != HAS_SCORES}
+        scores = await self.lookup(scores_key(key))
+        if scores is None:
+            return details, False
+        return {**details, **scores}, True
+
+    async def store_movie(self, key: str, movie: Dict[str, Any]) -> None:
+        """
+        Caches a scraped movie: its details with the "movie" TTL and its scores, if
+        it has any, with the "scores" one. The movie is also published through the
+        second tier.
+        """
+        details, scores = split_scores(movie)
+        if scores:
+            await self.store(key, {**details, HAS_SCORES: True}, "movie")
+            await self.store(scores_key(key), scores, "scores")
+        else:
+            await self.store(key, details, "movie")
+        publish = getattr(self.second_tier, "publish", None)
+        if publish is not None:
+            try:
+                await asyncio.to_thread(publish, movie)
+            except Exception as e:
+                self._second_tier_failed("publish", e)
+
+    def _second_tier_failed(self, operation: str, error: Exception) -> None:
+        self.second_tier_errors += 1
+        print(f"CACHE SAYS: Second tier {operation} failed, using memory only: {error}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "second_tier_hits": self.second_tier_hits,
+            "second_tier_errors": self.second_tier_errors,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "ttls": self.ttls,
+        }
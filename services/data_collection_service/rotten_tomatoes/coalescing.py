@@ -0,0 +1,55 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+def normalize_title(title: str) -> str:
+    """
+    Normalizes a movie title so that differently typed requests for the same
+    movie share a key: case-insensitive, with runs of whitespace collapsed.
+    """
+    return " ".join(title.casefold().split())
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls sharing a key into a single execution.
+
+    The first caller for a key starts the work as a task; callers arriving
+    while it is in flight await the same task and all receive its result, or
+    its exception. The key is released as soon as the task finishes, so later
+    calls start fresh work.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, work: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Runs `work()` unless a call with the same key is already in flight.
+
+        Args:
+            key (Hashable): Identifies calls that can share a result.
+            work (Callable[[], Awaitable[Any]]): Produces the coroutine to run.
+
+        Returns:
+            Any: The result of the shared execution.
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(work())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._release(key, task))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        # Shielded: one caller going away must not cancel the work for the others
+        return await asyncio.shield(task)
+
+    def _release(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+
+    def in_flight(self) -> int:
+        return len(self._in_flight)
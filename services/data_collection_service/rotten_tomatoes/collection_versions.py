@@ -0,0 +1,19 @@
+# Version counters of the library collections. The library API derives the
+# ETags of its responses from them (see `data.client.repository`), so every
+# writer of a collection bumps its counter when a write changed it.
+
+# One {"_id": collection, "version": n} document per collection written to
+VERSIONS_COLLECTION = "collection_versions"
+
+
+def bump_collection_version(db, collection: str) -> None:
+    """
+    Increments the version of a collection, creating its counter if needed.
+
+    Args:
+        db: The pymongo database holding the collection.
+        collection (str): Name of the collection that changed.
+    """
+    db[VERSIONS_COLLECTION].update_one(
+        {"_id": collection}, {"$inc": {"version": 1}}, upsert=True
+    )
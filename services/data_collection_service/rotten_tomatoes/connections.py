@@ -1,8 +1,20 @@
+import asyncio
+import itertools
+import os
 import socket
 import json
+import random
+import struct
 import threading
+import time
+from contextlib import contextmanager
 from abc import ABC, abstractmethod
-from typing import Any, Tuple, Optional
+from typing import Any, Callable, Dict, Iterator, List, Set, Tuple, Type, Optional, Union
+
+try:
+    import msgpack
+except ImportError:  # Optional binary codec
+    msgpack = None
 
 
 # -------------------- Connection Parameter Classes --------------------
@@ -17,15 +29,50 @@ class ServerConnectionParameters:
         port (int): Port number to bind the server to.
         maximum_clients (int): Maximum number of concurrent clients.
         is_relay (bool): Specify if it's a message relay server
+        outbound_queue_size (int): Frames buffered per client by the asyncio servers
+                                   before relayed messages to it are dropped.
+        passthrough (bool): Relay frames as raw bytes without decoding them. All clients
+                            of a pass-through relay talk JSON.
+        high_watermark (Optional[int]): Queued frames from which an asyncio relay holds back
+                                        acknowledgements to producers. Defaults to 80% of
+                                        `outbound_queue_size`.
+        low_watermark (Optional[int]): Queued frames below which held back acknowledgements
+                                       are released. Defaults to 25% of `outbound_queue_size`.
+        max_ack_delay (float): Seconds an acknowledgement is held back at most. Clients still
+                               lagging after that are shed: frames for them are dropped,
+                               without holding back acknowledgements, until they drain
+                               below `low_watermark`.
+        unix_path (Optional[str]): Path of a Unix domain socket to listen on instead of
+                                   `address` and `port`, for clients on the same host.
     """
 
     def __init__(
-        self, address: str, port: int, maximum_clients: int = 5, is_relay: bool = False
+        self,
+        address: str,
+        port: int,
+        maximum_clients: int = 5,
+        is_relay: bool = False,
+        outbound_queue_size: int = 1000,
+        passthrough: bool = False,
+        high_watermark: Optional[int] = None,
+        low_watermark: Optional[int] = None,
+        max_ack_delay: float = 5.0,
+        unix_path: Optional[str] = None,
     ):
         self.address = address
         self.port = port
         self.maximum_clients = maximum_clients
         self.is_relay = is_relay
+        self.outbound_queue_size = outbound_queue_size
+        self.passthrough = passthrough
+        self.high_watermark = (
+            high_watermark if high_watermark is not None else outbound_queue_size * 4 // 5
+        )
+        self.low_watermark = (
+            low_watermark if low_watermark is not None else outbound_queue_size // 4
+        )
+        self.max_ack_delay = max_ack_delay
+        self.unix_path = unix_path
 
 
 class ClientConnectionParameters:
@@ -35,12 +82,45 @@ class ClientConnectionParameters:
     Attributes:
         address (str): Server's IP address to connect to.
         port (int): Server's port to connect to.
+        codecs (Optional[List[str]]): Codecs to offer the server, in order of preference.
+                                      If None, JSON is used.
+        subscribe (bool): Whether a relay should forward other clients' messages to this
+                          client. Producers that only send, like spiders, set it to False.
+        unix_path (Optional[str]): Path of the server's Unix domain socket, used instead of
+                                   `address` and `port` when set.
     """
 
-    def __init__(self, address: str, port: int):
+    def __init__(
+        self,
+        address: str,
+        port: int,
+        codecs: Optional[List[str]] = None,
+        subscribe: bool = True,
+        unix_path: Optional[str] = None,
+    ):
         self.address = address
         self.port = port
-        
+        self.codecs = codecs
+        self.subscribe = subscribe
+        self.unix_path = unix_path
+
+
+def describe_endpoint(
+    params: Union[ServerConnectionParameters, ClientConnectionParameters]
+) -> str:
+    """
+    Tells where a server listens, or where a client connects to, for logging.
+    """
+    return params.unix_path or f"{params.address}:{params.port}"
+
+
+def _remove_stale_socket(path: str) -> None:
+    # A Unix socket file left by a previous server would make bind fail
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
 
 
 # ------------------------ Data Processor Classes ------------------------
@@ -49,8 +129,42 @@ class ClientConnectionParameters:
 class DataProcessor(ABC):
     """
     Abstract base class for processing data to and from the web.
+
+    Concrete processors are registered under a codec name with
+    `DataProcessor.register`, which is what peers negotiate on connection.
     """
 
+    name: str = ""
+    _registry: Dict[str, Type["DataProcessor"]] = {}
+
+    @classmethod
+    def register(cls, processor_cls: Type["DataProcessor"]) -> Type["DataProcessor"]:
+        """
+        Registers a processor class under its `name`. Usable as a class decorator.
+        """
+        cls._registry[processor_cls.name] = processor_cls
+        return processor_cls
+
+    @classmethod
+    def get(cls, name: str) -> "DataProcessor":
+        """
+        Returns a processor instance for a registered codec name.
+
+        Raises:
+            ValueError: If no processor is registered under `name`.
+        """
+        try:
+            return cls._registry[name]()
+        except KeyError:
+            raise ValueError(f"Unknown codec '{name}'. Available: {cls.available()}")
+
+    @classmethod
+    def available(cls) -> List[str]:
+        """
+        Names of all registered codecs.
+        """
+        return list(cls._registry)
+
     @abstractmethod
     def from_web(self, data: bytes) -> Any:
         """
@@ -66,11 +180,14 @@ class DataProcessor(ABC):
         pass
 
 
+@DataProcessor.register
 class JsonDataProcessor(DataProcessor):
     """
     Concrete implementation of DataProcessor for JSON serialization/deserialization.
     """
 
+    name = "json"
+
     def from_web(self, data: bytes) -> Any:
         return json.loads(data.decode("utf-8"))
 
@@ -78,6 +195,351 @@ class JsonDataProcessor(DataProcessor):
         return json.dumps(data, ensure_ascii=False).encode("utf-8")
 
 
+if msgpack is not None:
+
+    @DataProcessor.register
+    class MsgPackDataProcessor(DataProcessor):
+        """
+        Concrete implementation of DataProcessor for compact binary MessagePack encoding.
+
+        Only registered when the optional `msgpack` package is installed.
+        """
+
+        name = "msgpack"
+
+        def from_web(self, data: bytes) -> Any:
+            return msgpack.unpackb(data, raw=False)
+
+        def to_web(self, data: Any) -> bytes:
+            return msgpack.packb(data, use_bin_type=True)
+
+
+# Codec negotiation happens once per connection: a client wanting something
+# other than JSON sends a JSON `{"hello": {"codecs": [...]}}` frame first, and
+# the server answers with `{"codec": name}`, the first offered codec it
+# supports. Both sides then use that codec for the rest of the connection.
+# Clients that skip the handshake keep talking JSON. The hello may also carry
+# `"subscribe": false` for clients that never want relayed messages.
+HELLO_KEY = "hello"
+DEFAULT_CODEC = JsonDataProcessor.name
+
+
+def negotiate_codec(
+    message: bytes, supported: Optional[List[str]] = None
+) -> Optional[DataProcessor]:
+    """
+    Interprets the first frame of a connection as a codec handshake.
+
+    Args:
+        message (bytes): The first payload received from the client.
+        supported (Optional[List[str]]): Codecs the server accepts. Defaults to all registered codecs.
+
+    Returns:
+        Optional[DataProcessor]: The processor agreed for the connection, or None
+                                 if the frame is not a handshake.
+    """
+    try:
+        data = JsonDataProcessor().from_web(message)
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or HELLO_KEY not in data:
+        return None
+    if supported is None:
+        supported = DataProcessor.available()
+    for name in data[HELLO_KEY].get("codecs", []):
+        if name in supported:
+            return DataProcessor.get(name)
+    return JsonDataProcessor()
+
+
+def is_subscriber(message: bytes) -> bool:
+    """
+    Tells whether the client sending this handshake wants relayed messages.
+    """
+    hello = JsonDataProcessor().from_web(message)[HELLO_KEY]
+    return hello.get("subscribe", True)
+
+
+def codec_reply(processor: DataProcessor) -> bytes:
+    """
+    Payload answering a codec handshake, always encoded as JSON.
+    """
+    return JsonDataProcessor().to_web({"codec": processor.name})
+
+
+def encode_once(
+    processor: DataProcessor, data: Any, encoded: Dict[str, bytes]
+) -> bytes:
+    """
+    Encodes `data` with `processor`, reusing a previous encoding with the same codec.
+
+    Args:
+        processor (DataProcessor): The codec of the recipient.
+        data (Any): The message to encode.
+        encoded (Dict[str, bytes]): Encodings of `data` made so far, keyed by codec name.
+
+    Returns:
+        bytes: The encoded message.
+    """
+    payload = encoded.get(processor.name)
+    if payload is None:
+        payload = encoded[processor.name] = processor.to_web(data)
+    return payload
+
+
+# Health checks: `{"ping": token}` is answered with `{"pong": token}` by every
+# server, and never relayed.
+PING_KEY = "ping"
+PONG_KEY = "pong"
+_PING_PREFIX = b'{"ping"'
+
+
+def pong_for(data: Any) -> Optional[Dict[str, Any]]:
+    """
+    Returns the reply to a health check, or None if `data` is not one.
+    """
+    if isinstance(data, dict) and len(data) == 1 and PING_KEY in data:
+        return {PONG_KEY: data[PING_KEY]}
+    return None
+
+
+def raw_pong_for(payload: Union[bytes, memoryview]) -> Optional[bytes]:
+    """
+    Returns the JSON reply to a health check for relays that do not decode frames.
+    """
+    if bytes(payload[: len(_PING_PREFIX)]) != _PING_PREFIX:
+        return None
+    try:
+        reply = pong_for(json.loads(bytes(payload)))
+    except ValueError:
+        return None
+    return JsonDataProcessor().to_web(reply) if reply is not None else None
+
+
+# --------------------------- Message Framing ---------------------------
+
+# Every message on the wire is a frame: a 4-byte big-endian payload length
+# followed by the payload itself. This lets a single socket carry payloads of
+# any size as well as many back-to-back messages without ambiguity.
+FRAME_HEADER = struct.Struct("!I")
+FRAME_HEADER_SIZE = FRAME_HEADER.size
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+RECV_BUFFER_SIZE = 64 * 1024
+
+
+class FrameError(Exception):
+    """
+    Raised when a peer sends a frame that violates the framing protocol.
+    """
+
+
+def encode_frame(payload: bytes) -> bytes:
+    """
+    Prefixes a payload with its length header.
+
+    Args:
+        payload (bytes): The serialized message.
+
+    Returns:
+        bytes: The frame ready to be written on the socket.
+
+    Raises:
+        FrameError: If the payload exceeds `MAX_FRAME_SIZE`.
+    """
+    if len(payload) > MAX_FRAME_SIZE:
+        raise FrameError(
+            f"Frame of {len(payload)} bytes exceeds the maximum of {MAX_FRAME_SIZE} bytes."
+        )
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+class FrameDecoder:
+    """
+    Reassembly buffer turning a stream of bytes into complete frames.
+
+    Bytes are fed as they come off the socket, in chunks of arbitrary size;
+    complete payloads are handed out in order while any trailing partial frame
+    is kept until the rest of it arrives.
+    """
+
+    def __init__(self, max_frame_size: int = MAX_FRAME_SIZE):
+        self._buffer = bytearray()
+        self.max_frame_size = max_frame_size
+
+    def feed(self, data: bytes) -> None:
+        """
+        Appends raw bytes received from the socket to the buffer.
+        """
+        self._buffer += data
+
+    def next_frame(self) -> Optional[bytes]:
+        """
+        Pops the next complete payload from the buffer.
+
+        Returns:
+            Optional[bytes]: The payload, or None if no complete frame is buffered yet.
+
+        Raises:
+            FrameError: If the announced frame length exceeds `max_frame_size`.
+        """
+        if len(self._buffer) < FRAME_HEADER_SIZE:
+            return None
+        (length,) = FRAME_HEADER.unpack_from(self._buffer, 0)
+        if length > self.max_frame_size:
+            raise FrameError(
+                f"Announced frame of {length} bytes exceeds the maximum of {self.max_frame_size} bytes."
+            )
+        end = FRAME_HEADER_SIZE + length
+        if len(self._buffer) < end:
+            return None
+        payload = bytes(self._buffer[FRAME_HEADER_SIZE:end])
+        del self._buffer[:end]
+        return payload
+
+    def frames(self) -> Iterator[bytes]:
+        """
+        Yields every complete payload currently buffered.
+        """
+        while True:
+            payload = self.next_frame()
+            if payload is None:
+                return
+            yield payload
+
+    @property
+    def pending(self) -> int:
+        """
+        Number of buffered bytes not yet returned as a frame.
+        """
+        return len(self._buffer)
+
+
+def send_frame(sock: socket.socket, payload: bytes) -> None:
+    """
+    Writes a single framed payload on the socket.
+    """
+    sock.sendall(encode_frame(payload))
+
+
+def recv_frame(sock: socket.socket, decoder: FrameDecoder) -> Optional[bytes]:
+    """
+    Reads from the socket until a complete frame is available.
+
+    Bytes received past the end of the frame stay in the decoder and are
+    returned by the following calls, so the same decoder must be reused for the
+    whole lifetime of the socket.
+
+    Args:
+        sock (socket.socket): The connected socket to read from.
+        decoder (FrameDecoder): The reassembly buffer bound to this socket.
+
+    Returns:
+        Optional[bytes]: The payload, or None if the peer closed the connection.
+    """
+    while True:
+        payload = decoder.next_frame()
+        if payload is not None:
+            return payload
+        chunk = sock.recv(RECV_BUFFER_SIZE)
+        if not chunk:
+            return None
+        decoder.feed(chunk)
+
+
+# ---------------------------- Job Envelopes ----------------------------
+
+# Items produced by a crawl travel in an envelope stamped with the id of the
+# job that requested them, so a consumer serving many requests at once can
+# hand every item to the request it belongs to.
+JOB_ID_KEY = "job_id"
+QUERY_KEY = "query"
+ITEM_KEY = "item"
+# Several envelopes sent as one message, acknowledged once
+BATCH_KEY = "batch"
+
+
+def make_envelope(job_id: Optional[str], item: Any, query: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Wraps an item with the id of the job, and optionally the query, it was produced for.
+    """
+    return {JOB_ID_KEY: job_id, QUERY_KEY: query, ITEM_KEY: item}
+
+
+def make_batch(envelopes: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Groups envelopes in a single message.
+    """
+    return {BATCH_KEY: envelopes}
+
+
+def iter_envelopes(message: Any) -> Iterator[Any]:
+    """
+    Yields the envelopes of a batch, or the message itself if it is not one.
+    """
+    if isinstance(message, dict) and isinstance(message.get(BATCH_KEY), list):
+        yield from message[BATCH_KEY]
+    else:
+        yield message
+
+
+def open_envelope(message: Any) -> Tuple[Optional[str], Optional[str], Any]:
+    """
+    Splits a message into job id, query and item.
+
+    Returns:
+        Tuple[Optional[str], Optional[str], Any]: For messages that are not envelopes,
+                                                  no job id and query, and the message itself.
+    """
+    if isinstance(message, dict) and JOB_ID_KEY in message and ITEM_KEY in message:
+        return message[JOB_ID_KEY], message.get(QUERY_KEY), message[ITEM_KEY]
+    return None, None, message
+
+
+class JobDemultiplexer:
+    """
+    Routes enveloped messages to one asyncio queue per open job.
+
+    Meant to be fed from an event loop, e.g. as a listener of an
+    `AsyncTCPRelayServer`. Messages for jobs nobody waits for are counted and
+    discarded.
+    """
+
+    def __init__(self):
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self.routed = 0
+        self.unrouted = 0
+
+    def open(self, job_id: str) -> asyncio.Queue:
+        """
+        Starts collecting the items of a job.
+
+        Returns:
+            asyncio.Queue: Receives the job's items in arrival order.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        self._queues[job_id] = queue
+        return queue
+
+    def close(self, job_id: str) -> None:
+        """
+        Stops collecting the items of a job.
+        """
+        self._queues.pop(job_id, None)
+
+    def dispatch(self, message: Any) -> None:
+        """
+        Delivers a message, or each envelope of a batch, to the queue of its job.
+        """
+        for envelope in iter_envelopes(message):
+            job_id, _, item = open_envelope(envelope)
+            queue = self._queues.get(job_id) if job_id is not None else None
+            if queue is None:
+                self.unrouted += 1
+                continue
+            queue.put_nowait(item)
+            self.routed += 1
+
+
 # ----------------------------- TCPClient -----------------------------
 
 
@@ -95,10 +557,18 @@ class TCPClient:
             params (ClientConnectionParameters): Configuration parameters for the client, including
                                                   server address, port, and other connection details.
         """
-        self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.params = params
+        self._reset()
+
+    def _reset(self) -> None:
+        # A fresh, unconnected socket and no state left from a previous connection
+        family = socket.AF_UNIX if self.params.unix_path else socket.AF_INET
+        self.client_socket = socket.socket(family, socket.SOCK_STREAM)
         self.is_connected = False
         self.connected_at: Optional[Tuple[str, int]] = None
-        self.params = params
+        self.processor: DataProcessor = JsonDataProcessor()
+        self._decoder = FrameDecoder()
+        self._backlog: List[bytes] = []
 
     def connect(self, timeout: float) -> None:
         """
@@ -114,18 +584,59 @@ class TCPClient:
         Raises:
             Exception: If the connection cannot be established within the given timeout.
         """
-        print(f"Connecting to {self.params.address}:{self.params.port}")
+        print(f"Connecting to {describe_endpoint(self.params)}")
 
         try:
             if timeout:
                 self.client_socket.settimeout(timeout)
-            self.client_socket.connect((self.params.address, self.params.port))
+            if self.params.unix_path:
+                self.client_socket.connect(self.params.unix_path)
+            else:
+                self.client_socket.connect((self.params.address, self.params.port))
+            if self.params.codecs or not self.params.subscribe:
+                self._negotiate_codec()
+            # Only once the handshake is over: a half-open socket is no connection
             self.is_connected = True
             self.connected_at = (self.params.address, self.params.port)
             print("CLIENT SAYS: Successfully connected!")
-            return(f"CLIENT SAYS: Client successfully connected at address: {self.connected_at[0]}, port: {self.connected_at[1]}")
+            return(f"CLIENT SAYS: Client successfully connected at {describe_endpoint(self.params)}")
         except Exception as e:
             print(f"CLIENT SAYS: Connection error: {e}")
+            self.client_socket.close()
+            self._reset()
+
+    def _negotiate_codec(self) -> None:
+        """
+        Agrees with the server on the codec used for the rest of the connection.
+
+        Messages relayed to this client before the server's answer are still
+        JSON-encoded; they are re-encoded with the agreed codec and queued so
+        that later reads see a single codec.
+        """
+        json_processor = JsonDataProcessor()
+        send_frame(
+            self.client_socket,
+            json_processor.to_web(
+                {
+                    HELLO_KEY: {
+                        "codecs": self.params.codecs or [DEFAULT_CODEC],
+                        "subscribe": self.params.subscribe,
+                    }
+                }
+            ),
+        )
+        early_messages = []
+        while True:
+            payload = recv_frame(self.client_socket, self._decoder)
+            if payload is None:
+                raise ConnectionError("Server closed the connection during the handshake.")
+            data = json_processor.from_web(payload)
+            if isinstance(data, dict) and set(data) == {"codec"}:
+                break
+            early_messages.append(data)
+        self.processor = DataProcessor.get(data["codec"])
+        self._backlog.extend(self.processor.to_web(message) for message in early_messages)
+        print(f"CLIENT SAYS: Using codec '{self.processor.name}'")
 
     def send_as_json(self, data: Any, timeout: float) -> Any:
         """
@@ -133,7 +644,8 @@ class TCPClient:
 
         This method serializes the input data to JSON, sends it to the connected server, and
         then waits for a response. The response is also expected to be in JSON format and is
-        deserialized before being returned.
+        deserialized before being returned. If a different codec was negotiated on connection
+        it is used in place of JSON in both directions.
 
         Args:
             data (Any): Data to send, which will be serialized into JSON.
@@ -150,11 +662,13 @@ class TCPClient:
             raise Exception("Not connected to a server.")
 
         try:
-            processor = JsonDataProcessor()
+            processor = self.processor
             if timeout:
                 self.client_socket.settimeout(timeout)
-            self.client_socket.sendall(processor.to_web(data))  # Send serialized data
-            response = self.client_socket.recv(1024)  # Receive server's response
+            send_frame(self.client_socket, processor.to_web(data))  # Send serialized data
+            response = self.receive_frame(timeout)  # Receive server's response
+            if response is None:
+                raise ConnectionError("Server closed the connection.")
             return processor.from_web(response)  # Deserialize and return the response
         except socket.timeout:
             print(f"CLIENT SAYS: Request timed out after {timeout} seconds.")
@@ -162,6 +676,59 @@ class TCPClient:
             print(f"CLIENT SAYS: Error sending data: {e}")
             self._close_connection()
 
+    def send_frame(self, payload: bytes) -> None:
+        """
+        Sends an already serialized payload as a single frame, without waiting for a response.
+
+        Args:
+            payload (bytes): The serialized message.
+
+        Raises:
+            Exception: If the client is not connected to a server.
+        """
+        if not self.is_connected:
+            raise Exception("Not connected to a server.")
+        send_frame(self.client_socket, payload)
+
+    def receive_frame(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        """
+        Waits for the next frame sent by the server.
+
+        Args:
+            timeout (Optional[float]): Timeout in seconds, or None to block until a frame arrives.
+
+        Returns:
+            Optional[bytes]: The payload, or None if the server closed the connection.
+
+        Raises:
+            Exception: If the client is not connected to a server.
+            socket.timeout: If no complete frame arrives within `timeout`.
+        """
+        if not self.is_connected:
+            raise Exception("Not connected to a server.")
+        if self._backlog:
+            return self._backlog.pop(0)
+        self.client_socket.settimeout(timeout)
+        return recv_frame(self.client_socket, self._decoder)
+
+    def receive_as_json(self, timeout: Optional[float] = None) -> Any:
+        """
+        Waits for the next frame sent by the server and deserializes it from JSON,
+        or from the codec negotiated on connection.
+
+        This is how consumers read messages relayed to them by a `TCPRelayServer`.
+
+        Args:
+            timeout (Optional[float]): Timeout in seconds, or None to block until a message arrives.
+
+        Returns:
+            Any: The JSON-decoded message, or None if the server closed the connection.
+        """
+        payload = self.receive_frame(timeout)
+        if payload is None:
+            return None
+        return self.processor.from_web(payload)
+
     def ping(self, timeout: float) -> bool:
         """
         Sends a ping message to check if the client is still connected to the server.
@@ -222,6 +789,199 @@ class TCPClient:
     
 
 
+# --------------------------- TCPClientPool ---------------------------
+
+
+class TCPClientPool:
+    """
+    A thread-safe pool of connected `TCPClient`s sharing the same parameters.
+
+    Clients are handed out with `connection()` and reused once given back.
+    Idle clients are pinged every `health_check_interval` seconds, and any
+    client found dead, either by a health check or because a send failed and
+    closed it, is replaced by a new connection. Connecting retries with
+    exponential backoff, so a pool survives the relay being restarted.
+
+    Pooled clients should be producers (`subscribe=False`): replies to their
+    requests must not be mixed with messages relayed from other clients.
+    """
+
+    _shared: Dict[Tuple, "TCPClientPool"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(
+        self,
+        params: ClientConnectionParameters,
+        size: int = 4,
+        connect_timeout: float = 5,
+        health_check_interval: float = 30,
+        initial_backoff: float = 0.1,
+        max_backoff: float = 5,
+    ):
+        """
+        Args:
+            params (ClientConnectionParameters): Parameters every client connects with.
+            size (int): Maximum number of clients open at once.
+            connect_timeout (float): Timeout in seconds of each connection attempt.
+            health_check_interval (float): Seconds between pings of idle clients, 0 to disable them.
+            initial_backoff (float): Seconds to wait after the first failed connection attempt.
+            max_backoff (float): Longest wait between two connection attempts.
+        """
+        self.params = params
+        self.size = size
+        self.connect_timeout = connect_timeout
+        self.health_check_interval = health_check_interval
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self._idle: List[TCPClient] = []
+        self._open = 0
+        self._closed = False
+        self._available = threading.Condition()
+        self._stop = threading.Event()
+        self.connects = 0
+        self.reconnects = 0
+        self.failed_health_checks = 0
+        if health_check_interval > 0:
+            threading.Thread(target=self._check_health, daemon=True).start()
+
+    @classmethod
+    def shared(cls, params: ClientConnectionParameters, **kwargs) -> "TCPClientPool":
+        """
+        Returns the process-wide pool for `params`, creating it on first use.
+
+        Lets short-lived users, like the pipelines of a single crawl, reuse the
+        connections of the crawls that ran before them in the same process.
+        """
+        key = (
+            params.address,
+            params.port,
+            params.unix_path,
+            tuple(params.codecs or ()),
+            params.subscribe,
+        )
+        with cls._shared_lock:
+            pool = cls._shared.get(key)
+            if pool is None or pool._closed:
+                pool = cls._shared[key] = cls(params, **kwargs)
+            return pool
+
+    def acquire(self, timeout: Optional[float] = None) -> TCPClient:
+        """
+        Takes an idle client, or connects a new one if the pool is not full.
+
+        Args:
+            timeout (Optional[float]): Seconds to wait for a client, None to wait forever.
+
+        Returns:
+            TCPClient: A connected client, to be given back with `release`.
+
+        Raises:
+            TimeoutError: If no client could be obtained within `timeout`.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._available:
+            while not self._idle and self._open >= self.size:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("No client available in the pool.")
+                self._available.wait(remaining)
+            if self._idle:
+                return self._idle.pop()
+            self._open += 1
+        try:
+            return self._connect(deadline)
+        except Exception:
+            with self._available:
+                self._open -= 1
+                self._available.notify()
+            raise
+
+    def release(self, client: TCPClient) -> None:
+        """
+        Gives a client back, dropping it if its connection was closed.
+        """
+        with self._available:
+            if client.is_connected and not self._closed:
+                self._idle.append(client)
+            else:
+                client.close()
+                self._open -= 1
+            self._available.notify()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None) -> Iterator[TCPClient]:
+        """
+        Lends a client for the duration of a `with` block.
+        """
+        client = self.acquire(timeout)
+        try:
+            yield client
+        finally:
+            self.release(client)
+
+    def close(self) -> None:
+        """
+        Stops the health checks and closes the idle clients. Lent clients are
+        closed when given back.
+        """
+        self._stop.set()
+        with self._available:
+            self._closed = True
+            for client in self._idle:
+                client.close()
+            self._open -= len(self._idle)
+            self._idle.clear()
+            self._available.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._available:
+            return {
+                "open": self._open,
+                "idle": len(self._idle),
+                "connects": self.connects,
+                "reconnects": self.reconnects,
+                "failed_health_checks": self.failed_health_checks,
+            }
+
+    def _connect(self, deadline: Optional[float]) -> TCPClient:
+        backoff = self.initial_backoff
+        while True:
+            client = TCPClient(self.params)
+            client.connect(timeout=self.connect_timeout)
+            if client.is_connected:
+                self.connects += 1
+                return client
+            if self._closed:
+                raise ConnectionError("The pool is closed.")
+            # Jittered, so clients of a restarted relay do not all retry at once
+            delay = backoff * random.uniform(0.5, 1.0)
+            if deadline is not None and time.monotonic() + delay > deadline:
+                raise TimeoutError(
+                    f"Could not connect to {describe_endpoint(self.params)}."
+                )
+            time.sleep(delay)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def _check_health(self) -> None:
+        while not self._stop.wait(self.health_check_interval):
+            with self._available:
+                idle, self._idle = self._idle, []
+            for client in idle:
+                if client.is_connected and client.ping(timeout=self.connect_timeout):
+                    self.release(client)
+                    continue
+                self.failed_health_checks += 1
+                client.close()
+                try:
+                    replacement = self._connect(deadline=None)
+                except ConnectionError:
+                    # Closed while reconnecting
+                    self.release(client)
+                    continue
+                self.reconnects += 1
+                self.release(replacement)
+
+
 # ----------------------------- TCPServer -----------------------------
 
 
@@ -238,25 +998,39 @@ class TCPServer:
             params (ServerConnectionParameters): Configuration parameters for the server.
         """
         self.params = params
-        self._server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self._server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if params.unix_path:
+            self._server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self._server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # Unix socket peers have no address: they are told apart by a counter
+        self._unix_peers = itertools.count()
         self.clients = {}
+        self.processors: Dict[Tuple[str, int], DataProcessor] = {}
+        self.producers: Set[Tuple[str, int]] = set()
         self.lock = threading.Lock()
 
     def _bind(self) -> None:
-        self._server_socket.bind((self.params.address, self.params.port))
+        if self.params.unix_path:
+            _remove_stale_socket(self.params.unix_path)
+            self._server_socket.bind(self.params.unix_path)
+        else:
+            self._server_socket.bind((self.params.address, self.params.port))
 
     def _listen(self) -> None:
         self._server_socket.listen(self.params.maximum_clients)
-        print(f"Server listening on {self.params.address}:{self.params.port}")
+        print(f"Server listening on {describe_endpoint(self.params)}")
 
     def _accept_connections(self) -> None:
         try:
             while True:
                 client_socket, client_address = self._server_socket.accept()
+                if not client_address:
+                    client_address = (self.params.unix_path, next(self._unix_peers))
                 print(f"SERVER SAYS: New connection from {client_address}")
                 with self.lock:
                     self.clients[client_address] = client_socket
+                    self.processors[client_address] = JsonDataProcessor()
                 threading.Thread(
                     target=self.handle, args=(client_socket, client_address)
                 ).start()
@@ -280,26 +1054,60 @@ class TCPServer:
         except Exception as e:
             print(f"SERVER SAYS: Error starting server: {e}")
 
+    def _negotiate(
+        self,
+        client_socket: socket.socket,
+        client_address: Tuple[str, int],
+        message: bytes,
+    ) -> bool:
+        """
+        Handles the codec handshake if `message` is one.
+
+        Returns:
+            bool: True if the message was a handshake and has been answered.
+        """
+        # A pass-through relay cannot transcode, so everyone has to stay on JSON
+        supported = [DEFAULT_CODEC] if self.params.passthrough else None
+        processor = negotiate_codec(message, supported)
+        if processor is None:
+            return False
+        # Under the lock, so every frame relayed to this client before the reply
+        # is JSON and every frame after it uses the agreed codec
+        with self.lock:
+            self.processors[client_address] = processor
+            if not is_subscriber(message):
+                self.producers.add(client_address)
+            send_frame(client_socket, codec_reply(processor))
+        return True
+
     def handle(
         self, client_socket: socket.socket, client_address: Tuple[str, int]
     ) -> None:
         """
         Handles communication with a single client.
         """
+        decoder = FrameDecoder()
         try:
+            first_frame = True
             while True:
-                message = client_socket.recv(1024)
-                if not message:
+                message = recv_frame(client_socket, decoder)
+                if message is None:
                     break
-                processor = JsonDataProcessor()
+                if first_frame:
+                    first_frame = False
+                    if self._negotiate(client_socket, client_address, message):
+                        continue
+                processor = self.processors[client_address]
                 data = processor.from_web(message)
                 print(f"SERVER SAYS: Message from {client_address}: {data}")
-                client_socket.sendall(processor.to_web(data))
+                send_frame(client_socket, processor.to_web(pong_for(data) or data))
         except Exception as e:
             print(f"SERVER SAYS: Error handling client {client_address}: {e}")
         finally:
             with self.lock:
                 del self.clients[client_address]
+                del self.processors[client_address]
+                self.producers.discard(client_address)
             client_socket.close()
             print(f"SERVER SAYS: Client {client_address} disconnected")
 
@@ -310,6 +1118,9 @@ class TCPServer:
 class TCPRelayServer(TCPServer):
     """
     A TCP relay server that broadcasts messages received from one client to all other connected clients.
+
+    With `passthrough` set in its parameters, frames are forwarded as raw bytes
+    straight out of a preallocated receive buffer, without being decoded.
     """
 
     def handle(
@@ -318,82 +1129,594 @@ class TCPRelayServer(TCPServer):
         """
         Handles communication with a single client and relays their messages to all other clients.
         """
+        if self.params.passthrough:
+            self._forward_raw(client_socket, client_address)
+            return
+        decoder = FrameDecoder()
         try:
+            first_frame = True
             while True:
-                message = client_socket.recv(1024)
-                if not message:
+                message = recv_frame(client_socket, decoder)
+                if message is None:
                     break
-                processor = JsonDataProcessor()
+                if first_frame:
+                    first_frame = False
+                    if self._negotiate(client_socket, client_address, message):
+                        continue
+                processor = self.processors[client_address]
                 data = processor.from_web(message)
+                pong = pong_for(data)
+                if pong is not None:
+                    with self.lock:
+                        send_frame(client_socket, processor.to_web(pong))
+                    continue
                 print(f"SERVER SAYS: Message from {client_address}: {data}")
-                # Relay the message to other clients
+                # Relay the message to other clients, encoding it at most once per codec
+                encoded = {processor.name: message}
                 with self.lock:
-                    for address, socket in self.clients.items():
-                        if address != client_address:
-                            socket.sendall(processor.to_web(data))
-                client_socket.sendall(processor.to_web({"Status": "OK"}))
+                    for address, peer_socket in self.clients.items():
+                        if address != client_address and address not in self.producers:
+                            send_frame(
+                                peer_socket,
+                                encode_once(self.processors[address], data, encoded),
+                            )
+                    # Acknowledge under the lock too, so the ack never interleaves
+                    # with a frame another handler is relaying to this client
+                    send_frame(client_socket, processor.to_web({"Status": "OK"}))
         except Exception as e:
             print(f"Error handling client {client_address}: {e}")
         finally:
             with self.lock:
                 del self.clients[client_address]
+                del self.processors[client_address]
+                self.producers.discard(client_address)
             client_socket.close()
             print(f"Client {client_address} disconnected")
 
 
-from typing import Union
+    def _forward_raw(
+        self, client_socket: socket.socket, client_address: Tuple[str, int]
+    ) -> None:
+        """
+        Relays a client's frames to all other clients without decoding them.
+
+        Data is received with `recv_into` in a buffer allocated once per client,
+        and every complete frame is forwarded as a `memoryview` slice of it. A
+        trailing partial frame is moved to the front of the buffer, which only
+        grows when a single frame does not fit in it.
+        """
+        buffer = bytearray(RECV_BUFFER_SIZE)
+        view = memoryview(buffer)
+        start = end = 0  # Received bytes not yet forwarded are buffer[start:end]
+        first_frame = True
+        try:
+            while True:
+                while end - start >= FRAME_HEADER_SIZE:
+                    (length,) = FRAME_HEADER.unpack_from(buffer, start)
+                    if length > MAX_FRAME_SIZE:
+                        raise FrameError(
+                            f"Announced frame of {length} bytes exceeds the maximum of {MAX_FRAME_SIZE} bytes."
+                        )
+                    frame_end = start + FRAME_HEADER_SIZE + length
+                    if frame_end > end:
+                        break
+                    if first_frame:
+                        first_frame = False
+                        payload = bytes(view[start + FRAME_HEADER_SIZE : frame_end])
+                        if self._negotiate(client_socket, client_address, payload):
+                            start = frame_end
+                            continue
+                    frame = view[start:frame_end]
+                    pong = raw_pong_for(view[start + FRAME_HEADER_SIZE : frame_end])
+                    if pong is not None:
+                        with self.lock:
+                            send_frame(client_socket, pong)
+                        start = frame_end
+                        continue
+                    with self.lock:
+                        for address, peer_socket in self.clients.items():
+                            if address != client_address and address not in self.producers:
+                                peer_socket.sendall(frame)
+                        client_socket.sendall(_RAW_ACK_FRAME)
+                    start = frame_end
+
+                # Move the partial frame to the front, growing the buffer if the
+                # whole frame cannot fit
+                pending = end - start
+                if pending >= FRAME_HEADER_SIZE:
+                    needed = FRAME_HEADER_SIZE + FRAME_HEADER.unpack_from(buffer, start)[0]
+                else:
+                    needed = FRAME_HEADER_SIZE
+                if needed > len(buffer):
+                    grown = bytearray(needed)
+                    grown[:pending] = view[start:end]
+                    view.release()
+                    buffer, view = grown, memoryview(grown)
+                elif start:
+                    view[:pending] = view[start:end]
+                start, end = 0, pending
+
+                received = client_socket.recv_into(view[end:])
+                if not received:
+                    break
+                end += received
+        except Exception as e:
+            print(f"Error handling client {client_address}: {e}")
+        finally:
+            view.release()
+            with self.lock:
+                del self.clients[client_address]
+                del self.processors[client_address]
+                self.producers.discard(client_address)
+            client_socket.close()
+            print(f"Client {client_address} disconnected")
+
+
+_RAW_ACK_FRAME = encode_frame(JsonDataProcessor().to_web({"Status": "OK"}))
+
+
+# ------------------------ Asyncio Stream Servers ------------------------
+
+
+async def read_frame(
+    reader: asyncio.StreamReader, max_frame_size: int = MAX_FRAME_SIZE
+) -> Optional[bytes]:
+    """
+    Reads a single framed payload from an asyncio stream.
+
+    Args:
+        reader (asyncio.StreamReader): The stream bound to the peer.
+        max_frame_size (int): Largest payload accepted from the peer.
+
+    Returns:
+        Optional[bytes]: The payload, or None if the peer closed the connection
+                         cleanly between two frames.
+
+    Raises:
+        FrameError: If the announced frame length exceeds `max_frame_size`.
+        asyncio.IncompleteReadError: If the peer disconnects in the middle of a frame.
+    """
+    try:
+        header = await reader.readexactly(FRAME_HEADER_SIZE)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise
+    (length,) = FRAME_HEADER.unpack(header)
+    if length > max_frame_size:
+        raise FrameError(
+            f"Announced frame of {length} bytes exceeds the maximum of {max_frame_size} bytes."
+        )
+    return await reader.readexactly(length)
+
+
+class AsyncPeer:
+    """
+    A client connected to an asyncio server, with its own bounded outbound queue.
+
+    Frames addressed to the peer are queued and written by a dedicated task, so
+    the coroutine producing them never waits on the peer's socket.
+
+    Attributes:
+        address (Tuple[str, int]): The peer's address.
+        processor (DataProcessor): The codec negotiated with the peer, JSON by default.
+        subscribed (bool): Whether the peer is forwarded messages relayed from others.
+        dropped (int): Number of relayed frames discarded because the queue was full
+                       or the peer was shed.
+        max_queue_depth (int): Largest number of frames queued at once.
+        shed (bool): Whether the peer lagged for too long: relayed frames are dropped
+                     instead of queued until its queue drains below the low watermark.
+    """
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        writer: asyncio.StreamWriter,
+        queue_size: int,
+        high_watermark: Optional[int] = None,
+        low_watermark: int = 0,
+    ):
+        self.address = address
+        self.processor: DataProcessor = JsonDataProcessor()
+        self.subscribed = True
+        self.dropped = 0
+        self.max_queue_depth = 0
+        self.shed = False
+        self.high_watermark = high_watermark if high_watermark is not None else queue_size
+        self.low_watermark = low_watermark
+        self._writer = writer
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        # Set while the queue is below the high watermark, or back below the low one
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._writer_task = asyncio.create_task(self._write_loop())
+
+    async def send(self, frame: bytes) -> None:
+        """
+        Queues a frame, waiting for room if the queue is full.
+
+        Used for replies to the peer's own requests, which must never be dropped.
+        """
+        await self._queue.put(frame)
+
+    def offer(self, frame: bytes) -> bool:
+        """
+        Queues a frame without waiting.
+
+        Returns:
+            bool: False if the queue was full or the peer is shed, and the frame was dropped.
+        """
+        if self.shed:
+            self.dropped += 1
+            return False
+        try:
+            self._queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        depth = self._queue.qsize()
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+        if depth >= self.high_watermark:
+            self._drained.clear()
+        return True
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def congested(self) -> bool:
+        """
+        Whether the queue crossed the high watermark and is not yet back below the low one.
+        """
+        return not self._drained.is_set()
+
+    async def wait_drained(self) -> None:
+        await self._drained.wait()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "dropped": self.dropped,
+            "subscribed": self.subscribed,
+            "congested": self.congested,
+            "shed": self.shed,
+        }
+
+    async def _write_loop(self) -> None:
+        try:
+            while True:
+                self._writer.write(await self._queue.get())
+                # Coalesce whatever else is already queued into the same drain
+                while not self._queue.empty():
+                    self._writer.write(self._queue.get_nowait())
+                await self._writer.drain()
+                if self._queue.qsize() <= self.low_watermark:
+                    self._drained.set()
+                    self.shed = False
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"SERVER SAYS: Error writing to client {self.address}: {e}")
+
+    async def close(self) -> None:
+        """
+        Stops the writer task and closes the connection.
+        """
+        self._writer_task.cancel()
+        # Nobody should keep waiting on a client that is gone
+        self._drained.set()
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except Exception:
+            pass
+
+
+class AsyncTCPServer:
+    """
+    An asyncio TCP server handling every client as a coroutine on a single event loop.
+
+    Speaks the same framed JSON protocol as `TCPServer`, echoing each message
+    back to its sender.
+    """
+
+    def __init__(self, params: ServerConnectionParameters):
+        """
+        Initializes the asyncio TCP server.
+
+        Args:
+            params (ServerConnectionParameters): Configuration parameters for the server.
+        """
+        self.params = params
+        self.clients: Dict[Tuple[str, int], AsyncPeer] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._listeners: List[Callable[[Any], None]] = []
+        # Unix socket peers have no address: they are told apart by a counter
+        self._unix_peers = itertools.count()
+
+    def add_listener(self, callback: Callable[[Any], None]) -> None:
+        """
+        Registers a callback receiving every decoded message relayed by the server.
+
+        Listeners run on the server's event loop, which lets code living in the
+        same process consume relayed messages without a socket of its own.
+        They are not called by pass-through relays, which never decode messages.
+        """
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[Any], None]) -> None:
+        self._listeners.remove(callback)
+
+    async def start_server(self) -> None:
+        """
+        Binds the listening socket and starts accepting connections on the running loop.
+        """
+        if self.params.unix_path:
+            _remove_stale_socket(self.params.unix_path)
+            self._server = await asyncio.start_unix_server(
+                self._handle_connection,
+                path=self.params.unix_path,
+                backlog=self.params.maximum_clients,
+            )
+        else:
+            self._server = await asyncio.start_server(
+                self._handle_connection,
+                host=self.params.address,
+                port=self.params.port,
+                backlog=self.params.maximum_clients,
+                reuse_address=True,
+            )
+        print(f"Server listening on {describe_endpoint(self.params)}")
+        print("SERVER SAYS: Server is ready for connections.")
+
+    def is_serving(self) -> bool:
+        return self._server is not None and self._server.is_serving()
+
+    def flow_stats(self) -> Dict[str, Any]:
+        """
+        Reports the outbound queue of every connected client.
+        """
+        return {
+            "clients": {
+                f"{address[0]}:{address[1]}": peer.stats()
+                for address, peer in self.clients.items()
+            }
+        }
+
+    async def serve_forever(self) -> None:
+        """
+        Serves until the server is closed or the awaiting task is cancelled.
+        """
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        """
+        Stops accepting connections and disconnects every client.
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            if self.params.unix_path:
+                _remove_stale_socket(self.params.unix_path)
+        for peer in list(self.clients.values()):
+            await peer.close()
+        self.clients.clear()
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        client_address = writer.get_extra_info("peername")
+        if not client_address:
+            client_address = (self.params.unix_path, next(self._unix_peers))
+        print(f"SERVER SAYS: New connection from {client_address}")
+        peer = AsyncPeer(
+            client_address,
+            writer,
+            self.params.outbound_queue_size,
+            self.params.high_watermark,
+            self.params.low_watermark,
+        )
+        self.clients[client_address] = peer
+        try:
+            first_frame = True
+            while True:
+                message = await read_frame(reader)
+                if message is None:
+                    break
+                if first_frame:
+                    first_frame = False
+                    supported = [DEFAULT_CODEC] if self.params.passthrough else None
+                    processor = negotiate_codec(message, supported)
+                    if processor is not None:
+                        peer.processor = processor
+                        peer.subscribed = is_subscriber(message)
+                        await peer.send(encode_frame(codec_reply(processor)))
+                        continue
+                await self.handle(peer, message)
+        except Exception as e:
+            print(f"SERVER SAYS: Error handling client {client_address}: {e}")
+        finally:
+            self.clients.pop(client_address, None)
+            await peer.close()
+            print(f"SERVER SAYS: Client {client_address} disconnected")
+
+    async def handle(self, peer: AsyncPeer, message: bytes) -> None:
+        """
+        Handles a single message received from a client.
+        """
+        processor = peer.processor
+        data = processor.from_web(message)
+        await peer.send(encode_frame(processor.to_web(pong_for(data) or data)))
+
+
+class AsyncTCPRelayServer(AsyncTCPServer):
+    """
+    An asyncio relay server that broadcasts messages received from one client to all other connected clients.
+
+    Fan-out only ever enqueues on the recipients' bounded queues, and flow is
+    controlled with credits: producers wait for the acknowledgement of a
+    message before sending the next, so every acknowledgement grants one
+    credit. While a recipient's queue is above the high watermark, credits are
+    held back until it drains below the low watermark, slowing producers down
+    to the pace of the slowest consumer. A recipient lagging for longer than
+    `max_ack_delay` is shed: its frames are dropped and credits no longer wait
+    for it until it drains, so a stuck client cannot stall everyone else.
+    """
+
+    def __init__(self, params: ServerConnectionParameters):
+        super().__init__(params)
+        self.acks_delayed = 0
+        self.acks_forced = 0
+        self.ack_delay_total = 0.0
+        self.clients_shed = 0
+
+    async def handle(self, peer: AsyncPeer, message: bytes) -> None:
+        """
+        Relays a message to all other clients and acknowledges it to the sender.
+        """
+        if self.params.passthrough:
+            pong = raw_pong_for(message)
+            if pong is not None:
+                await peer.send(encode_frame(pong))
+                return
+            frame = encode_frame(message)
+            for address, other in self.clients.items():
+                if address == peer.address or not other.subscribed:
+                    continue
+                if not other.offer(frame) and not other.shed:
+                    print(f"SERVER SAYS: Outbound queue full for {address}, message dropped")
+            await self._wait_for_credit(peer)
+            await peer.send(_RAW_ACK_FRAME)
+            return
+        processor = peer.processor
+        data = processor.from_web(message)
+        pong = pong_for(data)
+        if pong is not None:
+            await peer.send(encode_frame(processor.to_web(pong)))
+            return
+        # Frame the message at most once per codec and share it between recipients
+        frames = {processor.name: encode_frame(message)}
+        for address, other in self.clients.items():
+            if address == peer.address or not other.subscribed:
+                continue
+            frame = frames.get(other.processor.name)
+            if frame is None:
+                frame = frames[other.processor.name] = encode_frame(
+                    other.processor.to_web(data)
+                )
+            if not other.offer(frame) and not other.shed:
+                print(f"SERVER SAYS: Outbound queue full for {address}, message dropped")
+        for listener in self._listeners:
+            listener(data)
+        await self._wait_for_credit(peer)
+        await peer.send(encode_frame(processor.to_web({"Status": "OK"})))
+
+    async def _wait_for_credit(self, sender: AsyncPeer) -> None:
+        """
+        Holds back the sender's acknowledgement while any recipient is congested.
+
+        Recipients still congested after `max_ack_delay` are shed, so later
+        acknowledgements no longer wait for them.
+        """
+        lagging = [
+            other
+            for other in self.clients.values()
+            if other is not sender and other.subscribed and other.congested and not other.shed
+        ]
+        if not lagging:
+            return
+        self.acks_delayed += 1
+        started = asyncio.get_running_loop().time()
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(other.wait_drained() for other in lagging)),
+                self.params.max_ack_delay,
+            )
+        except asyncio.TimeoutError:
+            self.acks_forced += 1
+            for other in lagging:
+                if other.congested and not other.shed:
+                    other.shed = True
+                    self.clients_shed += 1
+                    print(
+                        f"SERVER SAYS: Client {other.address} still lagging after "
+                        f"{self.params.max_ack_delay}s, dropping its messages until it catches up"
+                    )
+        self.ack_delay_total += asyncio.get_running_loop().time() - started
+
+    def flow_stats(self) -> Dict[str, Any]:
+        """
+        Reports the outbound queue of every client and how often credits were held back.
+        """
+        return {
+            **super().flow_stats(),
+            "acks_delayed": self.acks_delayed,
+            "acks_forced": self.acks_forced,
+            "ack_delay_total": self.ack_delay_total,
+            "clients_shed": self.clients_shed,
+        }
 
 
 async def setup_server(
     params: ServerConnectionParameters, 
     as_daemon: bool = True
-) -> Union[TCPServer, TCPRelayServer]:
+) -> Union[AsyncTCPServer, AsyncTCPRelayServer]:
     """
-    Sets up and starts a TCP server based on the provided parameters.
+    Sets up and starts an asyncio TCP server based on the provided parameters.
 
-    This function initializes either a standard TCP server or a relay server
+    This function initializes either a standard server or a relay server
     depending on the `is_relay` attribute of the `ServerConnectionParameters`.
-    The server starts immediately and can run in the foreground or as a daemon thread.
+    The server is bound and accepting connections on the running event loop
+    by the time this coroutine returns.
 
     Args:
         params (ServerConnectionParameters):
             The connection parameters for the server, including:
                 - address (str): The IP address to bind the server to.
                 - port (int): The port to bind the server to.
-                - maximum_clients (int): The maximum number of concurrent clients.
+                - maximum_clients (int): The listen backlog of the server.
                 - is_relay (bool): If True, creates a relay server; otherwise, creates a standard server.
+                - outbound_queue_size (int): Frames buffered per client before relayed messages are dropped.
+                - unix_path (Optional[str]): A Unix domain socket to listen on instead of
+                  `address` and `port`.
 
         as_daemon (bool, optional):
-            Whether to run the server as a background daemon thread.
+            Whether to return as soon as the server is running (True) or to keep
+            serving until the server is closed (False).
             Defaults to True.
 
     Returns:
-        Union[TCPServer, TCPRelayServer]:
-            The initialized and started server instance. Returns:
-                - TCPServer: If `is_relay` is False.
-                - TCPRelayServer: If `is_relay` is True.
+        Union[AsyncTCPServer, AsyncTCPRelayServer]:
+            The running server instance. Returns:
+                - AsyncTCPServer: If `is_relay` is False.
+                - AsyncTCPRelayServer: If `is_relay` is True.
 
     Raises:
-        Exception:
-            If the server fails to start due to binding or threading errors.
+        OSError:
+            If the server fails to bind to the requested address.
 
     Example:
         >>> params = ServerConnectionParameters(
         ...     address='127.0.0.1', port=8080, maximum_clients=5, is_relay=False
         ... )
-        >>> server = setup_server(params)
-        >>> # The server is now running in the background (as a daemon).
+        >>> server = await setup_server(params)
+        >>> # The server is now serving on the running event loop.
     """
     if params.is_relay:
-        server = TCPRelayServer(params)
+        server = AsyncTCPRelayServer(params)
         print("Setting up a relay server...")
     else:
         print("Setting up a standard server...")
-        server = TCPServer(params)
+        server = AsyncTCPServer(params)
 
-    server.start_server(as_daemon=as_daemon)
+    await server.start_server()
+    if not as_daemon:
+        await server.serve_forever()
     return server
 
+
 def setup_client(
     params: ClientConnectionParameters
 ) -> TCPClient:
@@ -408,7 +1731,8 @@ def setup_client(
             The connection parameters for the client, including:
                 - address (str): The server's IP address to connect to.
                 - port (int): The server's port to connect to.
-                - timeout (float): The connection timeout in seconds.
+                - unix_path (Optional[str]): The server's Unix domain socket, used instead
+                  of `address` and `port` when set.
 
     Returns:
         TCPClient:
@@ -425,7 +1749,7 @@ def setup_client(
         >>> client = setup_client(params)
         >>> # The client is now connected to the server and ready to send/receive data.
     """
-    print(f"Setting up a client to connect to {params.address}:{params.port}...")
+    print(f"Setting up a client to connect to {describe_endpoint(params)}...")
     
     # Initialize the client
     client = TCPClient(params)
@@ -433,7 +1757,7 @@ def setup_client(
     # Connect to the server
     try:
         client.connect(timeout=5)
-        print(f"Client connected to {params.address}:{params.port}")
+        print(f"Client connected to {describe_endpoint(params)}")
     except Exception as e:
         print(f"Failed to connect to the server: {e}")
         raise
@@ -0,0 +1,452 @@
+import multiprocessing as mp
+import os
+import queue
+import statistics
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field, replace
+from multiprocessing.connection import wait
+from typing import Any, Deque, Dict, List, Optional, Set, Type
+
+from scrapy import Spider
+from scrapy.settings import Settings
+
+
+# ---------------------------- Job Messages ----------------------------
+
+
+@dataclass
+class CrawlJob:
+    """
+    A crawl request sent to the workers.
+
+    Attributes:
+        job_id (str): Unique identifier of the job.
+        spider_kwargs (Dict[str, Any]): Arguments the spider is instantiated with.
+        settings (Dict[str, Any]): Scrapy settings overriding the pool's for this job only.
+    """
+
+    job_id: str
+    spider_kwargs: Dict[str, Any]
+    settings: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class CrawlResult:
+    """
+    The outcome of a crawl job.
+
+    Attributes:
+        job_id (str): Identifier of the job this result belongs to.
+        items (List[dict]): Items scraped by the spider, as plain dictionaries.
+        items_by_query (Dict[str, List[dict]]): The same items grouped by the `query`
+                                                meta key of the response they came from.
+        query (Optional[str]): The query this result is restricted to, if any.
+        error (Optional[str]): Failure message if the crawl failed.
+        worker_pid (int): Process id of the worker that ran the job.
+        crawl_time (float): Seconds the crawl itself took inside the worker.
+        latency (float): Seconds from submission to the result being available.
+    """
+
+    job_id: str
+    items: List[dict] = field(default_factory=list)
+    items_by_query: Dict[str, List[dict]] = field(default_factory=dict)
+    query: Optional[str] = None
+    error: Optional[str] = None
+    worker_pid: int = 0
+    crawl_time: float = 0.0
+    latency: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def for_query(self, query: str) -> "CrawlResult":
+        """
+        Restricts a batch result to the items scraped for a single query.
+        """
+        return replace(
+            self,
+            items=self.items_by_query.get(query, []),
+            items_by_query={},
+            query=query,
+        )
+
+
+@dataclass
+class _WorkerReady:
+    worker_pid: int
+
+
+# ---------------------------- Worker Process ----------------------------
+
+
+def _worker_main(
+    spider_cls: Type[Spider],
+    settings: Settings,
+    jobs: mp.Queue,
+    results: mp.Queue,
+    jobs_per_worker: int,
+) -> None:
+    """
+    Entry point of a crawler worker process.
+
+    Installs the reactor once, then keeps it running and schedules every job
+    pulled from `jobs` on it, so consecutive crawls only pay for the HTTP
+    fetch and the parsing.
+    """
+    from scrapy import signals
+    from scrapy.crawler import Crawler, CrawlerRunner
+    from scrapy.utils.log import configure_logging
+    from scrapy.utils.reactor import install_reactor
+    from itemadapter import ItemAdapter
+
+    if settings.get("TWISTED_REACTOR"):
+        install_reactor(settings["TWISTED_REACTOR"])
+    from twisted.internet import reactor
+
+    configure_logging(settings)
+    runner = CrawlerRunner(settings)
+    slots = threading.Semaphore(jobs_per_worker)
+
+    def run_job(job: CrawlJob) -> None:
+        started = time.perf_counter()
+        items: List[dict] = []
+        items_by_query: Dict[str, List[dict]] = {}
+
+        def collect(item, response=None, **kwargs):
+            item = ItemAdapter(item).asdict()
+            items.append(item)
+            query = response.meta.get("query") if response is not None else None
+            if query is not None:
+                items_by_query.setdefault(query, []).append(item)
+
+        def report(error: Optional[str]) -> None:
+            results.put(
+                CrawlResult(
+                    job_id=job.job_id,
+                    items=items,
+                    items_by_query=items_by_query,
+                    error=error,
+                    worker_pid=os.getpid(),
+                    crawl_time=time.perf_counter() - started,
+                )
+            )
+            slots.release()
+
+        try:
+            if job.settings:
+                job_settings = runner.settings.copy()
+                job_settings.setdict(job.settings, priority="cmdline")
+                crawler = Crawler(spider_cls, job_settings)
+            else:
+                crawler = runner.create_crawler(spider_cls)
+            # Strong reference: the closure would otherwise be collected right away
+            crawler.signals.connect(collect, signal=signals.item_scraped, weak=False)
+            # Spiders keep unknown keyword arguments as attributes, so every
+            # spider can read the id of the job it runs for
+            deferred = runner.crawl(crawler, job_id=job.job_id, **job.spider_kwargs)
+        except Exception as e:
+            report(str(e))
+            return
+        deferred.addCallbacks(
+            lambda _: report(None), lambda failure: report(failure.getErrorMessage())
+        )
+
+    def poll_jobs() -> None:
+        while True:
+            slots.acquire()
+            job = jobs.get()
+            if job is None:
+                # Let the crawls in flight finish: each gives its slot back when done
+                for _ in range(jobs_per_worker - 1):
+                    slots.acquire()
+                reactor.callFromThread(reactor.stop)
+                return
+            reactor.callFromThread(run_job, job)
+
+    threading.Thread(target=poll_jobs, daemon=True).start()
+    results.put(_WorkerReady(os.getpid()))
+    reactor.run(installSignalHandlers=False)
+
+
+# ---------------------------- CrawlerWorkerPool ----------------------------
+
+
+@dataclass
+class _Worker:
+    process: mp.Process
+    # Only this worker reads it: a process dying while it waits for a job
+    # holds the lock of the queue forever, so a shared queue would stall the pool
+    jobs: mp.Queue
+    job_ids: Set[str] = field(default_factory=set)
+
+
+class CrawlerWorkerPool:
+    """
+    A pool of long-lived crawler processes, each keeping a Twisted reactor running.
+
+    Each job is queued to the worker with the fewest unfinished jobs, which runs
+    it as soon as it has a free slot; results come back through a shared queue
+    and resolve the `Future` returned by `submit`. If a worker dies, its jobs
+    resolve with an error, and the pool starts again on the next `submit` once
+    no worker is left.
+    """
+
+    def __init__(
+        self,
+        spider_cls: Type[Spider],
+        settings: Settings,
+        size: int = 2,
+        jobs_per_worker: int = 4,
+        latency_window: int = 1000,
+    ):
+        """
+        Initializes the pool without starting any process.
+
+        Args:
+            spider_cls (Type[Spider]): The spider every job runs.
+            settings (Settings): Scrapy settings shared by all workers.
+            size (int): Number of worker processes.
+            jobs_per_worker (int): Crawls a single worker runs concurrently.
+            latency_window (int): Number of recent job latencies kept for `stats`.
+        """
+        self.spider_cls = spider_cls
+        self.settings = settings
+        self.size = size
+        self.jobs_per_worker = jobs_per_worker
+        # Spawned rather than forked: the parent may be running an event loop and threads
+        self._context = mp.get_context("spawn")
+        self._results = self._context.Queue()
+        self._workers: Dict[int, _Worker] = {}  # By process id
+        self._pending: Dict[str, Future] = {}
+        self._submitted_at: Dict[str, float] = {}
+        self._ready = threading.Semaphore(0)
+        self._lock = threading.RLock()
+        self._collector: Optional[threading.Thread] = None
+        self._latencies: Deque[float] = deque(maxlen=latency_window)
+        self._completed = 0
+        self._failed = 0
+
+    @property
+    def is_running(self) -> bool:
+        with self._lock:
+            return bool(self._workers)
+
+    def start(self, wait: bool = True, timeout: float = 60) -> None:
+        """
+        Spawns the workers.
+
+        Args:
+            wait (bool): Block until every worker has its reactor running.
+            timeout (float): Seconds to wait for each worker to become ready.
+
+        Raises:
+            TimeoutError: If a worker did not become ready in time.
+            RuntimeError: If a worker exited while starting.
+        """
+        with self._lock:
+            if self._workers:
+                return
+            processes = []
+            for _ in range(self.size):
+                jobs = self._context.Queue()
+                process = self._context.Process(
+                    target=_worker_main,
+                    args=(
+                        self.spider_cls,
+                        # Pickled as is: copy_to_dict would turn class keys of
+                        # component settings like ITEM_PIPELINES into strings
+                        self.settings,
+                        jobs,
+                        self._results,
+                        self.jobs_per_worker,
+                    ),
+                    daemon=True,
+                )
+                process.start()
+                self._workers[process.pid] = _Worker(process, jobs)
+                processes.append(process)
+            if self._collector is None or not self._collector.is_alive():
+                self._collector = threading.Thread(target=self._collect_results, daemon=True)
+                self._collector.start()
+        if wait:
+            for _ in processes:
+                self._wait_until_ready(processes, timeout)
+
+    def _wait_until_ready(self, processes: List[mp.Process], timeout: float) -> None:
+        # Polled, so a worker crashing on startup fails the start right away
+        deadline = time.monotonic() + timeout
+        while not self._ready.acquire(timeout=0.1):
+            exited = [process for process in processes if process.exitcode is not None]
+            if exited:
+                self.close()
+                raise RuntimeError(
+                    f"Crawler worker {exited[0].pid} exited with code {exited[0].exitcode} "
+                    "while starting."
+                )
+            if time.monotonic() > deadline:
+                self.close()
+                raise TimeoutError("Crawler worker did not start in time.")
+
+    def submit(
+        self,
+        settings: Optional[Dict[str, Any]] = None,
+        job_id: Optional[str] = None,
+        **spider_kwargs,
+    ) -> "Future[CrawlResult]":
+        """
+        Queues a crawl, starting the pool first if needed.
+
+        Args:
+            settings (Optional[Dict[str, Any]]): Scrapy settings overriding the pool's for this job.
+            job_id (Optional[str]): Identifier for the job, passed to the spider as `job_id`.
+                                    A random one is generated if omitted.
+            **spider_kwargs: Arguments the spider is instantiated with.
+
+        Returns:
+            Future[CrawlResult]: Resolved when a worker reports the job as done.
+        """
+        if not self.is_running:
+            self.start()
+        job = CrawlJob(
+            job_id=job_id or uuid.uuid4().hex,
+            spider_kwargs=spider_kwargs,
+            settings=settings or {},
+        )
+        future: Future = Future()
+        with self._lock:
+            if not self._workers:
+                raise RuntimeError("The crawler pool is closed.")
+            worker = min(self._workers.values(), key=lambda worker: len(worker.job_ids))
+            worker.job_ids.add(job.job_id)
+            self._pending[job.job_id] = future
+            self._submitted_at[job.job_id] = time.perf_counter()
+        worker.jobs.put(job)
+        return future
+
+    def _collect_results(self) -> None:
+        while True:
+            try:
+                message = self._results.get(timeout=0.5)
+            except queue.Empty:
+                self._reap_workers()
+                continue
+            if message is None:
+                # Closed: whatever is left will never be answered
+                self._fail_jobs(list(self._pending), "The crawler pool was closed.")
+                return
+            self._handle(message)
+            self._reap_workers()
+
+    def _handle(self, message: Any) -> None:
+        if isinstance(message, _WorkerReady):
+            print(f"CRAWLER POOL SAYS: Worker {message.worker_pid} ready")
+            self._ready.release()
+            return
+        with self._lock:
+            worker = self._workers.get(message.worker_pid)
+            if worker is not None:
+                worker.job_ids.discard(message.job_id)
+            future = self._pending.pop(message.job_id, None)
+            submitted_at = self._submitted_at.pop(message.job_id, None)
+            if submitted_at is not None:
+                message.latency = time.perf_counter() - submitted_at
+                self._latencies.append(message.latency)
+            if message.ok:
+                self._completed += 1
+            else:
+                self._failed += 1
+        print(
+            f"CRAWLER POOL SAYS: Job {message.job_id} done in {message.latency:.3f}s "
+            f"(crawl {message.crawl_time:.3f}s, worker {message.worker_pid})"
+        )
+        if future is not None:
+            future.set_result(message)
+
+    def _reap_workers(self) -> None:
+        """
+        Fails the jobs of the workers whose process exited.
+        """
+        with self._lock:
+            sentinels = {worker.process.sentinel: pid for pid, worker in self._workers.items()}
+        exited = [sentinels[sentinel] for sentinel in wait(list(sentinels), timeout=0)]
+        if not exited:
+            return
+        # What the workers sent before exiting is in the queue already
+        while True:
+            try:
+                message = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if message is None:
+                self._results.put(None)  # Left for the collector loop
+                break
+            self._handle(message)
+        with self._lock:
+            dead = [self._workers.pop(pid) for pid in exited if pid in self._workers]
+        for worker in dead:
+            print(
+                f"CRAWLER POOL SAYS: Worker {worker.process.pid} exited with code "
+                f"{worker.process.exitcode}"
+            )
+            self._fail_jobs(list(worker.job_ids), "The crawler worker running this job exited.")
+
+    def _fail_jobs(self, job_ids: List[str], error: str) -> None:
+        for job_id in job_ids:
+            with self._lock:
+                future = self._pending.pop(job_id, None)
+                self._submitted_at.pop(job_id, None)
+                if future is not None:
+                    self._failed += 1
+            if future is not None:
+                future.set_result(CrawlResult(job_id=job_id, error=error))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Reports the pool's size, job counters and latency of recent jobs.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                "workers": len(self._workers),
+                "pending": len(self._pending),
+                "completed": self._completed,
+                "failed": self._failed,
+            }
+        if latencies:
+            stats.update(
+                latency_mean=statistics.fmean(latencies),
+                latency_p50=latencies[len(latencies) // 2],
+                latency_p95=latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+                latency_max=latencies[-1],
+            )
+        return stats
+
+    def close(self, timeout: float = 10) -> None:
+        """
+        Stops every worker once the jobs already queued are done.
+
+        Args:
+            timeout (float): Seconds to wait for each worker, after which it is
+                             terminated and its jobs fail.
+        """
+        with self._lock:
+            workers = list(self._workers.values())
+        for worker in workers:
+            worker.jobs.put(None)
+        for worker in workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join()
+        # Reaped by the collector, which then stops
+        self._results.put(None)
+        if self._collector is not None:
+            self._collector.join(timeout)
+            self._collector = None
+        with self._lock:
+            self._workers.clear()
@@ -0,0 +1,36 @@
+# Counterpart of `data/responses.py` for this service, which is deployed without
+# the `data` package: see there for why these helpers exist.
+
+import json
+import os
+from typing import Any
+
+from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # Optional faster encoder
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=str, ensure_ascii=False, separators=(",", ":")).encode(
+        "utf-8"
+    )
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def add_compression(app: FastAPI) -> None:
+    app.add_middleware(
+        GZipMiddleware,
+        minimum_size=int(os.getenv("GZIP_MINIMUM_SIZE", 1000)),
+        compresslevel=int(os.getenv("GZIP_COMPRESSLEVEL", 5)),
+    )
@@ -1,7 +1,14 @@
 from fastapi import FastAPI
 from api.endpoints import router as api_router
+from responses import FastJSONResponse, add_compression
 
-app = FastAPI(title="Rotten Tomatoes API", description="API for movie details and reviews")
+app = FastAPI(
+    title="Rotten Tomatoes API",
+    description="API for movie details and reviews",
+    default_response_class=FastJSONResponse,
+)
+
+add_compression(app)
 
 # Include API endpoints
 app.include_router(api_router)
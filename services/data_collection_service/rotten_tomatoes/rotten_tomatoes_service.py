@@ -1,78 +1,177 @@
-from scrapy.crawler import CrawlerProcess
 from rottentomatoes_scraper.rottentomatoes_scraper.spiders.RottenTomatoesSpiders import (
     RottenTomatoesMovieSpider,
 )
-from typing import List, Optional
-from models import Movie, Review
-import multiprocessing as mp
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from models import Review
 from rottentomatoes_scraper.rottentomatoes_scraper.pipelines import (
     JsonWriterPipeline,
     MoviePipeline,
+    SendToServer,
 )
 from scrapy.settings import Settings
 from connections import ClientConnectionParameters
+from crawler_pool import CrawlerWorkerPool, CrawlResult
+from concurrent.futures import Future, as_completed
 
 
-def _start_crawl(
-    _crawler_process,
-    _crawler_settings,
-    spider_cls,
-    movie_name,
-    parse_function,
-    proxy_endpoint,
-):
-    _crawler_process.settings = _crawler_settings
-    _crawler_process.crawl(spider_cls, query=movie_name, parse_function=parse_function, proxy_endpoint=proxy_endpoint)
-    _crawler_process.start()
+# Scrapy settings for batch crawls: every title targets the same domain, so the
+# per-domain limit is what caps throughput. AutoThrottle backs off if the site
+# starts answering slowly, and per-crawler extras are turned off.
+BATCH_CRAWL_SETTINGS = {
+    "CONCURRENT_REQUESTS": 64,
+    "CONCURRENT_REQUESTS_PER_DOMAIN": 32,
+    "DOWNLOAD_DELAY": 0,
+    "AUTOTHROTTLE_ENABLED": True,
+    "AUTOTHROTTLE_START_DELAY": 0.5,
+    "AUTOTHROTTLE_TARGET_CONCURRENCY": 16.0,
+    "COOKIES_ENABLED": False,
+    "RETRY_TIMES": 1,
+    "DOWNLOAD_TIMEOUT": 30,
+    "TELNETCONSOLE_ENABLED": False,
+    "LOG_LEVEL": "INFO",
+}
 
 
 class RottenTomatoesService:
     """Service to fetch movie details and reviews from Rotten Tomatoes."""
 
-    def __init__(self):
+    def __init__(
+        self, pool_size: int = 2, warm_up: bool = True, jobs_per_worker: int = 4
+    ):
+        """
+        Args:
+            pool_size (int): Number of long-lived crawler processes.
+            warm_up (bool): Start the crawler processes now rather than on the first crawl.
+            jobs_per_worker (int): Crawls a single crawler process runs concurrently.
+        """
         self._scraper_settings = Settings()
         self._set_project_settings()
-        self._crawler_process = CrawlerProcess()
+        self._pool = CrawlerWorkerPool(
+            RottenTomatoesMovieSpider,
+            self._scraper_settings,
+            size=pool_size,
+            jobs_per_worker=jobs_per_worker,
+        )
+        if warm_up:
+            self.start()
+
+    def start(self) -> None:
+        """
+        Starts the crawler processes, blocking until they are ready. Crawls
+        start them otherwise, so calling this only spares the first crawl the wait.
+        """
+        self._pool.start()
 
     def _set_project_settings(self):
         self._scraper_settings.set(
-            "ITEM_PIPELINES", {MoviePipeline: 300, JsonWriterPipeline: 400}
-        )
-
-    def _start_crawl_wrapper(self, movie_name, parse_function, proxy_endpoint):
-        process = mp.Process(
-            target=_start_crawl,
-            args=(
-                self._crawler_process,
-                self._scraper_settings,
-                RottenTomatoesMovieSpider,
-                movie_name,
-                parse_function,
-                proxy_endpoint,
-            ),
+            "ITEM_PIPELINES",
+            {MoviePipeline: 300, JsonWriterPipeline: 400, SendToServer: 500},
         )
-        process.start()
-        process.join()
 
     def get_movie(
-        self, movie_name: str, proxy_endpoint: ClientConnectionParameters
-    ) -> Optional[Movie]:
-        self._run_spider(
+        self,
+        movie_name: str,
+        proxy_endpoint: ClientConnectionParameters,
+        timeout: Optional[float] = None,
+    ) -> CrawlResult:
+        result = self.submit_movie(movie_name, proxy_endpoint).result(timeout)
+        # The scraped items are also sent to the relay at `proxy_endpoint`
+        return result
+
+    def submit_movie(
+        self,
+        movie_name: str,
+        proxy_endpoint: ClientConnectionParameters,
+        job_id: Optional[str] = None,
+    ) -> "Future[CrawlResult]":
+        """
+        Starts crawling a movie without waiting for it.
+
+        Args:
+            movie_name (str): Title to crawl.
+            proxy_endpoint (ClientConnectionParameters): Relay the scraped items are sent to.
+            job_id (Optional[str]): Identifier stamped on the items sent to the relay.
+
+        Returns:
+            Future[CrawlResult]: Resolved when the crawl is done; wrap it with
+                                 `asyncio.wrap_future` to await it.
+        """
+        return self._run_spider(
             movie_name,
             parse_function="parse_movie_details",
             proxy_endpoint=proxy_endpoint,
+            job_id=job_id,
         )
-        # TODO Set client to wait for data
 
-        # Return the movie data
+    def get_movies(
+        self,
+        movie_names: Iterable[str],
+        proxy_endpoint: ClientConnectionParameters,
+        chunk_size: int = 50,
+        timeout: Optional[float] = None,
+    ) -> Iterator[CrawlResult]:
+        """
+        Crawls many titles, yielding one result per title as the crawls complete.
+
+        Titles are split in chunks of `chunk_size`; each chunk is crawled by a
+        single spider with `BATCH_CRAWL_SETTINGS`, and the chunks are spread
+        over the crawler processes of the pool.
+
+        Args:
+            movie_names (Iterable[str]): Titles to crawl.
+            proxy_endpoint (ClientConnectionParameters): Relay the scraped items are sent to.
+            chunk_size (int): Titles crawled by a single spider.
+            timeout (Optional[float]): Seconds to wait for the whole batch.
+
+        Yields:
+            CrawlResult: The items scraped for one title, with `query` set to it.
+        """
+        chunks: Dict[Future, List[str]] = {}
+        chunk: List[str] = []
+        for movie_name in movie_names:
+            chunk.append(movie_name)
+            if len(chunk) == chunk_size:
+                chunks[self._run_batch(chunk, proxy_endpoint)] = chunk
+                chunk = []
+        if chunk:
+            chunks[self._run_batch(chunk, proxy_endpoint)] = chunk
+
+        for future in as_completed(chunks, timeout=timeout):
+            result = future.result()
+            for movie_name in chunks[future]:
+                yield result.for_query(movie_name)
 
     def get_reviews(self, movie_name: str) -> List[Review]:
         raise NotImplementedError
 
+    def pool_stats(self) -> Dict[str, Any]:
+        """Per-job latency and counters of the crawler pool."""
+        return self._pool.stats()
+
+    def close(self) -> None:
+        self._pool.close()
+
     def _run_spider(
         self,
         movie_name: str,
         parse_function: str,
         proxy_endpoint: ClientConnectionParameters,
-    ):
-        self._start_crawl_wrapper(movie_name, parse_function, proxy_endpoint)
+        job_id: Optional[str] = None,
+    ) -> "Future[CrawlResult]":
+        return self._pool.submit(
+            job_id=job_id,
+            query=movie_name,
+            parse_function=parse_function,
+            proxy_endpoint=proxy_endpoint,
+        )
+
+    def _run_batch(
+        self, movie_names: List[str], proxy_endpoint: ClientConnectionParameters
+    ) -> "Future[CrawlResult]":
+        return self._pool.submit(
+            settings=BATCH_CRAWL_SETTINGS,
+            query=None,
+            queries=movie_names,
+            parse_function="parse_movie_details",
+            proxy_endpoint=proxy_endpoint,
+        )
@@ -17,6 +17,7 @@ class MovieItem(scrapy.Item):
 
 
 class ReviewItem(scrapy.Item):
+    movie = scrapy.Field()  # Title of the reviewed movie
     author_name = scrapy.Field()
     comment = scrapy.Field()
     rating = scrapy.Field()
@@ -0,0 +1,130 @@
+# Compressed JSON lines shards: the codecs JsonWriterPipeline can write with,
+# and a streaming reader for downstream loaders.
+
+import gzip
+import io
+import json
+import zlib
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional
+
+try:
+    import zstandard
+except ImportError:  # Optional faster codec
+    zstandard = None
+
+
+@dataclass
+class Compression:
+    """
+    A streaming codec for JSON lines shards.
+
+    Attributes:
+        name (str): Value of the `JSONL_COMPRESSION` setting selecting it.
+        extension (str): Appended to `.jsonl` in shard names.
+        open_writer (Callable[[BinaryIO], BinaryIO]): Wraps a new raw file opened for writing.
+                                                      `flush` on the wrapper must push
+                                                      everything written so far to the raw file,
+                                                      and `close` must leave it open.
+        open_reader (Callable[[BinaryIO], BinaryIO]): Wraps a raw file opened for reading.
+    """
+
+    name: str
+    extension: str
+    open_writer: Callable[[BinaryIO], BinaryIO]
+    open_reader: Callable[[BinaryIO], BinaryIO]
+
+
+_compressions: Dict[str, Compression] = {}
+
+
+def register_compression(compression: Compression) -> Compression:
+    _compressions[compression.name] = compression
+    return compression
+
+
+def get_compression(name: str) -> Compression:
+    """
+    Looks up a registered codec by name.
+
+    Raises:
+        ValueError: If no codec is registered under `name`.
+    """
+    try:
+        return _compressions[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown compression {name!r}, available: {available_compressions()}"
+        )
+
+
+def available_compressions() -> List[str]:
+    return list(_compressions)
+
+
+def compression_for_path(path: str) -> Optional[Compression]:
+    """
+    Tells the codec a shard was written with from its name, None if uncompressed.
+    """
+    for compression in _compressions.values():
+        if path.endswith(compression.extension):
+            return compression
+    return None
+
+
+register_compression(
+    Compression(
+        name="gzip",
+        extension=".gz",
+        # Each flush ends with a sync flush, so flushed lines are always decodable
+        open_writer=lambda raw: gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6),
+        open_reader=lambda raw: gzip.GzipFile(fileobj=raw, mode="rb"),
+    )
+)
+
+if zstandard is not None:
+    register_compression(
+        Compression(
+            name="zstd",
+            extension=".zst",
+            open_writer=lambda raw: zstandard.ZstdCompressor(level=3).stream_writer(
+                raw, closefd=False
+            ),
+            open_reader=lambda raw: zstandard.ZstdDecompressor().stream_reader(
+                raw, read_across_frames=True
+            ),
+        )
+    )
+
+
+# What decoders raise on a stream that stops mid block, or on the garbage
+# following it, like what a rerun would once have appended to it
+_TRUNCATED_ERRORS = (EOFError, zlib.error) + (
+    (zstandard.ZstdError,) if zstandard is not None else ()
+)
+
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Streams the items of a shard, decompressing on the fly.
+
+    A shard cut short by a crash is read up to its last complete line.
+
+    Args:
+        path (str): Path of a `.jsonl` shard, optionally with a codec extension.
+
+    Yields:
+        Dict[str, Any]: One item per line.
+    """
+    compression = compression_for_path(path)
+    with open(path, "rb") as raw:
+        stream = compression.open_reader(raw) if compression else raw
+        lines = io.TextIOWrapper(stream, encoding="utf-8")
+        try:
+            for line in lines:
+                if not line.endswith("\n"):
+                    return
+                yield json.loads(line)
+        except _TRUNCATED_ERRORS:
+            # The last compressed block was never completed
+            return
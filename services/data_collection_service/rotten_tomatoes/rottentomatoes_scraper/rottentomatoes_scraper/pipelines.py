@@ -6,7 +6,22 @@
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+from scrapy import signals
+from twisted.internet import defer, threads
+from twisted.internet.task import LoopingCall
+from typing import Any, Dict, List, Optional, Tuple
+from .items import MovieItem, ReviewItem
+from .jsonl import get_compression
+from collection_versions import bump_collection_version
+from connections import ClientConnectionParameters, TCPClientPool, make_batch, make_envelope
 import json
+import os
+import queue
+import threading
+import time
+import uuid
 
 
 class MoviePipeline:
@@ -14,21 +29,393 @@ class MoviePipeline:
         return item
     
 
-class SendToServer():
-    "Send the item to a server for temporary storage"
-    def open_spider(self):
-        # Establish connection to the server
-        raise NotImplementedError("This method must be implemented by the subclass")
-    
+class SendToServer:
+    """
+    Sends the items to a server for temporary storage, in batches.
+
+    Items are enveloped with the id of the spider's job and the query they
+    answer, then handed to a background thread which sends them to the relay
+    at `spider.proxy_endpoint` as one message per batch, waiting for a single
+    acknowledgement each. Connections come from a `TCPClientPool` shared by
+    every crawl of the process. The reactor never blocks on the network, and the
+    crawl only finishes once every batch has been acknowledged.
+
+    Settings:
+        RELAY_BATCH_SIZE (int): Items sent in a single message.
+        RELAY_FLUSH_INTERVAL (float): Seconds an incomplete batch waits for more items.
+        RELAY_ACK_TIMEOUT (float): Seconds to wait for the acknowledgement of a batch.
+    """
+
+    def __init__(
+        self, batch_size: int = 100, flush_interval: float = 0.2, ack_timeout: float = 10
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.ack_timeout = ack_timeout
+        self._items: "queue.Queue" = queue.Queue()
+        self._sender: Optional[threading.Thread] = None
+        self.batches_sent = 0
+        self.items_sent = 0
+        self.items_dropped = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        pipeline = cls(
+            batch_size=settings.getint("RELAY_BATCH_SIZE", 100),
+            flush_interval=settings.getfloat("RELAY_FLUSH_INTERVAL", 0.2),
+            ack_timeout=settings.getfloat("RELAY_ACK_TIMEOUT", 10),
+        )
+        # Sent once every pipeline is done with the item, like the spider used to
+        crawler.signals.connect(pipeline.item_scraped, signal=signals.item_scraped)
+        return pipeline
+
+    def open_spider(self, spider):
+        endpoint = getattr(spider, "proxy_endpoint", None)
+        if endpoint is None:
+            return
+        self._sender = threading.Thread(
+            target=self._send_batches, args=(endpoint, spider.logger), daemon=True
+        )
+        self._sender.start()
+
+    def close_spider(self, spider):
+        if self._sender is None:
+            return
+        self._items.put(None)
+        # Waiting in a thread keeps the reactor serving the other crawls
+        return threads.deferToThread(self._sender.join)
+
+    def process_item(self, item, spider):
+        return item
+
+    def item_scraped(self, item, response, spider):
+        if self._sender is None:
+            return
+        query = response.meta.get("query") if response is not None else None
+        if query is None:
+            query = getattr(spider, "query", None)
+        job_id = getattr(spider, "job_id", None)
+        self._items.put(make_envelope(job_id, ItemAdapter(item).asdict(), query))
+
+    def _send_batches(self, endpoint: ClientConnectionParameters, logger) -> None:
+        # Connections outlive the crawl: the next crawl in this process reuses them
+        pool = TCPClientPool.shared(endpoint, connect_timeout=self.ack_timeout)
+        done = False
+        while not done:
+            batch = []
+            item = self._items.get()
+            deadline = time.monotonic() + self.flush_interval
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._items.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            done = item is None
+            if batch:
+                self._send(pool, batch, logger)
+
+    def _send(self, pool: TCPClientPool, batch: List[dict], logger) -> None:
+        # A failed send closes its connection: the batch is retried once on another
+        for _ in range(2):
+            try:
+                with pool.connection(timeout=self.ack_timeout) as client:
+                    ack = client.send_as_json(make_batch(batch), timeout=self.ack_timeout)
+                    if ack is None:
+                        # Drop a connection whose acknowledgement may still arrive late
+                        client.close()
+            except TimeoutError:
+                continue
+            if ack is not None:
+                self.batches_sent += 1
+                self.items_sent += len(batch)
+                return
+        self.items_dropped += len(batch)
+        logger.error(f"Relay did not acknowledge a batch of {len(batch)} items")
+
 
 class JsonWriterPipeline:
+    """
+    Writes items as JSON lines to per-crawl shard files, in batches.
+
+    Items are buffered in memory and written with a single call once
+    `JSONL_BATCH_SIZE` items are pending or every `JSONL_FLUSH_INTERVAL`
+    seconds, so a crash loses at most the last flush window. Writes and syncs
+    run in a thread, one at a time, so the reactor keeps serving the other
+    crawls meanwhile; an item that fills a batch is only passed on once the
+    batch is written. Each crawl
+    writes its own shards, named after the spider and its job id, and starts a
+    new shard once the current one reaches `JSONL_MAX_FILE_SIZE` bytes. Shards
+    are never appended to: a crawl run again under the same job id starts after
+    the shards already there, so it never continues a compressed stream that a
+    crash cut short.
+
+    Settings:
+        JSONL_OUTPUT_DIR (str): Directory the shards are written to.
+        JSONL_BATCH_SIZE (int): Items buffered before being written.
+        JSONL_FLUSH_INTERVAL (float): Seconds between periodic flushes, 0 to disable them.
+        JSONL_MAX_FILE_SIZE (int): Bytes after which a new shard is started.
+        JSONL_FSYNC (bool): Sync each flush to disk rather than to the OS cache only.
+        JSONL_COMPRESSION (Optional[str]): Codec the shards are compressed with on the fly,
+                                           e.g. "gzip" or "zstd" (see `jsonl.py`).
+    """
+
+    extension = ".jsonl"
+
+    def __init__(
+        self,
+        output_dir: str = ".",
+        batch_size: int = 500,
+        flush_interval: float = 5.0,
+        max_file_size: int = 256 * 1024 * 1024,
+        fsync: bool = True,
+        compression: Optional[str] = None,
+    ):
+        self.output_dir = output_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_file_size = max_file_size
+        self.fsync = fsync
+        self.compression = get_compression(compression) if compression else None
+        if self.compression is not None:
+            self.extension += self.compression.extension
+        self.file = None
+        self._raw = None
+        self.paths: List[str] = []
+        self._buffer: List[str] = []
+        self._flusher: Optional[LoopingCall] = None
+        # Writes run in a thread, one at a time, in the order they were flushed
+        self._in_thread = threads.deferToThread
+        self._writes = defer.DeferredLock()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            output_dir=settings.get("JSONL_OUTPUT_DIR", "."),
+            batch_size=settings.getint("JSONL_BATCH_SIZE", 500),
+            flush_interval=settings.getfloat("JSONL_FLUSH_INTERVAL", 5.0),
+            max_file_size=settings.getint("JSONL_MAX_FILE_SIZE", 256 * 1024 * 1024),
+            fsync=settings.getbool("JSONL_FSYNC", True),
+            compression=settings.get("JSONL_COMPRESSION"),
+        )
+
     def open_spider(self, spider):
-        self.file = open("items.jsonl", "w")
+        # Crawls run in parallel share the output directory: each gets its own shards
+        crawl_id = getattr(spider, "job_id", None) or uuid.uuid4().hex
+        self._prefix = os.path.join(self.output_dir, f"items-{spider.name}-{crawl_id}")
+        self._shard = 0
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._open_shard()
+        if self.flush_interval > 0:
+            self._flusher = LoopingCall(self.flush)
+            self._flusher.start(self.flush_interval, now=False)
 
     def close_spider(self, spider):
+        if self._flusher is not None and self._flusher.running:
+            self._flusher.stop()
+        return self.flush().addCallback(lambda _: self._close_shard())
+
+    def process_item(self, item, spider):
+        self._buffer.append(json.dumps(ItemAdapter(item).asdict()) + "\n")
+        if len(self._buffer) >= self.batch_size:
+            return self.flush().addCallback(lambda _: item)
+        return item
+
+    def flush(self) -> defer.Deferred:
+        """
+        Writes the buffered items to the current shard and syncs it, in a thread.
+
+        Returns:
+            Deferred: Fires once the items, and every flush before them, are written.
+        """
+        lines, self._buffer = self._buffer, []
+        if not lines:
+            return self._writes.run(defer.succeed, None)
+        return self._writes.run(self._in_thread, self._write, lines)
+
+    def _write(self, lines: List[str]) -> None:
+        # Rotating before writing never leaves an empty shard behind. The size
+        # is the one on disk, compressed if a codec is set.
+        if self._raw.tell() >= self.max_file_size:
+            self._close_shard()
+            self._open_shard()
+        self.file.write("".join(lines).encode("utf-8"))
+        self.file.flush()
+        self._raw.flush()
+        if self.fsync:
+            os.fsync(self._raw.fileno())
+
+    def _open_shard(self) -> None:
+        while True:
+            path = f"{self._prefix}-{self._shard:05d}{self.extension}"
+            self._shard += 1
+            try:
+                self._raw = open(path, "xb")
+                break
+            except FileExistsError:
+                continue
+        self.paths.append(path)
+        if self.compression is not None:
+            self.file = self.compression.open_writer(self._raw)
+        else:
+            self.file = self._raw
+
+    def _close_shard(self) -> None:
         self.file.close()
+        self._raw.close()
+
+
+class MongoBulkWritePipeline:
+    """
+    Upserts scraped movies and reviews into Mongo in unordered bulk writes.
+
+    Items are buffered per collection and written once `MONGO_BATCH_SIZE` are
+    pending or every `MONGO_FLUSH_INTERVAL` seconds, in a thread and one write at
+    a time, so the reactor keeps serving other crawls meanwhile. An item that
+    fills a batch is only passed on once the batch is written, which keeps the
+    buffer from outgrowing a slow database. Each item becomes an upsert
+    keyed on its `UPSERT_KEYS`, so crawling a title again updates its documents
+    instead of duplicating them. Each write that changes a collection bumps its
+    version counter (see `collection_versions`), which the library API derives its ETags
+    from. The connection goes through
+    `data.client.mongo.DBClient`, so the repository root must be importable.
+
+    Settings:
+        MONGO_HOST (str), MONGO_PORT (int), MONGO_DB (str): Where the collections live.
+        MONGO_USERNAME (str), MONGO_PASSWORD (str): Credentials, by default the
+                                                    `ROOT_USERNAME` and `ROOT_PASSWORD`
+                                                    environment variables.
+        MONGO_BATCH_SIZE (int): Items buffered before being written.
+        MONGO_FLUSH_INTERVAL (float): Seconds between periodic flushes, 0 to disable them.
+    """
+
+    # Item class -> (collection, fields identifying a document)
+    UPSERT_KEYS: Dict[type, Tuple[str, Tuple[str, ...]]] = {
+        # Matches the unique index of data/validators.py
+        MovieItem: ("movies", ("title", "year")),
+        ReviewItem: ("reviews", ("movie", "author_name", "date")),
+    }
+
+    def __init__(
+        self,
+        db_config: Optional[Dict[str, Any]] = None,
+        batch_size: int = 500,
+        flush_interval: float = 5.0,
+        db=None,
+    ):
+        """
+        Args:
+            db_config (Optional[Dict[str, Any]]): Arguments for `DBClient`.
+            batch_size (int): Items buffered before being written.
+            flush_interval (float): Seconds between periodic flushes, 0 to disable them.
+            db: An already connected database, used instead of `db_config`.
+        """
+        self.db_config = db_config or {}
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.db = db
+        self._client = None
+        self._operations: Dict[str, list] = {}
+        self._pending = 0
+        self._flusher: Optional[LoopingCall] = None
+        # Writes run in a thread, one at a time, in the order they were flushed
+        self._in_thread = threads.deferToThread
+        self._writes = defer.DeferredLock()
+        self.upserted = 0
+        self.modified = 0
+        self.errors = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            db_config={
+                "host": settings.get("MONGO_HOST", "localhost"),
+                "port": settings.getint("MONGO_PORT", 27017),
+                "db": settings.get("MONGO_DB", "movie_db"),
+                "username": settings.get("MONGO_USERNAME", os.getenv("ROOT_USERNAME")),
+                "password": settings.get("MONGO_PASSWORD", os.getenv("ROOT_PASSWORD")),
+            },
+            batch_size=settings.getint("MONGO_BATCH_SIZE", 500),
+            flush_interval=settings.getfloat("MONGO_FLUSH_INTERVAL", 5.0),
+        )
+
+    def open_spider(self, spider):
+        if self.db is None:
+            from data.client.mongo import DBClient
+
+            self._client = DBClient(**self.db_config)
+            self.db = self._client.db
+        self._spider = spider
+        if self.flush_interval > 0:
+            self._flusher = LoopingCall(self.flush)
+            self._flusher.start(self.flush_interval, now=False)
+
+    def close_spider(self, spider):
+        if self._flusher is not None and self._flusher.running:
+            self._flusher.stop()
+        return self.flush().addCallback(lambda _: self._closed(spider))
+
+    def _closed(self, spider) -> None:
+        spider.logger.info(
+            f"Mongo bulk writes: {self.upserted} upserted, {self.modified} modified, "
+            f"{self.errors} failed"
+        )
+        if self._client is not None:
+            self._client.client.close()
 
     def process_item(self, item, spider):
-        line = json.dumps(ItemAdapter(item).asdict()) + "\n"
-        self.file.write(line)
-        return item
\ No newline at end of file
+        if type(item) not in self.UPSERT_KEYS:
+            return item
+        collection, key_fields = self.UPSERT_KEYS[type(item)]
+        document = ItemAdapter(item).asdict()
+        key = {field: document.get(field) for field in key_fields}
+        self._operations.setdefault(collection, []).append(
+            UpdateOne(key, {"$set": document}, upsert=True)
+        )
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            return self.flush().addCallback(lambda _: item)
+        return item
+
+    def flush(self) -> defer.Deferred:
+        """
+        Sends the buffered upserts, one unordered bulk write per collection.
+
+        Returns:
+            Deferred: Fires once the upserts, and every write flushed before them,
+                      are done.
+        """
+        operations, self._operations, self._pending = self._operations, {}, 0
+        if not operations:
+            return self._writes.run(defer.succeed, None)
+        return self._writes.run(self._in_thread, self._write, operations)
+
+    def _write(self, operations: Dict[str, list]) -> None:
+        for collection, requests in operations.items():
+            try:
+                result = self.db[collection].bulk_write(requests, ordered=False)
+            except BulkWriteError as e:
+                # Unordered: every other upsert of the batch was still applied
+                result = e.details
+                self.errors += len(result["writeErrors"])
+                self._spider.logger.error(
+                    f"{len(result['writeErrors'])} upserts into {collection} failed: "
+                    f"{result['writeErrors'][0]['errmsg']}"
+                )
+            except PyMongoError as e:
+                # E.g. the server is unreachable: count the batch as lost and keep
+                # crawling rather than failing the items or the periodic flush
+                self.errors += len(requests)
+                self._spider.logger.error(f"{len(requests)} upserts into {collection} failed: {e}")
+                continue
+            else:
+                result = result.bulk_api_result
+            self.upserted += result["nUpserted"]
+            self.modified += result["nModified"]
+            if result["nUpserted"] or result["nModified"]:
+                bump_collection_version(self.db, collection)
@@ -2,9 +2,8 @@ import scrapy
 import scrapy.signals
 from scrapy.http import Response
 from ..items import MovieItem, ReviewItem  # Ensure these are defined
-from connections import TCPClient
-from itemadapter import ItemAdapter
 from connections import ClientConnectionParameters
+from typing import List, Optional
 
 
 class RottenTomatoesMovieSpider(scrapy.Spider):
@@ -12,42 +11,43 @@ class RottenTomatoesMovieSpider(scrapy.Spider):
 
     def __init__(
         self,
-        query: str,
+        query: Optional[str],
         parse_function: str,
         proxy_endpoint: ClientConnectionParameters,
+        queries: Optional[List[str]] = None,
+        job_id: Optional[str] = None,
         *args,
         **kwargs,
     ) -> None:
         """
         Initialize the spider.
 
-        :param query: The movie query string.
+        :param query: The movie query string, or None when `queries` is given.
         :param parse_function: The name of the function to parse the response.
         :param storage_client: An instance of a TCP client for data storage.
+        :param queries: Several movie query strings to crawl in the same run, instead of `query`.
+        :param job_id: Identifier of the crawl job, stamped on every item sent to the server.
         """
         super().__init__(*args, **kwargs)
-        self.query: str = query
+        self.query: Optional[str] = query
+        self.queries: List[str] = queries if queries is not None else [query]
         self.parse_function: str = parse_function
+        self.job_id: Optional[str] = job_id
+        # Relay the items are sent to by the SendToServer pipeline
         self.proxy_endpoint = proxy_endpoint
-        self.set_client()
-
-    @classmethod
-    def from_crawler(cls, crawler, *args, **kwargs):
-        spider = super(RottenTomatoesMovieSpider, cls).from_crawler(crawler, *args, **kwargs)
-        crawler.signals.connect(spider.send_to_server, signal=scrapy.signals.item_scraped)
-        return spider
-    
-    def set_client(self):
-        self.client = TCPClient(self.proxy_endpoint)
-        self.client.connect(timeout=10)
 
     def start_requests(self):
         """
-        Initiate the scraping process by generating the initial request.
+        Initiate the scraping process by generating the initial request for each query.
         """
-        url: str = f'https://www.rottentomatoes.com/m/{self.query.replace(" ", "_")}'
-        self.logger.info(f"Scraping {url}...")
-        yield scrapy.Request(url=url, callback=getattr(self, self.parse_function))
+        for query in self.queries:
+            url: str = f'https://www.rottentomatoes.com/m/{query.replace(" ", "_")}'
+            self.logger.info(f"Scraping {url}...")
+            yield scrapy.Request(
+                url=url,
+                callback=getattr(self, self.parse_function),
+                meta={"query": query},
+            )
 
     def parse_movie_details(self, response: Response):
         """
@@ -80,19 +80,8 @@ class RottenTomatoesMovieSpider(scrapy.Spider):
         reviews = response.xpath("//xpath_to_reviews")
         for review in reviews:
             review_item = ReviewItem()
+            review_item["movie"] = response.meta.get("query", self.query)
             review_item["author_name"] = review.xpath(".//author_name_xpath").get()
             review_item["comment"] = review.xpath(".//comment_xpath").get()
             # Additional review fields as necessary
             yield review_item
-
-    def send_to_server(self, item) -> None:
-        """
-        Send data to the server using the storage client.
-
-        :param data: The data to send, serialized as a dictionary.
-        """
-        try:
-            response = self.client.send_as_json(ItemAdapter(item).asdict(), timeout=10)            
-        except:
-            raise 
-
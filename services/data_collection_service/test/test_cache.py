@@ -0,0 +1,174 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from itemadapter import ItemAdapter
+from rotten_tomatoes.cache import MongoCacheTier, TTLCache, estimate_size, kind_of
+from rotten_tomatoes.rottentomatoes_scraper.rottentomatoes_scraper.items import MovieItem
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class InMemoryTier:
+    """Stands in for the Mongo tier, keeping entries in a dictionary."""
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, value, kind):
+        self.entries[key] = (dict(value), kind, datetime.now(timezone.utc))
+
+
+def test_ttl_depends_on_kind():
+    clock = FakeClock()
+    cache = TTLCache(ttls={"movie": 100, "scores": 10}, clock=clock)
+    details = {"title": "Heat"}
+    scores = {"title": "Alien", "tomatometer": 98}
+    cache.set("heat", details, kind_of(details))
+    cache.set("alien", scores, kind_of(scores))
+
+    clock.now = 50
+    assert cache.get("heat") == details
+    assert cache.get("alien") is None
+    assert (cache.hits, cache.misses, cache.expirations) == (1, 1, 1)
+
+
+def test_lru_eviction_by_entries_and_bytes():
+    cache = TTLCache(max_entries=2)
+    cache.set("a", {"title": "A"})
+    cache.set("b", {"title": "B"})
+    cache.get("a")  # "b" is now the least recently used
+    cache.set("c", {"title": "C"})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+    movie = {"title": "X" * 100}
+    cache = TTLCache(max_bytes=2 * estimate_size(movie))
+    for key in "xyz":
+        cache.set(key, movie)
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1
+    assert stats["bytes"] <= stats["max_bytes"]
+
+
+def test_second_tier_promotes_fresh_entries():
+    async def scenario():
+        tier = InMemoryTier()
+        await TTLCache(second_tier=tier).store("heat", {"title": "Heat"})
+
+        # A new process starts with an empty memory tier
+        cache = TTLCache(second_tier=tier)
+        assert await cache.lookup("heat") == {"title": "Heat"}
+        assert cache.second_tier_hits == 1
+        assert cache.get("heat") == {"title": "Heat"}
+
+        stale = datetime.now(timezone.utc) - timedelta(seconds=cache.ttls["scores"] + 1)
+        tier.entries["alien"] = ({"title": "Alien"}, "scores", stale)
+        assert await cache.lookup("alien") is None
+
+    asyncio.run(scenario())
+
+
+def test_movie_scores_expire_before_details():
+    async def scenario():
+        clock = FakeClock()
+        cache = TTLCache(ttls={"movie": 100, "scores": 10}, clock=clock)
+        movie = {"title": "Heat", "year": 1995, "tomatometer": 88, "popcornmeter": 94}
+        await cache.store_movie("heat", movie)
+        assert await cache.lookup_movie("heat") == (movie, True)
+
+        clock.now = 50
+        assert await cache.lookup_movie("heat") == ({"title": "Heat", "year": 1995}, False)
+
+        clock.now = 150
+        assert await cache.lookup_movie("heat") == (None, False)
+
+    asyncio.run(scenario())
+
+
+def test_movies_scraped_without_scores_stay_fresh_for_the_details_ttl():
+    async def scenario():
+        clock = FakeClock()
+        cache = TTLCache(clock=clock)
+        # What the workers hand over: a MovieItem has no score fields
+        movie = ItemAdapter(
+            MovieItem(title="Heat", year=1995, director="Michael Mann", genre="Crime")
+        ).asdict()
+        await cache.store_movie("heat", movie)
+        assert await cache.lookup_movie("heat") == (movie, True)
+
+        clock.now = cache.ttls["scores"] + 1
+        assert await cache.lookup_movie("heat") == (movie, True)
+
+        clock.now = cache.ttls["movie"] + 1
+        assert await cache.lookup_movie("heat") == (None, False)
+
+    asyncio.run(scenario())
+
+
+class BrokenTier:
+    """A second tier whose database is down."""
+
+    def get(self, key):
+        raise ConnectionError("Mongo is down")
+
+    def set(self, key, value, kind):
+        raise ConnectionError("Mongo is down")
+
+    def publish(self, movie):
+        raise ConnectionError("Mongo is down")
+
+
+def test_second_tier_failures_fall_back_to_memory():
+    async def scenario():
+        cache = TTLCache(second_tier=BrokenTier())
+        movie = {"title": "Heat", "tomatometer": 88}
+        await cache.store_movie("heat", movie)  # Two entries and the publication fail
+        assert await cache.lookup_movie("heat") == (movie, True)
+        assert await cache.lookup("alien") is None
+        assert cache.stats()["second_tier_errors"] == 4
+
+    asyncio.run(scenario())
+
+
+class FakeMovies:
+    """The `movies` collection, upserting documents unique by title and year."""
+
+    def __init__(self, database):
+        self.database = database
+        self.name = "movies"
+        self.documents = {}
+
+    def update_one(self, filter, update, upsert=False):
+        key = (filter["title"], filter["year"])
+        before = self.documents.get(key)
+        self.documents[key] = {**(before or {}), **update["$set"]}
+        return SimpleNamespace(
+            upserted_id=key if before is None else None,
+            modified_count=int(before is not None and before != self.documents[key]),
+        )
+
+
+class FakeVersions:
+    def __init__(self):
+        self.bumped = []
+
+    def update_one(self, filter, update, upsert=False):
+        self.bumped.append(filter["_id"])
+
+
+def test_publishing_a_change_bumps_the_movies_version():
+    database = {"collection_versions": FakeVersions()}
+    tier = MongoCacheTier(collection=None, movies=FakeMovies(database))
+    tier.publish({"title": "Heat", "year": 1995, "tomatometer": 88})
+    tier.publish({"title": "Heat", "year": 1995, "tomatometer": 88})  # Unchanged
+    tier.publish({"title": "Heat", "year": 1995, "tomatometer": 89})
+    assert database["collection_versions"].bumped == ["movies", "movies"]
@@ -0,0 +1,57 @@
+import asyncio
+from rotten_tomatoes.coalescing import SingleFlight, normalize_title
+
+
+def test_normalize_title():
+    assert normalize_title("  The   Apprentice ") == "the apprentice"
+    assert normalize_title("TIME CUT") == normalize_title("time cut")
+
+
+def test_concurrent_calls_share_one_execution():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def crawl():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"title": "Heat"}
+
+        results = await asyncio.gather(
+            *(flight.do("heat", crawl) for _ in range(10))
+        )
+        assert results == [{"title": "Heat"}] * 10
+        assert len(calls) == 1
+        assert (flight.started, flight.coalesced, flight.in_flight()) == (1, 9, 0)
+
+        # Once finished, the next call starts fresh work
+        await flight.do("heat", crawl)
+        assert len(calls) == 2
+
+    asyncio.run(scenario())
+
+
+def test_errors_reach_every_waiter_and_cancellation_is_isolated():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def failing():
+            await asyncio.sleep(0.05)
+            raise ValueError("crawl failed")
+
+        results = await asyncio.gather(
+            flight.do("a", failing), flight.do("a", failing), return_exceptions=True
+        )
+        assert all(isinstance(result, ValueError) for result in results)
+
+        async def slow():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        first = asyncio.ensure_future(flight.do("b", slow))
+        second = asyncio.ensure_future(flight.do("b", slow))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == "done"
+
+    asyncio.run(scenario())
@@ -0,0 +1,121 @@
+import os
+import time
+import pytest
+import scrapy
+from scrapy.settings import Settings
+from rotten_tomatoes.crawler_pool import CrawlerWorkerPool
+
+
+class DataSpider(scrapy.Spider):
+    """Spider scraping an inline data: URL, so no network is needed."""
+
+    name = "data_spider"
+
+    def __init__(self, query: str = None, queries: list = None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queries = queries if queries is not None else [query]
+
+    def start_requests(self):
+        for query in self.queries:
+            yield scrapy.Request(
+                url=f"data:,{query}", callback=self.parse, meta={"query": query}
+            )
+
+    def parse(self, response):
+        yield {"title": response.text, "concurrency": self.settings["CONCURRENT_REQUESTS"]}
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = CrawlerWorkerPool(DataSpider, Settings({"LOG_ENABLED": False}), size=1)
+    pool.start(timeout=60)
+    yield pool
+    pool.close()
+
+
+def test_jobs_reuse_warm_worker(pool):
+    """Consecutive jobs run in the same long-lived worker process."""
+    first = pool.submit(query="Avatar").result(timeout=30)
+    second = pool.submit(query="Heat").result(timeout=30)
+
+    assert first.ok and second.ok
+    assert [item["title"] for item in first.items] == ["Avatar"]
+    assert [item["title"] for item in second.items] == ["Heat"]
+    assert first.worker_pid == second.worker_pid
+    assert second.latency >= second.crawl_time > 0
+
+
+def test_concurrent_jobs_and_stats(pool):
+    futures = [pool.submit(query=f"movie-{i}") for i in range(8)]
+    results = [future.result(timeout=30) for future in futures]
+
+    assert [[item["title"] for item in result.items] for result in results] == [
+        [f"movie-{i}"] for i in range(8)
+    ]
+    stats = pool.stats()
+    assert stats["workers"] == 1
+    assert stats["pending"] == 0
+    assert stats["completed"] >= 8
+    assert stats["latency_max"] >= stats["latency_p50"] > 0
+
+
+def test_batch_job_groups_items_by_query(pool):
+    """A single job crawls many queries with its own settings."""
+    queries = [f"title-{i}" for i in range(20)]
+    result = pool.submit(settings={"CONCURRENT_REQUESTS": 64}, queries=queries).result(
+        timeout=30
+    )
+
+    assert result.ok
+    assert len(result.items) == 20
+    for query in queries:
+        per_query = result.for_query(query)
+        assert per_query.query == query
+        assert per_query.items == [{"title": query, "concurrency": 64}]
+
+
+class CrashingSpider(DataSpider):
+    """Kills its worker process on the query "crash", and takes its time on "slow"."""
+
+    name = "crashing_spider"
+
+    def parse(self, response):
+        if response.text == "crash":
+            os._exit(3)
+        if response.text == "slow":
+            time.sleep(1)
+        yield {"title": response.text}
+
+
+def test_jobs_of_a_dead_worker_fail_instead_of_hanging():
+    pool = CrawlerWorkerPool(CrashingSpider, Settings({"LOG_ENABLED": False}), size=1)
+    pool.start(timeout=60)
+    try:
+        crashed = pool.submit(query="crash").result(timeout=30)
+        assert not crashed.ok
+        assert "exited" in crashed.error
+        assert pool.stats()["workers"] == 0
+        # The next job starts the pool again
+        assert pool.submit(query="Heat").result(timeout=60).ok
+    finally:
+        pool.close()
+
+
+def test_close_lets_crawls_in_flight_finish():
+    pool = CrawlerWorkerPool(CrashingSpider, Settings({"LOG_ENABLED": False}), size=1)
+    pool.start(timeout=60)
+    future = pool.submit(query="slow")
+    pool.close()
+    result = future.result(timeout=5)
+    assert result.ok
+    assert [item["title"] for item in result.items] == ["slow"]
+
+
+def test_start_fails_fast_when_a_worker_crashes():
+    settings = Settings({"LOG_ENABLED": False, "TWISTED_REACTOR": "no.such.Reactor"})
+    pool = CrawlerWorkerPool(DataSpider, settings, size=1)
+    started = time.monotonic()
+    with pytest.raises(RuntimeError, match="exited"):
+        pool.start(timeout=60)
+    assert time.monotonic() - started < 30
+    assert not pool.is_running
@@ -0,0 +1,88 @@
+import asyncio
+import concurrent.futures
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api import endpoints
+from cache import TTLCache
+from crawler_pool import CrawlResult
+
+
+class FakeService:
+    """Crawls a batch by looking the titles up in `catalog`, counting the crawls."""
+
+    def __init__(self, catalog, failing=(), slow=()):
+        self.catalog = catalog
+        self.failing = set(failing)
+        self.slow = set(slow)
+        self.crawled = []
+
+    def get_movies(self, movie_names, proxy_endpoint, chunk_size=50, timeout=None):
+        for title in movie_names:
+            if title in self.slow:
+                raise concurrent.futures.TimeoutError()
+            self.crawled.append(title)
+            if title in self.failing:
+                yield CrawlResult(job_id="batch", query=title, error="Spider closed")
+            else:
+                items = [self.catalog[title]] if title in self.catalog else []
+                yield CrawlResult(job_id="batch", query=title, items=items)
+
+
+@pytest.fixture
+def service(monkeypatch):
+    service = FakeService(
+        {"Heat": {"title": "Heat", "tomatometer": 87}, "Alien": {"title": "Alien"}}
+    )
+    monkeypatch.setattr(endpoints, "service", service)
+    monkeypatch.setattr(endpoints, "movie_cache", TTLCache())
+    return service
+
+
+@pytest.fixture
+def client(service):
+    app = FastAPI()
+    app.include_router(endpoints.router)
+    # Not entered as a context manager: the relay and the pool are not started
+    return TestClient(app)
+
+
+def test_batch_crawls_each_title_once_and_caches_it(client, service):
+    titles = ["Heat", "heat", "Alien", "Nope"]
+    response = client.post("/movies/", json={"titles": titles})
+    assert response.status_code == 200
+    assert response.json() == {
+        "movies": {"Heat": "crawled", "heat": "crawled", "Alien": "crawled", "Nope": "not_found"}
+    }
+    assert service.crawled == ["Heat", "Alien", "Nope"]
+
+    movie, scores_fresh = asyncio.run(endpoints.movie_cache.lookup_movie("heat"))
+    assert movie["tomatometer"] == 87 and scores_fresh
+    # Cached titles are not crawled again
+    response = client.post("/movies/", json={"titles": ["Heat", "Zodiac"]})
+    assert response.json() == {"movies": {"Heat": "cached", "Zodiac": "not_found"}}
+    assert service.crawled[3:] == ["Zodiac"]
+
+
+def test_batch_reports_failed_and_timed_out_titles(client, service):
+    service.failing, service.slow = {"Heat"}, {"Zodiac"}
+    response = client.post("/movies/", json={"titles": ["Heat", "Alien", "Zodiac"]})
+    assert response.json() == {
+        "movies": {"Heat": "failed", "Alien": "crawled", "Zodiac": "timed_out"}
+    }
+
+
+def test_batch_size_is_bounded(client, monkeypatch):
+    monkeypatch.setattr(endpoints, "batch_max_titles", 2)
+    response = client.post("/movies/", json={"titles": ["Heat", "Alien", "Zodiac"]})
+    assert response.status_code == 413
+
+
+def test_crawler_config_tells_clients_the_timeouts(client):
+    assert client.get("/crawler/config/").json() == {
+        "crawl_timeout": endpoints.crawl_timeout,
+        "batch_max_titles": endpoints.batch_max_titles,
+        "batch_crawl_timeout": endpoints.batch_crawl_timeout,
+    }
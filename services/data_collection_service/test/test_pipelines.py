@@ -0,0 +1,289 @@
+import asyncio
+import json
+import os
+import pytest
+import scrapy
+from scrapy.settings import Settings
+from twisted.internet import defer
+from rotten_tomatoes.rottentomatoes_scraper.rottentomatoes_scraper.jsonl import (
+    available_compressions,
+    get_compression,
+    iter_jsonl,
+)
+from pymongo.results import BulkWriteResult
+from rotten_tomatoes.connections import (
+    BATCH_KEY,
+    ClientConnectionParameters,
+    JobDemultiplexer,
+    ServerConnectionParameters,
+    setup_server,
+)
+from rotten_tomatoes.crawler_pool import CrawlerWorkerPool
+from rotten_tomatoes.rottentomatoes_scraper.rottentomatoes_scraper.items import (
+    MovieItem,
+    ReviewItem,
+)
+from rotten_tomatoes.rottentomatoes_scraper.rottentomatoes_scraper.pipelines import (
+    JsonWriterPipeline,
+    MongoBulkWritePipeline,
+    SendToServer,
+)
+
+
+def inline_writes(pipeline):
+    # Write inline: there is no reactor running the thread pool here
+    pipeline._in_thread = lambda f, *args: defer.maybeDeferred(f, *args)
+    return pipeline
+
+
+def read_lines(paths):
+    lines = []
+    for path in paths:
+        with open(path) as file:
+            lines.extend(json.loads(line) for line in file)
+    return lines
+
+
+def test_json_writer_batches_and_shards_per_crawl(tmp_path):
+    spider = scrapy.Spider(name="movies", job_id="job-1")
+    writer = inline_writes(
+        JsonWriterPipeline(output_dir=str(tmp_path), batch_size=3, flush_interval=0)
+    )
+    writer.open_spider(spider)
+
+    for i in range(2):
+        writer.process_item({"title": f"Movie {i}"}, spider)
+    # Below the batch size nothing is written yet
+    assert (tmp_path / "items-movies-job-1-00000.jsonl").stat().st_size == 0
+    writer.process_item({"title": "Movie 2"}, spider)
+    assert len(read_lines(writer.paths)) == 3
+
+    writer.process_item({"title": "Movie 3"}, spider)
+    writer.close_spider(spider)
+    assert [item["title"] for item in read_lines(writer.paths)] == [
+        f"Movie {i}" for i in range(4)
+    ]
+
+
+def test_json_writer_rotates_on_size(tmp_path):
+    spider = scrapy.Spider(name="movies", job_id="job-2")
+    writer = inline_writes(
+        JsonWriterPipeline(
+            output_dir=str(tmp_path), batch_size=1, flush_interval=0, max_file_size=10
+        )
+    )
+    writer.open_spider(spider)
+    for i in range(3):
+        writer.process_item({"title": f"Movie {i}"}, spider)
+    writer.close_spider(spider)
+    assert len(writer.paths) == 3
+    assert len(read_lines(writer.paths)) == 3
+
+
+def test_json_writer_writes_off_the_reactor_and_waits_on_close(tmp_path):
+    spider = scrapy.Spider(name="movies", job_id="job-4")
+    writer = JsonWriterPipeline(output_dir=str(tmp_path), batch_size=2, flush_interval=0)
+    threaded = []
+
+    def in_thread(f, *args):
+        threaded.append((f, args, defer.Deferred()))
+        return threaded[-1][2]
+
+    writer._in_thread = in_thread
+    writer.open_spider(spider)
+    writer.process_item({"title": "Heat"}, spider)
+    passed, closed = [], []
+    writer.process_item({"title": "Alien"}, spider).addCallback(passed.append)
+    writer.close_spider(spider).addCallback(closed.append)
+    # The batch is handed to a thread: neither the item nor the close go through yet
+    assert (passed, closed) == ([], [])
+
+    (write, args, done), = threaded
+    write(*args)
+    done.callback(None)
+    assert passed == [{"title": "Alien"}]
+    assert len(closed) == 1
+    assert [item["title"] for item in read_lines(writer.paths)] == ["Heat", "Alien"]
+
+
+@pytest.mark.parametrize("compression", available_compressions())
+def test_json_writer_compressed_round_trip(tmp_path, compression):
+    spider = scrapy.Spider(name="reviews", job_id="job-3")
+    writer = inline_writes(
+        JsonWriterPipeline(
+            output_dir=str(tmp_path), batch_size=2, flush_interval=0, compression=compression
+        )
+    )
+    writer.open_spider(spider)
+    for i in range(5):
+        writer.process_item({"comment": f"Review {i}"}, spider)
+    # Flushed batches can be read while the shard is still being written
+    assert len(list(iter_jsonl(writer.paths[0]))) == 4
+    writer.close_spider(spider)
+
+    assert writer.paths[0].endswith(".jsonl" + get_compression(compression).extension)
+    assert [item["comment"] for item in iter_jsonl(writer.paths[0])] == [
+        f"Review {i}" for i in range(5)
+    ]
+
+
+def test_json_writer_rerun_starts_a_fresh_shard(tmp_path):
+    spider = scrapy.Spider(name="movies", job_id="job-5")
+    paths = []
+    for title in ("Heat", "Alien"):
+        writer = inline_writes(
+            JsonWriterPipeline(
+                output_dir=str(tmp_path), batch_size=1, flush_interval=0, compression="gzip"
+            )
+        )
+        writer.open_spider(spider)
+        writer.process_item({"title": title}, spider)
+        writer.close_spider(spider)
+        paths += writer.paths
+    assert [os.path.basename(path) for path in paths] == [
+        "items-movies-job-5-00000.jsonl.gz",
+        "items-movies-job-5-00001.jsonl.gz",
+    ]
+    assert [[item["title"] for item in iter_jsonl(path)] for path in paths] == [["Heat"], ["Alien"]]
+
+
+@pytest.mark.parametrize("compression", available_compressions())
+def test_iter_jsonl_stops_at_a_crash_truncated_block(tmp_path, compression):
+    codec = get_compression(compression)
+    path = str(tmp_path / f"items.jsonl{codec.extension}")
+    with open(path, "wb") as raw:
+        writer = codec.open_writer(raw)
+        for i in range(2):
+            writer.write(json.dumps({"title": f"Movie {i}"}).encode() + b"\n")
+            writer.flush()
+    # Cut mid block by a crash, then followed by what an appending rerun wrote
+    with open(path, "r+b") as raw:
+        raw.truncate(os.path.getsize(path) - 3)
+        raw.seek(0, os.SEEK_END)
+        rerun = codec.open_writer(raw)
+        rerun.write(b'{"title": "Rerun"}\n')
+        rerun.close()
+
+    titles = [item["title"] for item in iter_jsonl(path)]
+    assert titles == ["Movie 0", "Movie 1"][: len(titles)]
+
+
+class FakeCollection:
+    """Records the bulk writes a pipeline sends instead of reaching Mongo."""
+
+    def __init__(self):
+        self.batches = []
+        self.updates = []
+
+    def bulk_write(self, requests, ordered=True):
+        self.batches.append((list(requests), ordered))
+        return BulkWriteResult(
+            {"nUpserted": len(requests), "nModified": 0, "upserted": []}, True
+        )
+
+    def update_one(self, filter, update, upsert=False):
+        self.updates.append((filter, update, upsert))
+
+
+def test_mongo_pipeline_upserts_in_unordered_batches():
+    db = {
+        "movies": FakeCollection(),
+        "reviews": FakeCollection(),
+        "collection_versions": FakeCollection(),
+    }
+    spider = scrapy.Spider(name="movies")
+    pipeline = inline_writes(MongoBulkWritePipeline(batch_size=3, flush_interval=0, db=db))
+    pipeline.open_spider(spider)
+
+    pipeline.process_item(MovieItem(title="Heat", year=1995), spider)
+    pipeline.process_item(ReviewItem(movie="Heat", author_name="A", comment="Tense"), spider)
+    assert db["movies"].batches == []
+    written = []
+    pipeline.process_item(
+        ReviewItem(movie="Heat", author_name="B", comment="Long"), spider
+    ).addCallback(written.append)
+    # The item filling the batch is passed on once the batch is written
+    assert [item["author_name"] for item in written] == ["B"]
+
+    (movies, ordered), = db["movies"].batches
+    assert not ordered
+    assert movies[0]._filter == {"title": "Heat", "year": 1995}
+    assert movies[0]._doc == {"$set": {"title": "Heat", "year": 1995}}
+    (reviews, _), = db["reviews"].batches
+    assert [review._filter["author_name"] for review in reviews] == ["A", "B"]
+
+    pipeline.process_item(MovieItem(title="Alien"), spider)
+    pipeline.close_spider(spider)
+    assert len(db["movies"].batches) == 2
+    assert pipeline.upserted == 4
+    # Every write that changed a collection bumped its version
+    assert [filter["_id"] for filter, _, _ in db["collection_versions"].updates] == [
+        "movies",
+        "reviews",
+        "movies",
+    ]
+
+
+class RelayedDataSpider(scrapy.Spider):
+    """Scrapes inline data: URLs and leaves relaying to the SendToServer pipeline."""
+
+    name = "relayed_data_spider"
+
+    def __init__(self, queries: list, proxy_endpoint=None, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queries = queries
+        self.proxy_endpoint = proxy_endpoint
+
+    def start_requests(self):
+        for query in self.queries:
+            yield scrapy.Request(url=f"data:,{query}", meta={"query": query})
+
+    def parse(self, response):
+        yield {"title": response.text}
+
+
+def test_send_to_server_relays_items_in_acknowledged_batches():
+    async def scenario():
+        server = await setup_server(
+            ServerConnectionParameters(address="127.0.0.1", port=65436, is_relay=True)
+        )
+        messages = []
+        demux = JobDemultiplexer()
+        server.add_listener(messages.append)
+        server.add_listener(demux.dispatch)
+        items = demux.open("job-4")
+        pool = CrawlerWorkerPool(
+            RelayedDataSpider,
+            Settings(
+                {
+                    "LOG_ENABLED": False,
+                    "ITEM_PIPELINES": {SendToServer: 500},
+                    "RELAY_BATCH_SIZE": 3,
+                    "RELAY_FLUSH_INTERVAL": 1,
+                }
+            ),
+            size=1,
+        )
+        try:
+            await asyncio.to_thread(pool.start)
+            result = await asyncio.wrap_future(
+                pool.submit(
+                    job_id="job-4",
+                    queries=[f"Movie {i}" for i in range(5)],
+                    proxy_endpoint=ClientConnectionParameters(
+                        address="127.0.0.1", port=65436, subscribe=False
+                    ),
+                )
+            )
+        finally:
+            await asyncio.to_thread(pool.close)
+            await server.close()
+
+        assert result.ok
+        # Acknowledged before the crawl is reported done: 3 items, then the last 2
+        assert [len(message[BATCH_KEY]) for message in messages] == [3, 2]
+        assert sorted(items.get_nowait()["title"] for _ in range(5)) == [
+            f"Movie {i}" for i in range(5)
+        ]
+
+    asyncio.run(scenario())
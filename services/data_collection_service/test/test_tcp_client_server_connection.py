@@ -1,15 +1,28 @@
 import pytest
 from rotten_tomatoes.connections import (
     TCPRelayServer,
+    AsyncTCPRelayServer,
     TCPClient,
+    TCPClientPool,
     ServerConnectionParameters,
     setup_server,
     setup_client,
     ClientConnectionParameters,
+    DataProcessor,
+    FrameDecoder,
+    FrameError,
+    encode_frame,
+    read_frame,
+    JobDemultiplexer,
+    make_envelope,
+    open_envelope,
 )
+import asyncio
+import json
+import os
+import socket
 import threading
 import time
-from unittest.mock import patch, MagicMock
 
 @pytest.fixture(scope="module")
 def address():
@@ -46,6 +59,18 @@ def relay_server(server_params):
     return relay_server
 
 
+@pytest.fixture(scope="module")
+def passthrough_relay_server(address):
+    """Fixture for a TCPRelayServer forwarding raw frames."""
+    relay_server = TCPRelayServer(
+        ServerConnectionParameters(
+            address=address, port=65434, maximum_clients=2, is_relay=True, passthrough=True
+        )
+    )
+    relay_server.start_server(as_daemon=True)
+    return relay_server
+
+
 @pytest.fixture
 def client_factory(client_params):
     """Fixture to create multiple clients."""
@@ -58,11 +83,19 @@ def client_factory(client_params):
     return create_client
 
 
+def wait_for_clients(relay_server, count, timeout=5):
+    """Wait until the relay server has registered `count` clients."""
+    deadline = time.time() + timeout
+    while len(relay_server.clients) < count and time.time() < deadline:
+        time.sleep(0.01)
+
+
 def test_relay_message_server(relay_server, client_factory):
     """Test the message relay functionality of the TCPRelayServer."""
     # Create two clients
     client1 = client_factory()
     client2 = client_factory()
+    wait_for_clients(relay_server, 2)
 
     try:
         # Send a message from client1
@@ -70,9 +103,9 @@ def test_relay_message_server(relay_server, client_factory):
         client1.send_as_json(data=message, timeout=1)
 
         # Verify that client2 receives the message
-        response = client2.client_socket.recv(1024).decode("utf-8")
+        response = client2.receive_as_json(timeout=1)
         assert (
-            "Hello from client1" in response
+            response["message"] == "Hello from client1"
         ), "Client2 did not receive the relayed message from Client1"
     finally:
         # Clean up clients
@@ -80,20 +113,409 @@ def test_relay_message_server(relay_server, client_factory):
         client2.close()
 
 
-@pytest.fixture
-def mock_server():
-    with patch("socket.socket") as mock_socket:
-        yield mock_socket
+def test_relay_large_and_back_to_back_messages(relay_server, client_factory):
+    """Large payloads and bursts of messages are relayed intact and in order."""
+    client1 = client_factory()
+    client2 = client_factory()
+    wait_for_clients(relay_server, 2)
+
+    try:
+        synopsis = "A long synopsis. " * 20000
+        assert client1.send_as_json(data={"synopsis": synopsis}, timeout=5) == {
+            "Status": "OK"
+        }
+        for i in range(50):
+            client1.send_as_json(data={"index": i}, timeout=5)
+
+        assert client2.receive_as_json(timeout=5)["synopsis"] == synopsis
+        for i in range(50):
+            assert client2.receive_as_json(timeout=5) == {"index": i}
+    finally:
+        client1.close()
+        client2.close()
+
+
+def test_passthrough_relay_forwards_raw_frames(address, passthrough_relay_server):
+    """Frames larger than the receive buffer and bursts of small ones are forwarded intact."""
+    params = ClientConnectionParameters(address=address, port=65434)
+    client1, client2 = TCPClient(params), TCPClient(params)
+    client1.connect(timeout=5)
+    client2.connect(timeout=5)
+    wait_for_clients(passthrough_relay_server, 2)
+
+    try:
+        cast = [f"Actor {i}" for i in range(20000)]
+        assert client1.send_as_json(data={"cast": cast}, timeout=5) == {"Status": "OK"}
+        payloads = [b'{"index": %d}' % i for i in range(200)]
+        for payload in payloads:
+            client1.send_frame(payload)
+
+        assert client2.receive_as_json(timeout=5) == {"cast": cast}
+        for payload in payloads:
+            assert client2.receive_frame(timeout=5) == payload
+        for _ in payloads:
+            assert client1.receive_as_json(timeout=5) == {"Status": "OK"}
+    finally:
+        client1.close()
+        client2.close()
+
+
+@pytest.mark.skipif(
+    "msgpack" not in DataProcessor.available(), reason="msgpack is not installed"
+)
+def test_relay_between_negotiated_codecs(relay_server, client_params, client_factory):
+    """Each client is relayed messages in the codec it negotiated."""
+    binary_client = TCPClient(
+        ClientConnectionParameters(
+            address=client_params.address,
+            port=client_params.port,
+            codecs=["msgpack", "json"],
+        )
+    )
+    binary_client.connect(timeout=5)
+    json_client = client_factory()
+    wait_for_clients(relay_server, 2)
+
+    try:
+        assert binary_client.processor.name == "msgpack"
+        assert json_client.processor.name == "json"
+
+        message = {"title": "Reservoir Dogs", "cast": ["Harvey Keitel", "Tim Roth"]}
+        assert binary_client.send_as_json(data=message, timeout=5) == {"Status": "OK"}
+        assert json_client.receive_as_json(timeout=5) == message
+
+        json_client.send_as_json(data={"year": 1992}, timeout=5)
+        payload = binary_client.receive_frame(timeout=5)
+        assert DataProcessor.get("msgpack").from_web(payload) == {"year": 1992}
+    finally:
+        binary_client.close()
+        json_client.close()
+
+
+def test_unknown_codec_is_rejected():
+    with pytest.raises(ValueError):
+        DataProcessor.get("does-not-exist")
+
+
+def test_frame_decoder_reassembles_split_frames():
+    """Frames split across arbitrary chunks are reassembled in order."""
+    stream = encode_frame(b"first") + encode_frame(b"") + encode_frame(b"x" * 5000)
+    decoder = FrameDecoder()
+    frames = []
+    for i in range(0, len(stream), 7):
+        decoder.feed(stream[i : i + 7])
+        frames.extend(decoder.frames())
+
+    assert frames == [b"first", b"", b"x" * 5000]
+    assert decoder.pending == 0
+
+
+def test_frame_decoder_rejects_oversized_frames():
+    decoder = FrameDecoder(max_frame_size=10)
+    decoder.feed(encode_frame(b"x" * 11))
+    with pytest.raises(FrameError):
+        decoder.next_frame()
+
+
+def test_setup_server(address):
+    """setup_server returns a relay already serving on the running loop."""
+
+    async def scenario():
+        params = ServerConnectionParameters(
+            address=address, port=65433, maximum_clients=2, is_relay=True
+        )
+        server = await setup_server(params)
+        try:
+            assert isinstance(server, AsyncTCPRelayServer)
+            assert server.is_serving()
+
+            reader1, writer1 = await asyncio.open_connection(address, 65433)
+            reader2, writer2 = await asyncio.open_connection(address, 65433)
+            while len(server.clients) < 2:
+                await asyncio.sleep(0.01)
+
+            writer1.write(encode_frame(b'{"message": "Hello from client1"}'))
+            assert json.loads(await read_frame(reader1)) == {"Status": "OK"}
+            assert json.loads(await read_frame(reader2)) == {
+                "message": "Hello from client1"
+            }
+
+            writer1.close()
+            writer2.close()
+        finally:
+            await server.close()
 
+    asyncio.run(scenario())
 
-def test_setup_server(mock_server, server_params):
-    setup_server(server_params)
 
-    # Ensure socket methods are called correctly
-    mock_server.return_value.bind.assert_called_with(("127.0.0.1", 65432))
-    mock_server.return_value.listen.assert_called_with(2)  # Max clients
+def test_async_relay_listeners(address):
+    """In-process listeners receive every decoded relayed message."""
+
+    async def scenario():
+        server = await setup_server(
+            ServerConnectionParameters(address=address, port=65435, is_relay=True)
+        )
+        received = []
+        server.add_listener(received.append)
+        try:
+            reader, writer = await asyncio.open_connection(address, 65435)
+            writer.write(encode_frame(b'{"title": "Heat"}'))
+            assert json.loads(await read_frame(reader)) == {"Status": "OK"}
+            assert received == [{"title": "Heat"}]
+            writer.close()
+        finally:
+            await server.close()
+
+    asyncio.run(scenario())
+
+
+def test_async_relay_holds_credits_for_lagging_consumers(address):
+    """Acks to a producer are held back while a consumer's queue is congested."""
+
+    async def scenario():
+        server = await setup_server(
+            ServerConnectionParameters(
+                address=address,
+                port=65437,
+                is_relay=True,
+                outbound_queue_size=8,
+                high_watermark=4,
+                low_watermark=1,
+            )
+        )
+        payload = json.dumps({"blob": "x" * 1024 * 1024}).encode()
+        try:
+            consumer_reader, consumer_writer = await asyncio.open_connection(address, 65437)
+            producer_reader, producer_writer = await asyncio.open_connection(address, 65437)
+            await asyncio.sleep(0.05)
+
+            async def consume():
+                # Lag behind until the socket buffers are full and frames pile up
+                await asyncio.sleep(0.5)
+                for _ in range(30):
+                    await read_frame(consumer_reader)
+
+            consumer = asyncio.create_task(consume())
+            for _ in range(30):
+                producer_writer.write(encode_frame(payload))
+                assert json.loads(await read_frame(producer_reader)) == {"Status": "OK"}
+            await asyncio.wait_for(consumer, 10)
+
+            stats = server.flow_stats()
+            assert stats["acks_delayed"] > 0 and stats["acks_forced"] == 0
+            assert all(client["dropped"] == 0 for client in stats["clients"].values())
+            consumer_writer.close()
+            producer_writer.close()
+        finally:
+            await server.close()
+
+    asyncio.run(scenario())
+
+
+def test_async_relay_sheds_a_consumer_that_never_reads(address):
+    """A stuck consumer delays a single ack, then has its messages dropped until it drains."""
+
+    async def scenario():
+        server = await setup_server(
+            ServerConnectionParameters(
+                address=address,
+                port=65439,
+                is_relay=True,
+                outbound_queue_size=8,
+                high_watermark=4,
+                low_watermark=1,
+                max_ack_delay=0.5,
+            )
+        )
+        payload = json.dumps({"blob": "x" * 1024 * 1024}).encode()
+        try:
+            consumer_reader, consumer_writer = await asyncio.open_connection(address, 65439)
+            producer_reader, producer_writer = await asyncio.open_connection(address, 65439)
+            await asyncio.sleep(0.05)
+
+            started = time.monotonic()
+            for _ in range(30):
+                producer_writer.write(encode_frame(payload))
+                assert json.loads(await read_frame(producer_reader)) == {"Status": "OK"}
+            # Only the ack that found the consumer lagging waited for max_ack_delay
+            assert time.monotonic() - started < 3
+
+            stats = server.flow_stats()
+            (consumer,) = [client for client in stats["clients"].values() if client["dropped"]]
+            assert consumer["shed"] and stats["clients_shed"] == 1
+            assert stats["acks_forced"] == 1
+
+            # Once the consumer catches up, it is relayed messages again
+            while any(client["shed"] for client in server.flow_stats()["clients"].values()):
+                message = json.loads(await asyncio.wait_for(read_frame(consumer_reader), 5))
+            producer_writer.write(encode_frame(json.dumps({"title": "Heat"}).encode()))
+            await read_frame(producer_reader)
+            message = None
+            while message != {"title": "Heat"}:
+                message = json.loads(await asyncio.wait_for(read_frame(consumer_reader), 5))
+            consumer_writer.close()
+            producer_writer.close()
+        finally:
+            await server.close()
+
+    asyncio.run(scenario())
+
+
+def test_client_pool_reuses_and_reconnects(address):
+    """Pooled clients are reused, and replaced by health checks after a relay restart."""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    def start_relay():
+        params = ServerConnectionParameters(address=address, port=65438, is_relay=True)
+        return asyncio.run_coroutine_threadsafe(setup_server(params), loop).result(5)
+
+    server = start_relay()
+    pool = TCPClientPool(
+        ClientConnectionParameters(address=address, port=65438, subscribe=False),
+        size=2,
+        health_check_interval=0.2,
+    )
+    try:
+        with pool.connection(timeout=5) as client:
+            # Answered by the relay itself, never relayed
+            assert client.ping(timeout=5)
+            first = client
+        with pool.connection(timeout=5) as client:
+            assert client is first
+        assert pool.stats()["connects"] == 1
+
+        asyncio.run_coroutine_threadsafe(server.close(), loop).result(5)
+        server = start_relay()
+        deadline = time.time() + 5
+        while pool.stats()["reconnects"] < 1 and time.time() < deadline:
+            time.sleep(0.05)
+        assert pool.stats()["failed_health_checks"] >= 1
+        with pool.connection(timeout=5) as client:
+            assert client is not first
+            assert client.send_as_json({"title": "Heat"}, timeout=5) == {"Status": "OK"}
+    finally:
+        pool.close()
+        asyncio.run_coroutine_threadsafe(server.close(), loop).result(5)
+        loop.call_soon_threadsafe(loop.stop)
+
+
+def test_client_dropped_during_handshake_is_not_connected(address):
+    """A server closing right after accept leaves the client disconnected, and the pool retrying."""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((address, 65440))
+    listener.listen()
+    accepted = []
+
+    def drop_connections():
+        while True:
+            try:
+                connection, _ = listener.accept()
+            except OSError:
+                return
+            accepted.append(1)
+            connection.close()
+
+    threading.Thread(target=drop_connections, daemon=True).start()
+    params = ClientConnectionParameters(address=address, port=65440, subscribe=False)
+    try:
+        client = TCPClient(params)
+        client.connect(timeout=5)
+        assert not client.is_connected
+        with pytest.raises(Exception, match="Not connected"):
+            client.send_frame(b"{}")
+
+        pool = TCPClientPool(params, size=1, health_check_interval=60, initial_backoff=0.05)
+        try:
+            with pytest.raises(TimeoutError):
+                pool.acquire(timeout=0.5)
+            assert pool.stats()["connects"] == 0
+            assert len(accepted) > 2  # Backed off and tried again
+        finally:
+            pool.close()
+    finally:
+        listener.close()
+
+
+def test_relay_over_unix_domain_socket(address, tmp_path):
+    """Relays serve clients on the same host through a Unix domain socket."""
+    unix_path = str(tmp_path / "relay.sock")
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    server = asyncio.run_coroutine_threadsafe(
+        setup_server(
+            ServerConnectionParameters(
+                address=address, port=0, is_relay=True, unix_path=unix_path
+            )
+        ),
+        loop,
+    ).result(5)
+    producer = setup_client(
+        ClientConnectionParameters(
+            address=address, port=0, subscribe=False, unix_path=unix_path
+        )
+    )
+    consumer = setup_client(
+        ClientConnectionParameters(address=address, port=0, unix_path=unix_path)
+    )
+    try:
+        deadline = time.time() + 5
+        while len(server.clients) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        for i in range(3):
+            assert producer.send_as_json({"i": i}, timeout=5) == {"Status": "OK"}
+        assert [consumer.receive_as_json(timeout=5)["i"] for _ in range(3)] == [0, 1, 2]
+    finally:
+        producer.close()
+        consumer.close()
+        asyncio.run_coroutine_threadsafe(server.close(), loop).result(5)
+        loop.call_soon_threadsafe(loop.stop)
+    assert not os.path.exists(unix_path)
+
+
+def test_producers_do_not_receive_relayed_messages(relay_server, client_params, client_factory):
+    """Clients connecting with subscribe=False only get acks for their own messages."""
+    producer_params = ClientConnectionParameters(
+        address=client_params.address, port=client_params.port, subscribe=False
+    )
+    producer1, producer2 = TCPClient(producer_params), TCPClient(producer_params)
+    producer1.connect(timeout=5)
+    producer2.connect(timeout=5)
+    consumer = client_factory()
+    wait_for_clients(relay_server, 3)
+
+    try:
+        for i in range(5):
+            assert producer1.send_as_json(data={"from": 1, "i": i}, timeout=5) == {"Status": "OK"}
+            assert producer2.send_as_json(data={"from": 2, "i": i}, timeout=5) == {"Status": "OK"}
+        received = [consumer.receive_as_json(timeout=5) for _ in range(10)]
+        assert sorted((m["from"], m["i"]) for m in received) == [
+            (p, i) for p in (1, 2) for i in range(5)
+        ]
+    finally:
+        producer1.close()
+        producer2.close()
+        consumer.close()
+
 
+def test_job_demultiplexer_routes_by_job_id():
+    async def scenario():
+        demux = JobDemultiplexer()
+        first, second = demux.open("job-1"), demux.open("job-2")
 
+        demux.dispatch(make_envelope("job-2", {"title": "Heat"}, query="heat"))
+        demux.dispatch(make_envelope("job-1", {"title": "Avatar"}))
+        demux.dispatch(make_envelope("unknown", {"title": "Alien"}))
+        demux.dispatch({"title": "no envelope"})
 
+        assert await first.get() == {"title": "Avatar"}
+        assert await second.get() == {"title": "Heat"}
+        assert (demux.routed, demux.unrouted) == (2, 2)
 
+        demux.close("job-1")
+        demux.dispatch(make_envelope("job-1", {"title": "Late"}))
+        assert first.empty()
 
+    asyncio.run(scenario())
+    assert open_envelope(make_envelope("j", 1, "q")) == ("j", "q", 1)
@@ -3,15 +3,36 @@
 
 # It needs a list of movies to collect data for
 
-# It needs to collect data for each movie in the list, collecting data from 
+# It needs to collect data for each movie in the list, collecting data from
 # different sources, standardizing the data, and storing it in a database.
 
+# Lists can hold millions of movies, so they are read incrementally: movies are
+# handed to the crawlers a batch at a time as soon as they are parsed, and
+# duplicates are dropped with a Bloom filter whose memory does not grow with the list.
+#
+# Run from the repository root: python -m services.db_service.main movies.csv
+
+import csv
+import hashlib
+import itertools
 import json
-from typing import Any, TypeAlias, Union
+import math
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TextIO, TypeAlias, Union
 from dataclasses import dataclass
 
+import requests
+
+from services.data_collection_service.rotten_tomatoes.coalescing import normalize_title
+
 DB_URL = "mongodb://localhost:27017/"
 
+# Rotten Tomatoes API: crawls, caches and stores a list of movies on POST /movies/
+RT_API_URL = os.getenv("RT_API_URL", "http://localhost:8003")
+
 # Define data structure for movie
 @dataclass
 class MovieDType:
@@ -20,25 +41,382 @@ class MovieDType:
 PathDType: TypeAlias = Union[str]
 
 
-def _get_list_of_movies_from_json_file(source: str) -> list[MovieDType]:
-    with open(source, "r") as f:
-        file_with_movies = json.load(f)
-    return file_with_movies["list"]
+# ---- Reading movie lists ----
+
+
+def _to_movie(entry: Any) -> MovieDType:
+    """
+    Reads a list entry, either a bare title or an object with a `title`.
+    """
+    if isinstance(entry, str):
+        return MovieDType(title=entry)
+    if isinstance(entry, dict) and isinstance(entry.get("title"), str):
+        return MovieDType(title=entry["title"])
+    raise ValueError(f"Not a movie: {entry!r}")
+
+
+_WHITESPACE = re.compile(r"\s*")
+
+# Characters the decoder may read past the point where it fails on a value cut
+# short by the end of a chunk, like a literal or a surrogate pair of \u escapes
+_DECODE_LOOKAHEAD = 16
+
+
+class _JsonStream:
+    """
+    Decodes the JSON values of a file one at a time, reading it a chunk at a time.
+
+    Only the unread part of the current chunk and the value being decoded are
+    kept in memory.
+    """
+
+    def __init__(self, file: TextIO, chunk_size: int = 64 * 1024):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        # Bytes of the file dropped from the buffer so far
+        self.offset = 0
+
+    def _fill(self) -> bool:
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            return False
+        self.offset += len(self.buffer[: self.pos].encode("utf-8"))
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """
+        Returns the next character that is not whitespace, "" at the end of the file.
+        """
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r}, found {found or 'the end of the file'!r}")
+        self.pos += 1
+
+    def skip_comma(self) -> None:
+        if self.peek() == ",":
+            self.pos += 1
+
+    def value(self) -> Any:
+        """
+        Decodes the value at the current position, which `peek` has moved to.
+
+        Raises:
+            ValueError: If the value is malformed, with its byte offset in the file.
+        """
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as error:
+                # The value may continue in the next chunk, unless the decoder
+                # failed too far from the end of the buffer for more data to help
+                truncated = (
+                    len(self.buffer) - error.pos <= _DECODE_LOOKAHEAD
+                    or error.msg.startswith("Unterminated string")
+                )
+                if truncated and self._fill():
+                    continue
+                where = self.offset + len(self.buffer[: error.pos].encode("utf-8"))
+                raise ValueError(f"{error.msg} at byte {where} of the file") from None
+            # So does a number ending with the chunk
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def items(self) -> Iterator[Any]:
+        """
+        Yields the elements of the array starting at the current position.
+        """
+        self.expect("[")
+        while True:
+            char = self.peek()
+            if char == "]":
+                self.pos += 1
+                return
+            if not char:
+                raise ValueError("Unterminated list")
+            yield self.value()
+            self.skip_comma()
+
+
+def _iter_movies_from_json_file(source: str) -> Iterator[MovieDType]:
+    """
+    Streams the movies of a `{"list": [...]}` document, or of a top-level array.
+    """
+    with open(source, "r", encoding="utf-8") as f:
+        stream = _JsonStream(f)
+        if stream.peek() == "[":
+            yield from map(_to_movie, stream.items())
+            return
+        stream.expect("{")
+        while stream.peek() not in ("}", ""):
+            key = stream.value()
+            stream.expect(":")
+            if key == "list":
+                yield from map(_to_movie, stream.items())
+                return
+            stream.peek()
+            stream.value()
+            stream.skip_comma()
+    raise ValueError(f'No "list" of movies in {source}')
+
+
+def _iter_movies_from_ndjson_file(source: str) -> Iterator[MovieDType]:
+    with open(source, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield _to_movie(json.loads(line))
+
+
+def _iter_movies_from_csv_file(source: str) -> Iterator[MovieDType]:
+    """
+    Streams the movies of a CSV file with a `title` column, or of its first column
+    if there is no header.
+    """
+    with open(source, "r", encoding="utf-8", newline="") as f:
+        rows = csv.reader(f)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [name.strip().casefold() for name in header]
+        if "title" in columns:
+            column = columns.index("title")
+        else:
+            column = 0
+            rows = itertools.chain([header], rows)
+        for row in rows:
+            if len(row) > column and row[column].strip():
+                yield MovieDType(title=row[column].strip())
+
+
+# File extension -> reader
+READERS: Dict[str, Callable[[str], Iterator[MovieDType]]] = {
+    ".json": _iter_movies_from_json_file,
+    ".ndjson": _iter_movies_from_ndjson_file,
+    ".jsonl": _iter_movies_from_ndjson_file,
+    ".csv": _iter_movies_from_csv_file,
+}
+
+
+def iter_movies(source: PathDType, format: Optional[str] = None) -> Iterator[MovieDType]:
+    """
+    Streams the movies of a list, as they are read.
+
+    Args:
+        source (PathDType): Path of the list.
+        format (Optional[str]): One of the `READERS` extensions, like ".csv". By
+                                default the extension of `source`.
+
+    Raises:
+        ValueError: If the format is not supported, or an entry is not a movie.
+    """
+    extension = format or os.path.splitext(source)[1].lower()
+    if not extension.startswith("."):
+        extension = f".{extension}"
+    if extension not in READERS:
+        raise ValueError(f"Unsupported movie list format {extension!r}, available: {list(READERS)}")
+    return READERS[extension](source)
 
 
 def get_list_of_movies(source: PathDType) -> list[MovieDType]:
-    return _get_list_of_movies_from_json_file(source)
-        
+    return list(iter_movies(source))
 
 
+# ---- Deduplication ----
 
 
-if __name__ == "__main__":
-    movie_list_dict = get_list_of_movies(source="user_fed_movie_list.json")
-    
+class BloomFilter:
+    """
+    Set of strings with a fixed memory footprint, which may wrongly claim to hold
+    a string it was never given, at most `error_rate` of the time once `capacity`
+    strings were added. It never misses a string it was given.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        """
+        Args:
+            capacity (int): Number of strings the filter is sized for.
+            error_rate (float): False positive rate at `capacity` strings.
+        """
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str) -> List[int]:
+        # Double hashing: k positions out of two halves of one digest
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        step = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * step) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, key: str) -> bool:
+        bits = self._bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def add(self, key: str) -> bool:
+        """
+        Adds a string, returning False if the filter (probably) held it already.
+        """
+        bits = self._bits
+        new = False
+        for position in self._positions(key):
+            byte, mask = position >> 3, 1 << (position & 7)
+            if not bits[byte] & mask:
+                bits[byte] |= mask
+                new = True
+        self.count += new
+        return new
+
+
+def iter_unique_movies(
+    movies: Iterable[MovieDType],
+    capacity: int = 10_000_000,
+    error_rate: float = 0.001,
+    skipped: Optional[Callable[[MovieDType], None]] = None,
+) -> Iterator[MovieDType]:
+    """
+    Drops the movies whose normalized title was already seen.
+
+    A new title is dropped as a duplicate `error_rate` of the time, in exchange
+    for memory fixed by `capacity`: about 18 MB for ten million titles at 0.1%.
+    The filter cannot tell those from true duplicates, so every dropped movie is
+    handed to `skipped`, to be listed and crawled in a later run.
+
+    Args:
+        movies (Iterable[MovieDType]): Movies as read from a list.
+        capacity (int): Number of distinct titles the filter is sized for.
+        error_rate (float): Share of new titles wrongly dropped at `capacity` titles.
+        skipped (Optional[Callable[[MovieDType], None]]): Called with each dropped movie.
+    """
+    seen = BloomFilter(capacity, error_rate)
+    for movie in movies:
+        if seen.add(normalize_title(movie.title)):
+            yield movie
+        elif skipped is not None:
+            skipped(movie)
+
 
+# ---- Crawl scheduling ----
 
 
+# Seconds a batch request may take on top of the crawls the API waits for
+BATCH_TIMEOUT_SLACK = 30
+
+
+def schedule_crawls(
+    movies: Iterable[MovieDType],
+    api_url: str = RT_API_URL,
+    concurrency: int = 2,
+    batch_size: Optional[int] = None,
+) -> Dict[str, int]:
+    """
+    Asks the Rotten Tomatoes API to crawl the movies in batches, as the list is being read.
+
+    Each batch goes to `POST /movies/`, which crawls it with the chunked batch crawl
+    of the service rather than one crawl per title. Batch sizes and the request
+    timeout follow the limits the API reports on `GET /crawler/config/`, so requests
+    are not dropped before the API answers for the crawls it gave up on.
+
+    At most `concurrency` batches are crawled at once, and as many wait for one,
+    so the list is never read far ahead of the crawlers.
+
+    Args:
+        movies (Iterable[MovieDType]): Movies to crawl, typically from `iter_unique_movies`.
+        api_url (str): Base URL of the Rotten Tomatoes API.
+        concurrency (int): Batches crawled at once.
+        batch_size (Optional[int]): Titles per batch, by default the most the API takes.
+
+    Returns:
+        Dict[str, int]: How many movies were cached already, crawled, not found,
+                        failed, or timed out.
+    """
+    config = requests.Session().get(f"{api_url}/crawler/config/", timeout=10).json()
+    batch_size = min(batch_size or config["batch_max_titles"], config["batch_max_titles"])
+    timeout = config["batch_crawl_timeout"] + BATCH_TIMEOUT_SLACK
+
+    stats = dict.fromkeys(["cached", "crawled", "not_found", "failed", "timed_out"], 0)
+    lock = threading.Lock()
+    sessions = threading.local()
+    window = threading.BoundedSemaphore(2 * concurrency)
+
+    def crawl(titles: List[str]):
+        if not hasattr(sessions, "session"):
+            sessions.session = requests.Session()
+        try:
+            response = sessions.session.post(
+                f"{api_url}/movies/", json={"titles": titles}, timeout=timeout
+            )
+            response.raise_for_status()
+            outcomes = response.json()["movies"]
+        except (requests.RequestException, ValueError, KeyError) as e:
+            print(f"DB SERVICE SAYS: Crawling a batch of {len(titles)} movies failed: {e}")
+            outcomes = dict.fromkeys(titles, "failed")
+        with lock:
+            for outcome in outcomes.values():
+                stats[outcome] = stats.get(outcome, 0) + 1
+
+    def batches() -> Iterator[List[str]]:
+        batch: Dict[str, str] = {}
+        for movie in movies:
+            # The API would crawl titles that normalize the same only once anyway
+            batch.setdefault(normalize_title(movie.title), movie.title)
+            if len(batch) == batch_size:
+                yield list(batch.values())
+                batch = {}
+        if batch:
+            yield list(batch.values())
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for titles in batches():
+            window.acquire()
+            executor.submit(crawl, titles).add_done_callback(lambda _: window.release())
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Crawl every movie of a user fed list.")
+    parser.add_argument("source", nargs="?", default="user_fed_movie_list.json")
+    parser.add_argument("--format", choices=list(READERS), help="By default, the extension of source")
+    parser.add_argument("--api-url", default=RT_API_URL)
+    parser.add_argument("--concurrency", type=int, default=2, help="Batches crawled at once")
+    parser.add_argument("--batch-size", type=int, help="By default, the most the API takes")
+    parser.add_argument("--expected-movies", type=int, default=10_000_000,
+                        help="Size of the deduplication filter")
+    parser.add_argument("--skipped", default="skipped_movies.ndjson",
+                        help="NDJSON list the movies dropped as duplicates are written to")
+    args = parser.parse_args()
 
+    with open(args.skipped, "w", encoding="utf-8") as skipped:
+        probable_duplicates = 0
 
+        def skip(movie: MovieDType):
+            global probable_duplicates
+            probable_duplicates += 1
+            skipped.write(json.dumps({"title": movie.title}, ensure_ascii=False) + "\n")
 
+        movies = iter_unique_movies(
+            iter_movies(args.source, args.format), args.expected_movies, skipped=skip
+        )
+        stats = schedule_crawls(movies, args.api_url, args.concurrency, args.batch_size)
+    stats["probable_duplicates"] = probable_duplicates
+    print(f"DB SERVICE SAYS: {stats}")
+    if probable_duplicates:
+        # A few may be distinct titles the filter mistook for duplicates
+        print(f"DB SERVICE SAYS: Movies skipped as duplicates are listed in {args.skipped}, "
+              "crawl them again with it as the source")
@@ -0,0 +1,200 @@
+import io
+import json
+import threading
+
+import pytest
+import requests
+
+from services.db_service import main
+from services.db_service.main import (
+    BloomFilter,
+    MovieDType,
+    _JsonStream,
+    iter_movies,
+    iter_unique_movies,
+    schedule_crawls,
+)
+
+
+def titles_of(movies):
+    return [movie.title for movie in movies]
+
+
+def write(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_text(content, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64 * 1024])
+def test_json_stream_decodes_values_split_across_chunks(chunk_size):
+    values = ["Heat", {"title": "Léon", "year": 1994}, 12345, "Say \"cheese\"", [1.5, None], True]
+    stream = _JsonStream(io.StringIO(json.dumps(values, indent=2)), chunk_size=chunk_size)
+    assert list(stream.items()) == values
+    assert stream.peek() == ""
+
+
+@pytest.mark.parametrize(
+    "content, error",
+    [
+        ('["Heat", "Alien"', "Unterminated list"),
+        ('{"title": "Heat"}', "Expected '\\['"),
+        ('["Heat", "Ali', "Unterminated string"),
+    ],
+)
+def test_json_stream_rejects_malformed_lists(content, error):
+    stream = _JsonStream(io.StringIO(content), chunk_size=4)
+    with pytest.raises(ValueError, match=error):
+        list(stream.items())
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 1024])
+def test_json_stream_stops_at_a_malformed_entry_of_a_large_array(chunk_size):
+    before = json.dumps([{"title": f"Léon {i}"} for i in range(5000)])[:-1]
+    after = json.dumps([{"title": f"Heat {i}"} for i in range(5000)])[1:]
+    content = before + ', {"title": "Alien" "year": 1979}, ' + after
+    file = io.StringIO(content)
+    stream = _JsonStream(file, chunk_size=chunk_size)
+
+    items = stream.items()
+    for _ in range(5000):
+        next(items)
+    with pytest.raises(ValueError) as raised:
+        next(items)
+    # The position is counted in bytes from the start of the file
+    where = len(content[: content.index('"year"')].encode("utf-8"))
+    assert str(raised.value) == f"Expecting ',' delimiter at byte {where} of the file"
+    # Without reading the rest of the array
+    assert file.tell() <= content.index('"year"') + 16 + chunk_size
+
+
+def test_json_list_under_a_key_or_at_the_top_level(tmp_path):
+    wrapped = write(
+        tmp_path,
+        "wrapped.json",
+        '{"name": "Mine", "tags": {"list": [1]}, "list": ["Heat", {"title": "Alien"}]}',
+    )
+    assert titles_of(iter_movies(wrapped)) == ["Heat", "Alien"]
+    bare = write(tmp_path, "bare.json", '["Heat", "Alien"]')
+    assert titles_of(iter_movies(bare)) == ["Heat", "Alien"]
+
+
+def test_json_list_errors(tmp_path):
+    with pytest.raises(ValueError, match='No "list"'):
+        list(iter_movies(write(tmp_path, "none.json", '{"movies": []}')))
+    with pytest.raises(ValueError, match="Not a movie"):
+        list(iter_movies(write(tmp_path, "bad.json", '{"list": [{"name": "Heat"}]}')))
+
+
+def test_ndjson_skips_blank_lines_and_rejects_malformed_ones(tmp_path):
+    path = write(tmp_path, "movies.jsonl", '"Heat"\n\n{"title": "Alien"}\n')
+    assert titles_of(iter_movies(path)) == ["Heat", "Alien"]
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_movies(write(tmp_path, "bad.ndjson", '"Heat"\n{"title": \n')))
+
+
+def test_csv_with_and_without_header(tmp_path):
+    with_header = write(tmp_path, "header.csv", "year,Title\n1995,Heat\n1979, Alien \n2000,\n")
+    assert titles_of(iter_movies(with_header)) == ["Heat", "Alien"]
+    # Without a title column, the first row is a movie too
+    without_header = write(tmp_path, "bare.csv", 'Heat,1995\n"Alien, the original",1979\n')
+    assert titles_of(iter_movies(without_header)) == ["Heat", "Alien, the original"]
+    assert titles_of(iter_movies(write(tmp_path, "empty.csv", ""))) == []
+
+
+def test_format_comes_from_the_extension_unless_given(tmp_path):
+    path = write(tmp_path, "movies.txt", "Heat\n")
+    with pytest.raises(ValueError, match="Unsupported movie list format"):
+        iter_movies(path)
+    assert titles_of(iter_movies(path, format="csv")) == ["Heat"]
+
+
+def test_bloom_filter_never_misses_and_stays_near_its_error_rate():
+    bloom = BloomFilter(capacity=10_000, error_rate=0.01)
+    added = [f"movie {i}" for i in range(10_000)]
+    for title in added:
+        bloom.add(title)
+    assert all(title in bloom for title in added)
+    false_positives = sum(f"other {i}" in bloom for i in range(10_000))
+    assert false_positives < 10_000 * 0.02
+    assert not bloom.add("movie 0")
+
+
+def test_unique_movies_hand_over_what_they_skip():
+    movies = [MovieDType(title) for title in ["Heat", "HEAT ", "Alien", "heat", "The  Thing"]]
+    skipped = []
+    unique = iter_unique_movies(movies, capacity=100, skipped=skipped.append)
+    assert titles_of(unique) == ["Heat", "Alien", "The  Thing"]
+    assert titles_of(skipped) == ["HEAT ", "heat"]
+
+
+class FakeResponse:
+    def __init__(self, body, status_code=200):
+        self.body = body
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error")
+
+    def json(self):
+        return self.body
+
+
+class FakeAPI:
+    """Answers like the Rotten Tomatoes API, recording the batches it is sent."""
+
+    def __init__(self, batch_max_titles=3, failing_batch=None):
+        self.batch_max_titles = batch_max_titles
+        self.failing_batch = failing_batch
+        self.batches = []
+        self.timeouts = []
+        self.lock = threading.Lock()
+
+    def Session(self):
+        return self
+
+    def get(self, url, timeout=None):
+        assert url == "http://rt/crawler/config/"
+        return FakeResponse(
+            {
+                "crawl_timeout": 60,
+                "batch_max_titles": self.batch_max_titles,
+                "batch_crawl_timeout": 600,
+            }
+        )
+
+    def post(self, url, json=None, timeout=None):
+        assert url == "http://rt/movies/"
+        with self.lock:
+            self.batches.append(json["titles"])
+            self.timeouts.append(timeout)
+            index = len(self.batches) - 1
+        if index == self.failing_batch:
+            return FakeResponse({"detail": "Crawl failed"}, status_code=502)
+        return FakeResponse(
+            {"movies": {t: "not_found" if t == "Nope" else "crawled" for t in json["titles"]}}
+        )
+
+
+def test_crawls_are_scheduled_in_batches_through_the_batch_endpoint(monkeypatch):
+    api = FakeAPI(batch_max_titles=3)
+    monkeypatch.setattr(main.requests, "Session", api.Session)
+    movies = [MovieDType(t) for t in ["Heat", "HEAT", "Alien", "Nope", "Zodiac", "Up", "Big"]]
+
+    stats = schedule_crawls(movies, "http://rt", concurrency=1, batch_size=10)
+    # At most as many titles as the API takes, the same title once per batch
+    assert api.batches == [["Heat", "Alien", "Nope"], ["Zodiac", "Up", "Big"]]
+    # Requests outlast the crawls the API waits for
+    assert all(timeout > 600 for timeout in api.timeouts)
+    assert stats == {"cached": 0, "crawled": 5, "not_found": 1, "failed": 0, "timed_out": 0}
+
+
+def test_a_failed_batch_counts_each_of_its_movies(monkeypatch):
+    api = FakeAPI(batch_max_titles=2, failing_batch=0)
+    monkeypatch.setattr(main.requests, "Session", api.Session)
+    movies = [MovieDType(t) for t in ["Heat", "Alien", "Zodiac"]]
+
+    stats = schedule_crawls(movies, "http://rt", concurrency=1)
+    assert api.batches == [["Heat", "Alien"], ["Zodiac"]]
+    assert stats["failed"] == 2 and stats["crawled"] == 1
@@ -1,11 +1,47 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from dotenv import load_dotenv
+from data.client.mongo import AsyncDBClient
+from data.client import repository
+from data.responses import NDJSON_MEDIA_TYPE, FastJSONResponse, add_compression, ndjson_chunks
+from services.movie_library_service.title_index import TitleIndex
+from typing import Optional
+import asyncio
+import hashlib
+import os
+
+# Load environment variables
+load_dotenv()
+
+# Database connection configuration, shared with the data app
+DB_CONFIG = {
+    "host": os.getenv("MONGO_HOST", "localhost"),
+    "port": int(os.getenv("MONGO_PORT", 27017)),
+    "db": "movie_db",
+    "username": os.getenv("ROOT_USERNAME"),
+    "password": os.getenv("ROOT_PASSWORD"),
+}
+
+# Read-mostly traffic: keep a few warm connections and bound the wait for one
+POOL_CONFIG = {
+    "max_pool_size": int(os.getenv("MONGO_MAX_POOL_SIZE", 50)),
+    "min_pool_size": int(os.getenv("MONGO_MIN_POOL_SIZE", 5)),
+    "max_idle_time_ms": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 60000)),
+    "connect_timeout_ms": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000)),
+    "server_selection_timeout_ms": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000)),
+    "wait_queue_timeout_ms": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 2000)),
+}
+
+client = AsyncDBClient(**DB_CONFIG, **POOL_CONFIG)
+db = client.db
 
 
 app = FastAPI(
     title="Movie Library API",
     description="A simple API to interact with the movie library.",
     version="1.0.0",
+    default_response_class=FastJSONResponse,
 )
 
 origins = [
@@ -22,9 +58,77 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers in the request
 )
 
+add_compression(app)
+
+
+# ---- HTTP caching ----
+
+# Cache-Control per route. Listings and details carry an ETag, so once stale they
+# are revalidated with a cheap 304; suggestions follow the title index, which is
+# refreshed every TITLE_REFRESH_INTERVAL seconds.
+CACHE_CONTROL = {
+    "root": "public, max-age=86400",
+    "movie_list": "public, max-age=30, stale-while-revalidate=60",
+    "movie_search": "public, max-age=60",
+    "movie_detail": "public, max-age=300, stale-while-revalidate=600",
+}
+
+
+def make_etag(request: Request, version: int) -> str:
+    """
+    Builds the ETag of a response computed from a collection at `version`.
+
+    The same URL over the same collection version always yields the same body,
+    so the ETag only needs the URL and the version. It is weak: the gzip
+    middleware sends it with the compressed body as well as the identity one,
+    which are equivalent but not byte for byte the same.
+    """
+    target = f"{request.url.path}?{request.url.query}"
+    digest = hashlib.sha1(target.encode("utf-8")).hexdigest()
+    return f'W/"{version}-{digest[:16]}"'
+
+
+def etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    """
+    Tells whether the client already has `etag`, comparing weakly as `If-None-Match` requires.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag.removeprefix("W/") for tag in tags)
+
+
+async def conditional_get(
+    request: Request, response: Response, collection: str, cache_control: str
+) -> Optional[Response]:
+    """
+    Sets the caching headers of a response derived from `collection`.
+
+    Returns:
+        Optional[Response]: A 304 response if the client's copy is still current, in
+                            which case the endpoint returns it without querying further.
+    """
+    response.headers["Cache-Control"] = cache_control
+    try:
+        version = await repository.get_collection_version(db, collection)
+    except Exception as e:
+        # Serve the response uncached rather than failing on the version lookup
+        print(f"SERVER SAYS: Could not read the version of '{collection}': {e}")
+        return None
+    etag = make_etag(request, version)
+    response.headers["ETag"] = etag
+    if etag_matches(etag, request.headers.get("if-none-match")):
+        # The gzip middleware only adds Vary to the bodies it compresses
+        return Response(
+            status_code=304, headers={**response.headers, "Vary": "Accept-Encoding"}
+        )
+    return None
+
 
 @app.get("/", summary="Root Endpoint", tags=["Utility"])
-async def read_root():
+async def read_root(response: Response):
     """
     A root endpoint to provide a welcome message for users.
 
@@ -38,42 +142,167 @@ async def read_root():
     }
     ```
     """
+    response.headers["Cache-Control"] = CACHE_CONTROL["root"]
     return {"Message": "Welcome to the Movie Library API"}
 
 
+# ---- Title index ----
+
+# Seconds between two lookups for new movies, and between two full rebuilds,
+# which also drop deleted movies
+TITLE_REFRESH_INTERVAL = int(os.getenv("TITLE_REFRESH_INTERVAL", 30))
+TITLE_REBUILD_INTERVAL = int(os.getenv("TITLE_REBUILD_INTERVAL", 3600))
+
+titles = TitleIndex()
+title_refresher: Optional[asyncio.Task] = None
+
+
+async def load_titles(index: TitleIndex, after_id: Optional[str] = None) -> Optional[str]:
+    """
+    Adds the movies inserted after `after_id`, every movie if None, to `index`.
+
+    Returns:
+        Optional[str]: The id of the last movie indexed, to resume from.
+    """
+    movies = [movie async for movie in repository.iter_titles(db, after_id)]
+    index.add_many(movies)
+    return movies[-1]["_id"] if movies else after_id
+
+
+async def refresh_titles():
+    global titles
+    last_id = None
+    rebuilt_at = None
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            if rebuilt_at is None or loop.time() - rebuilt_at > TITLE_REBUILD_INTERVAL:
+                # Build the new index aside, so searches never see it half loaded
+                rebuilt = TitleIndex()
+                last_id = await load_titles(rebuilt)
+                titles = rebuilt
+                rebuilt_at = loop.time()
+                print(f"SERVER SAYS: Indexed {len(titles)} movie titles")
+            else:
+                last_id = await load_titles(titles, last_id)
+        except Exception as e:
+            print(f"SERVER SAYS: Could not refresh the title index: {e}")
+        await asyncio.sleep(TITLE_REFRESH_INTERVAL)
+
+
+@app.on_event("startup")
+async def start_title_refresher():
+    global title_refresher
+    title_refresher = asyncio.create_task(refresh_titles())
+
+
+@app.on_event("shutdown")
+async def close_client():
+    if title_refresher is not None:
+        title_refresher.cancel()
+    await client.close()
+
+
+# Largest page a client may ask for
+MAX_PAGE_SIZE = 200
+
+
 @app.get("/movie/", summary="Get All Movies", tags=["Movies"])
-async def get_all_movies():
+async def get_all_movies(
+    request: Request,
+    response: Response,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
     """
-    Retrieve all movies from the database.
+    Retrieve the movies in the database, a page at a time, in title order.
+
+    **Parameters**:
+    - limit: Movies per page, at most 200.
+    - cursor: The `next_cursor` of the previous page, omitted for the first page.
 
     **Returns**:
-    - A JSON response with all the movies in the database.
+    - A JSON response with the movies of the page, listing fields only, and the cursor
+      of the next page, null on the last one.
+    - 304 Not Modified if `If-None-Match` has the page's current ETag.
 
     Example response:
     ```
-    [
-        {
-            "Title": "The Shawshank Redemption",
-            "Year": 1994,
-            "Genre": "Drama"
-        },
-        {
-            "Title": "The Godfather",
-            "Year": 1972,
-            "Genre": "Crime"
-        }
-    ]
+    {
+        "movies": [
+            {
+                "_id": "6720b6f1c2a4e4b1f0a1b2c3",
+                "title": "The Dark Knight",
+                "year": 2008,
+                "genre": "Action"
+            },
+            {
+                "_id": "6720b6f1c2a4e4b1f0a1b2c4",
+                "title": "The Godfather",
+                "year": 1972,
+                "genre": "Crime"
+            }
+        ],
+        "next_cursor": "WyJUaGUgR29kZmF0aGVyIiwgIjY3MjBiNmYxYzJhNGU0YjFmMGExYjJjNCJd"
+    }
     ```
     """
-    return [
-        {"Title": "The Shawshank Redemption", "Year": 1994, "Genre": "Drama"},
-        {"Title": "The Godfather", "Year": 1972, "Genre": "Crime"},
-        {"Title": "The Dark Knight", "Year": 2008, "Genre": "Action"},
-    ]
+    try:
+        after = repository.decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    not_modified = await conditional_get(request, response, "movies", CACHE_CONTROL["movie_list"])
+    if not_modified is not None:
+        return not_modified
+    movies, next_cursor = await repository.find_movies_page(db, limit, after)
+    return FastJSONResponse(
+        {"movies": movies, "next_cursor": next_cursor}, headers=dict(response.headers)
+    )
+
+
+# Largest number of suggestions a client may ask for
+MAX_SUGGESTIONS = 20
+
+
+@app.get("/movie/search", summary="Search Movie Titles", tags=["Movies"])
+async def search_movies(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=MAX_SUGGESTIONS),
+):
+    """
+    Suggest movie titles for autocomplete, from an in-memory index of the titles.
+
+    Case, accents and punctuation are ignored. Titles starting with the query come
+    first, followed by close matches, so typos still find the movie.
+
+    **Parameters**:
+    - q: What the user typed so far.
+    - limit: Suggestions to return, at most 20.
+
+    **Returns**:
+    - A JSON response with the suggested movies, best matches first.
+
+    Example response:
+    ```
+    {
+        "movies": [
+            {
+                "_id": "6720b6f1c2a4e4b1f0a1b2c4",
+                "title": "The Godfather",
+                "year": 1972
+            }
+        ]
+    }
+    ```
+    """
+    return FastJSONResponse(
+        {"movies": titles.search(q, limit)},
+        headers={"Cache-Control": CACHE_CONTROL["movie_search"]},
+    )
 
 
 @app.get("/movie/{title}", summary="Get Movie by Title", tags=["Movies"])
-async def get_movie_by_title(title: str):
+async def get_movie_by_title(request: Request, response: Response, title: str):
     """
     Retrieve a movie from the database by its title.
 
@@ -81,24 +310,109 @@ async def get_movie_by_title(title: str):
     - title: The title of the movie to retrieve.
 
     **Returns**:
-    - A JSON response with the movie details.
+    - A JSON response with the movie details, or 404 if there is no such movie.
+      Titles differing only by case, accents or punctuation match as well.
+    - 304 Not Modified if `If-None-Match` has the movie's current ETag.
 
     Example response:
     ```
     {
-        "Title": "The Shawshank Redemption",
-        "Year": 1994,
-        "Genre": "Drama"
+        "title": "The Shawshank Redemption",
+        "year": 1994,
+        "genre": "Drama"
     }
     ```
     """
-    return {"Message": f"Get movie by title: {title}"}
+    not_modified = await conditional_get(request, response, "movies", CACHE_CONTROL["movie_detail"])
+    if not_modified is not None:
+        return not_modified
+    movie = await repository.find_movie_by_title(db, title)
+    if movie is None:
+        # The index knows the stored spelling of titles typed differently
+        for match in titles.exact(title):
+            movie = await repository.find_movie_by_id(db, match["_id"])
+            if movie is not None:
+                break
+    if movie is None:
+        raise HTTPException(status_code=404, detail=f"Movie '{title}' not found")
+    return FastJSONResponse(movie, headers=dict(response.headers))
+
+
+
+# ---- Export ----
 
+# Largest number of documents fetched from the database per round trip
+MAX_EXPORT_BATCH_SIZE = 10000
+
+
+def export_response(collection: str, batch_size: int, query: Optional[dict] = None):
+    """
+    Streams the documents of a collection as NDJSON, reading the cursor a batch at
+    a time, so the export holds one batch in memory whatever its size.
+    """
+    documents = repository.iter_documents(db, collection, query, batch_size=batch_size)
+    return StreamingResponse(
+        ndjson_chunks(documents),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={
+            "Cache-Control": "no-store",
+            "Content-Disposition": f'attachment; filename="{collection}.ndjson"',
+        },
+    )
 
 
+@app.get("/export/movies", summary="Export Movies", tags=["Export"])
+async def export_movies(batch_size: int = Query(1000, ge=1, le=MAX_EXPORT_BATCH_SIZE)):
+    """
+    Export every movie of the library, streamed as newline-delimited JSON.
+
+    **Parameters**:
+    - batch_size: Movies read from the database per round trip, at most 10000.
+
+    **Returns**:
+    - One movie per line, in insertion order. A stream cut short by a database
+      error ends on a complete line.
+
+    Example response:
+    ```
+    {"_id": "6720b6f1c2a4e4b1f0a1b2c3", "title": "The Dark Knight", "year": 2008}
+    {"_id": "6720b6f1c2a4e4b1f0a1b2c4", "title": "The Godfather", "year": 1972}
+    ```
+    """
+    return export_response("movies", batch_size)
+
+
+@app.get("/export/reviews", summary="Export Reviews", tags=["Export"])
+async def export_reviews(
+    movie: Optional[str] = None,
+    batch_size: int = Query(1000, ge=1, le=MAX_EXPORT_BATCH_SIZE),
+):
+    """
+    Export the reviews of the library, streamed as newline-delimited JSON.
+
+    **Parameters**:
+    - movie: Only export the reviews of the movie with this title.
+    - batch_size: Reviews read from the database per round trip, at most 10000.
+
+    **Returns**:
+    - One review per line, in insertion order.
+
+    Example response:
+    ```
+    {"_id": "6720b7a0c2a4e4b1f0a1b2d0", "movie": "The Godfather", "author_name": "A", "comment": "A classic"}
+    ```
+    """
+    return export_response("reviews", batch_size, {"movie": movie} if movie else None)
 
 
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run("library_app:app", host="localhost", port=8000, reload=True)
+    # Run from the repository root, e.g. `python -m services.movie_library_service.library_app`,
+    # so that the shared `data` package is importable
+    uvicorn.run(
+        "services.movie_library_service.library_app:app",
+        host="localhost",
+        port=8000,
+        reload=True,
+    )
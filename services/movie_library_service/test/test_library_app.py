@@ -0,0 +1,136 @@
+import json
+
+import pytest
+from bson import ObjectId
+from fastapi.testclient import TestClient
+
+from data.test.fakes import FakeCollection, FakeDatabase
+from services.movie_library_service import library_app
+
+
+MOVIES = [
+    {"_id": ObjectId(), "title": title, "year": year, "genre": "Crime", "synopsis": "..."}
+    for title, year in [("Heat", 1995), ("Heat", 1986), ("Alien", 1979), ("Zodiac", 2007)]
+]
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeDatabase(movies=FakeCollection(MOVIES))
+    monkeypatch.setattr(library_app, "db", db)
+    return db
+
+
+@pytest.fixture
+def client(db):
+    # Not entered as a context manager: the title index is not loaded
+    return TestClient(library_app.app)
+
+
+def test_movie_listing_pages_through_every_movie(client):
+    titles, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/movie/", params=params)
+        assert response.status_code == 200
+        body = response.json()
+        titles += [(movie["title"], movie["year"]) for movie in body["movies"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    heats = sorted((m for m in MOVIES if m["title"] == "Heat"), key=lambda m: m["_id"])
+    assert titles == [("Alien", 1979)] + [("Heat", m["year"]) for m in heats] + [("Zodiac", 2007)]
+    assert "synopsis" not in response.json()["movies"][0]
+
+
+def test_movie_listing_rejects_a_malformed_cursor(client):
+    response = client.get("/movie/", params={"cursor": "garbage"})
+    assert response.status_code == 400
+    assert "Invalid cursor" in response.json()["detail"]
+
+
+@pytest.mark.parametrize(
+    "if_none_match, matches",
+    [
+        (None, False),
+        ("", False),
+        ("*", True),
+        ('W/"3-abc"', True),
+        ('"3-abc"', True),
+        ('"2-abc", W/"3-abc"', True),
+        ('W/"2-abc"', False),
+    ],
+)
+def test_etag_matches(if_none_match, matches):
+    assert library_app.etag_matches('W/"3-abc"', if_none_match) is matches
+
+
+def test_movie_is_revalidated_until_the_collection_changes(client, db):
+    first = client.get("/movie/Alien", headers={"Origin": "http://localhost:3000"})
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    # Weak: the compressed and identity bodies share it
+    assert etag.startswith('W/"0-')
+    assert first.headers["cache-control"] == library_app.CACHE_CONTROL["movie_detail"]
+
+    cached = client.get(
+        "/movie/Alien", headers={"If-None-Match": etag, "Origin": "http://localhost:3000"}
+    )
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+    assert "Accept-Encoding" in cached.headers["vary"]
+    assert "Origin" in cached.headers["vary"]
+
+    # A write bumps the version of the collection: the tag no longer matches
+    db["collection_versions"].documents.append({"_id": "movies", "version": 1})
+    changed = client.get("/movie/Alien", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"].startswith('W/"1-')
+    assert changed.json()["title"] == "Alien"
+
+
+def test_listing_etags_depend_on_the_page(client):
+    first = client.get("/movie/", params={"limit": 2}).headers["etag"]
+    second = client.get("/movie/", params={"limit": 3}).headers["etag"]
+    assert first != second
+    assert client.get("/movie/", params={"limit": 2}, headers={"If-None-Match": first}).status_code == 304
+
+
+REVIEWS = [
+    {"_id": ObjectId(), "movie": "Heat", "author_name": "A", "comment": "Tense"},
+    {"_id": ObjectId(), "movie": "Alien", "author_name": "B", "comment": "Scary"},
+    {"_id": ObjectId(), "movie": "Heat", "author_name": "C", "comment": "Long"},
+]
+
+
+def read_ndjson(response):
+    assert response.status_code == 200
+    assert response.headers["content-type"] == library_app.NDJSON_MEDIA_TYPE
+    assert response.headers["cache-control"] == "no-store"
+    assert response.text.endswith("\n")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_export_movies_streams_every_movie(client, db):
+    response = client.get("/export/movies", params={"batch_size": 2})
+    assert response.headers["content-disposition"] == 'attachment; filename="movies.ndjson"'
+    movies = sorted(MOVIES, key=lambda m: m["_id"])
+    assert read_ndjson(response) == [{**m, "_id": str(m["_id"])} for m in movies]
+    assert db["movies"].cursors[-1].batch == 2
+
+
+def test_export_reviews_of_one_movie(client, db):
+    db["reviews"] = FakeCollection(REVIEWS)
+    every = read_ndjson(client.get("/export/reviews"))
+    assert [review["author_name"] for review in every] == ["A", "B", "C"]
+
+    heat = read_ndjson(client.get("/export/reviews", params={"movie": "Heat"}))
+    assert [review["author_name"] for review in heat] == ["A", "C"]
+    assert heat[0] == {**REVIEWS[0], "_id": str(REVIEWS[0]["_id"])}
+
+
+def test_export_batch_size_is_bounded(client):
+    too_large = library_app.MAX_EXPORT_BATCH_SIZE + 1
+    response = client.get("/export/movies", params={"batch_size": too_large})
+    assert response.status_code == 422
@@ -0,0 +1,76 @@
+from services.movie_library_service.title_index import TitleIndex, normalize_title
+
+
+MOVIES = [
+    {"_id": "1", "title": "The Godfather", "year": 1972},
+    {"_id": "2", "title": "The Godfather Part II", "year": 1974},
+    {"_id": "3", "title": "Amélie", "year": 2001},
+    {"_id": "4", "title": "The Dark Knight", "year": 2008},
+    {"_id": "5", "title": "Goodfellas", "year": 1990},
+    {"_id": "6", "title": "The Good, the Bad and the Ugly", "year": 1966},
+]
+
+
+def titles_of(movies):
+    return [movie["title"] for movie in movies]
+
+
+def test_normalize_title():
+    assert normalize_title("  Amélie!  ") == "amelie"
+    assert normalize_title("The Good, the Bad and the Ugly") == "the good the bad and the ugly"
+
+
+def test_prefix_matches_come_first_in_alphabetical_order():
+    index = TitleIndex()
+    index.add_many(MOVIES)
+    assert titles_of(index.search("the go")) == [
+        "The Godfather",
+        "The Godfather Part II",
+        "The Good, the Bad and the Ugly",
+    ]
+    assert titles_of(index.search("the go", limit=2)) == ["The Godfather", "The Godfather Part II"]
+    assert index.search("   ") == []
+
+
+def test_accents_case_and_punctuation_are_folded():
+    index = TitleIndex()
+    index.add_many(MOVIES)
+    assert titles_of(index.search("AMELIE")) == ["Amélie"]
+    assert titles_of(index.exact("amelie")) == ["Amélie"]
+    assert titles_of(index.exact("the good the bad and the ugly")) == ["The Good, the Bad and the Ugly"]
+    assert index.exact("the god") == []
+
+
+def test_typos_are_matched_by_trigrams():
+    index = TitleIndex()
+    index.add_many(MOVIES)
+    assert titles_of(index.search("the godfahter"))[0] == "The Godfather"
+    assert titles_of(index.search("dark knigth")) == ["The Dark Knight"]
+    assert index.search("zzzzzz") == []
+
+
+def test_remove_and_update():
+    index = TitleIndex()
+    index.add_many(MOVIES)
+    index.remove("4")
+    index.remove("missing")
+    assert len(index) == 5
+    assert index.search("dark knight") == []
+
+    # Adding a movie with a known id replaces it, under its new title only
+    index.add({"_id": "1", "title": "Il Padrino", "year": 1972})
+    assert len(index) == 5
+    assert titles_of(index.search("il padrino")) == ["Il Padrino"]
+    assert titles_of(index.search("the godfather")) == ["The Godfather Part II"]
+
+
+def test_incremental_and_bulk_adds_build_the_same_index():
+    one_by_one, bulk = TitleIndex(), TitleIndex()
+    for movie in MOVIES:
+        one_by_one.add(movie)
+    bulk.add_many(MOVIES)
+    # A second, smaller batch goes through `add`, replacing known ids
+    bulk.add_many([{"_id": "5", "title": "Goodfellas", "year": 1990}])
+    assert bulk._sorted == one_by_one._sorted
+    assert bulk._grams == one_by_one._grams
+    assert titles_of(bulk.search("good")) == titles_of(one_by_one.search("good"))
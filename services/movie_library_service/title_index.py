@@ -0,0 +1,182 @@
+import bisect
+import math
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+
+def normalize_title(title: str) -> str:
+    """
+    Folds case, accents and punctuation, so "Amélie!" and "amelie" match.
+    """
+    decomposed = unicodedata.normalize("NFKD", title.casefold())
+    without_accents = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w\s]", " ", without_accents).split())
+
+
+def trigrams(text: str) -> Set[str]:
+    """
+    Character trigrams of a normalized title, padded so word boundaries count.
+    """
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleIndex:
+    """
+    In-memory index of movie titles for autocomplete.
+
+    Normalized titles are kept in a sorted list, so a prefix lookup is a
+    bisection followed by a short scan. A trigram index provides candidates for
+    queries with typos, ranked by how many trigrams they share with the query.
+    Movies can be added, updated and removed one at a time, so the index is
+    kept current incrementally.
+    """
+
+    def __init__(self, min_similarity: float = 0.45):
+        """
+        Args:
+            min_similarity (float): Lowest Dice coefficient between the trigrams of a query
+                                    and a title for the title to be suggested.
+        """
+        self.min_similarity = min_similarity
+        self._sorted: List[Tuple[str, str]] = []  # (normalized title, movie id)
+        self._movies: Dict[str, Dict[str, Any]] = {}
+        self._grams: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._movies)
+
+    def add(self, movie: Dict[str, Any]) -> None:
+        """
+        Indexes a movie, replacing a previous version with the same `_id`.
+
+        Args:
+            movie (Dict[str, Any]): A movie with at least `_id` and `title`.
+        """
+        movie_id = str(movie["_id"])
+        self.remove(movie_id)
+        normalized = self._index(movie_id, movie)
+        bisect.insort(self._sorted, (normalized, movie_id))
+
+    def add_many(self, movies: Iterable[Dict[str, Any]]) -> None:
+        """
+        Indexes movies like `add`, in bulk.
+
+        Inserting titles in order one at a time moves the sorted list each time,
+        so a batch larger than the index, like a full build, is sorted once instead.
+        """
+        movies = list(movies)
+        if len(movies) <= len(self._sorted):
+            for movie in movies:
+                self.add(movie)
+            return
+        for movie in movies:
+            movie_id = str(movie["_id"])
+            self._forget(movie_id)
+            self._index(movie_id, movie)
+        self._sorted = sorted(
+            (movie["normalized"], movie_id) for movie_id, movie in self._movies.items()
+        )
+
+    def remove(self, movie_id: str) -> None:
+        movie = self._forget(movie_id)
+        if movie is None:
+            return
+        position = bisect.bisect_left(self._sorted, (movie["normalized"], movie_id))
+        del self._sorted[position]
+
+    def exact(self, title: str) -> List[Dict[str, Any]]:
+        """
+        Returns the movies whose normalized title equals the normalized `title`.
+        """
+        normalized = normalize_title(title)
+        return [
+            movie
+            for movie in self._prefixed(normalized, limit=None)
+            if self._movies[movie["_id"]]["normalized"] == normalized
+        ]
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Suggests titles for what a user typed so far.
+
+        Titles starting with the query come first, in alphabetical order. The
+        rest of the suggestions are titles sharing enough trigrams with the
+        query, which catches typos and words typed out of order.
+
+        Returns:
+            List[Dict[str, Any]]: Up to `limit` movies, with `_id`, `title` and `year`.
+        """
+        normalized = normalize_title(query)
+        if not normalized:
+            return []
+        results = self._prefixed(normalized, limit)
+        if len(results) < limit:
+            seen = {movie["_id"] for movie in results}
+            for movie in self._similar(normalized):
+                if movie["_id"] not in seen:
+                    results.append(movie)
+                    if len(results) == limit:
+                        break
+        return results
+
+    def _prefixed(self, normalized: str, limit: Optional[int]) -> List[Dict[str, Any]]:
+        results = []
+        position = bisect.bisect_left(self._sorted, (normalized, ""))
+        for i in range(position, len(self._sorted)):
+            title, movie_id = self._sorted[i]
+            if not title.startswith(normalized) or len(results) == limit:
+                break
+            results.append(self._public(movie_id))
+        return results
+
+    def _similar(self, normalized: str) -> List[Dict[str, Any]]:
+        postings = sorted(
+            (self._grams.get(gram, set()) for gram in trigrams(normalized)), key=len
+        )
+        # A title reaching the similarity threshold shares at least `needed`
+        # trigrams with the query, so it appears in one of the rarest
+        # len(postings) - needed + 1 of them: only those provide candidates.
+        threshold = self.min_similarity
+        needed = max(1, math.ceil(threshold * len(postings) / (2 - threshold)))
+        candidates = set().union(*postings[: len(postings) - needed + 1])
+        scored = []
+        for movie_id in candidates:
+            common = sum(1 for ids in postings if movie_id in ids)
+            movie = self._movies[movie_id]
+            score = 2 * common / (len(postings) + movie["grams"])
+            if score >= threshold:
+                scored.append((-score, movie["normalized"], movie_id))
+        return [self._public(movie_id) for _, _, movie_id in sorted(scored)]
+
+    def _index(self, movie_id: str, movie: Dict[str, Any]) -> str:
+        # Everything but the sorted list, which `add` and `add_many` fill their way
+        normalized = normalize_title(movie["title"])
+        grams = trigrams(normalized)
+        self._movies[movie_id] = {
+            "_id": movie_id,
+            "title": movie["title"],
+            "year": movie.get("year"),
+            "normalized": normalized,
+            "grams": len(grams),
+        }
+        for gram in grams:
+            self._grams.setdefault(gram, set()).add(movie_id)
+        return normalized
+
+    def _forget(self, movie_id: str) -> Optional[Dict[str, Any]]:
+        # Everything but the sorted list; returns the movie, None if it was not indexed
+        movie = self._movies.pop(movie_id, None)
+        if movie is None:
+            return None
+        for gram in trigrams(movie["normalized"]):
+            ids = self._grams[gram]
+            ids.discard(movie_id)
+            if not ids:
+                del self._grams[gram]
+        return movie
+
+    def _public(self, movie_id: str) -> Dict[str, Any]:
+        movie = self._movies[movie_id]
+        return {"_id": movie["_id"], "title": movie["title"], "year": movie["year"]}